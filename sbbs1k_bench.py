@@ -0,0 +1,215 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from src.sbbs_rom import SBBS_ROM
+from src.sbbs_team_logo import SBBS_Team_Logo
+from src.sbbs_synthetic import synthetic_rom, write_synthetic_rom
+from src.snes_tile import SNES_Tile_4bpp
+from src import set_log_level, set_log_file
+
+# Times the common operations over synthetic ROMs, so no copy of the game is needed.
+# Distinct images are cycled when a scale asks for more ROMs than --images.
+
+class SBBS_Benchmark:
+    OPERATIONS = ("load", "parse", "export", "import", "logo_decode", "logo_encode", "write")
+
+    def __init__(self, images:int, work_dir:str):
+        self.logger = logging.getLogger("C."+self.__class__.__name__)
+        self.work_dir = work_dir
+        self.images = [synthetic_rom(seed, extra_header=seed%2 == 1) for seed in range(images)]
+        self.roms = [SBBS_ROM(data) for data in self.images]
+        # import reads what export wrote, one directory per image
+        self.export_dirs = []
+        for i,rom in enumerate(self.roms):
+            path = os.path.join(work_dir, f"import_{i}")
+            rom.export(path)
+            self.export_dirs.append(path)
+        self.logo_indices = [SBBS_Team_Logo.decode_bank(rom) for rom in self.roms]
+
+    def __image(self, i:int):
+        return i % len(self.images)
+
+    # Each operation returns (setup, run), only run is timed
+
+    def load(self):
+        return lambda i: self.images[self.__image(i)], lambda data: SBBS_ROM(data)
+
+    def parse(self):
+        def run(rom):
+            for team in rom.teams:
+                team.field_players
+                team.pitcher_players
+                team.logo
+        return lambda i: self.roms[self.__image(i)].copy(), run
+
+    def export(self):
+        path = os.path.join(self.work_dir, "export")
+        return lambda i: self.roms[self.__image(i)].copy(), lambda rom: rom.export(path)
+
+    def import_(self):
+        def setup(i):
+            image = (self.__image(i)+1) % len(self.images)
+            return self.roms[self.__image(i)].copy(), self.export_dirs[image]
+        def run(args):
+            rom, path = args
+            rom.import_from(path)
+            rom.update_in_rom()
+        return setup, run
+
+    def logo_decode(self):
+        return lambda i: self.roms[self.__image(i)], SBBS_Team_Logo.decode_bank
+
+    def logo_encode(self):
+        return lambda i: self.logo_indices[self.__image(i)], SNES_Tile_4bpp.encode_many
+
+    def write(self):
+        path = os.path.join(self.work_dir, "write.smc")
+        def setup(i):
+            rom = self.roms[self.__image(i)].copy()
+            rom.teams[i%len(rom.teams)].field_players[0].player.hr = i%100
+            return rom
+        def run(rom):
+            rom.update_in_rom()
+            rom.write_to(path)
+        return setup, run
+
+    def time_operation(self, name:str, count:int)->float:
+        setup, run = getattr(self, "import_" if name == "import" else name)()
+        total = 0.0
+        for i in range(count):
+            arg = setup(i)
+            start = time.perf_counter()
+            run(arg)
+            total += time.perf_counter()-start
+        return total
+
+    def run(self, operations, scales, repeat:int=1)->dict:
+        results = {}
+        for name in operations:
+            results[name] = {}
+            for count in scales:
+                # Best of repeat, the other runs mostly measure noise from the machine
+                total = min(self.time_operation(name, count) for _ in range(repeat))
+                results[name][str(count)] = {"total": total, "per_rom": total/count}
+                self.logger.info(f"{name:>12} x{count:<6} {total:9.4f}s total {total/count*1000:9.3f}ms per ROM")
+        return results
+
+# Modules that only some options need, importing the ROM code or the CLI must not pull them in
+STARTUP_DEFERRED = ("PIL", "concurrent.futures", "multiprocessing", "ctypes", "cProfile")
+
+def startup_time(module:str, repeat:int=1)->dict:
+    # Cumulative import time of module in a fresh interpreter from -X importtime, best of repeat.
+    # One extra run goes first so writing .pyc files isn't measured
+    best = None
+    for _ in range(repeat+1):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        imported = {}
+        for line in proc.stderr.splitlines():
+            fields = line.removeprefix("import time:").split("|")
+            if len(fields) == 3 and fields[1].strip().isdigit():
+                imported[fields[2].strip()] = int(fields[1])
+        best = imported[module] if best is None else min(best, imported[module])
+    deferred = sorted(name for name in imported if name.split(".")[0] in STARTUP_DEFERRED or name in STARTUP_DEFERRED)
+    return {"total": best/1e6, "modules": len(imported), "deferred": deferred}
+
+def environment()->dict:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpus": os.cpu_count(),
+    }
+
+def compare(results:dict, baseline:dict, threshold:float, logger)->list[str]:
+    # Returns the names of the measurements that got slower than baseline*(1+threshold), once per scale/module
+    regressions = []
+    for name,scales in results.items():
+        for count,result in scales.items():
+            base = baseline.get(name, {}).get(count)
+            if not base:
+                continue
+            key = "per_rom" if "per_rom" in result else "total"
+            ratio = result[key]/base[key] if base.get(key) else 1.0
+            if ratio > 1.0+threshold:
+                regressions.append(name)
+                logger.warning(f"{name:>12} x{count:<6} {ratio:6.2f}x slower than baseline")
+            else:
+                logger.info(f"{name:>12} x{count:<6} {ratio:6.2f}x of baseline")
+    return regressions
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser("sbbs1k_bench.py", description="Benchmarks for sbbs1k_mod.py on synthetic ROMs")
+    arg_parser.add_argument("--log_level", default="INFO")
+    arg_parser.add_argument("--scales", default="1,100,10000", help="Comma separated numbers of ROMs each operation is run on")
+    arg_parser.add_argument("--operations", default=",".join(SBBS_Benchmark.OPERATIONS), help="Comma separated subset of: "+", ".join(SBBS_Benchmark.OPERATIONS))
+    arg_parser.add_argument("--images", type=int, default=4, help="Number of distinct synthetic ROMs to cycle through")
+    arg_parser.add_argument("--repeat", type=int, default=1)
+    arg_parser.add_argument("-o", "--output", default=None, help="Write the results to this JSON file")
+    arg_parser.add_argument("--compare", default=None, help="Results JSON of an earlier run to compare against")
+    arg_parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown against --compare before the run fails, 0.25 = 25%%")
+    arg_parser.add_argument("--write_rom", default=None, help="Only write one synthetic ROM to this path, e.g. to try sbbs1k_mod.py without the original")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--fail_on", choices=("all", "startup"), default="all", help="Regressions that fail the run, \"startup\" only reports the operation timings, which are too noisy on shared runners")
+    arg_parser.add_argument("--startup", default="src.sbbs_rom,sbbs1k_mod", help="Comma separated modules whose import time is measured with -X importtime, empty to skip")
+
+    logger = logging.getLogger("C.Bench")
+    args = arg_parser.parse_args()
+    # Results go to stderr and --output, the bench doesn't leave a log file behind
+    set_log_file(None)
+    set_log_level(args.log_level)
+
+    if args.write_rom:
+        write_synthetic_rom(args.write_rom, args.seed)
+        logger.info(f"Wrote synthetic ROM to {args.write_rom}")
+        sys.exit(0)
+
+    operations = [name for name in args.operations.split(",") if name]
+    unknown = set(operations) - set(SBBS_Benchmark.OPERATIONS)
+    assert not unknown, f"Unknown operations: {', '.join(sorted(unknown))}"
+    scales = [int(count) for count in args.scales.split(",")]
+
+    work_dir = tempfile.mkdtemp(prefix="sbbs1k_bench_")
+    try:
+        benchmark = SBBS_Benchmark(args.images, work_dir)
+        results = benchmark.run(operations, scales, args.repeat)
+    finally:
+        shutil.rmtree(work_dir)
+
+    startup_failures = 0
+    if args.startup:
+        results["startup"] = {}
+        for module in args.startup.split(","):
+            result = startup_time(module, args.repeat)
+            results["startup"][module] = result
+            logger.info(f"{'startup':>12} {module:<16} {result['total']*1000:9.3f}ms, {result['modules']} modules")
+            if result["deferred"]:
+                startup_failures += 1
+                logger.error(f"Importing {module} loads {', '.join(result['deferred'])}, these should only be imported where they're used")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+        logger.info(f"Wrote results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.threshold, logger)
+        failing = [name for name in regressions if args.fail_on == "all" or name == "startup"]
+        if len(failing) < len(regressions):
+            logger.warning(f"{len(regressions)-len(failing)} measurements regressed by more than {args.threshold:.0%}, not failing the run for them")
+        if failing:
+            logger.error(f"{len(failing)} measurements regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+    if startup_failures:
+        sys.exit(1)
@@ -1,48 +1,96 @@
 import argparse
+from src.snes_rom import SNES_ROM
 from src.sbbs_rom import SBBS_ROM
+from src.sbbs_transform import apply_transforms
+from src.sbbs_bundle import SBBS_Bundle
 from src.sbbs_team import SBBS_Team
 from src.sbbs_player import SBBS_Player
 from src import set_log_level
+from src import profiling
 from src.sbbs_player import HitterAbility
 import logging
+import sys
+# Modules only some of the options need (process pools, ctypes, PIL) are imported where they are used,
+# so short runs don't pay for them at startup
 
 def generate_test_roms(args, bank_size=32*1024):
+    if not args.output:
+        return
+    from src.snes_variants import SNES_Variant_Spec, SNES_Variant_Generator
     sbbs_rom = SBBS_ROM.from_file(args.base_rom_path)
-    for off in range(0, sbbs_rom.header.rom_size, bank_size):
-        sbbs_rom = SBBS_ROM.from_file(args.base_rom_path)
-        sbbs_rom.replace_byte_range(off, bytes([0xea]*bank_size))
-        if sbbs_rom and args.output:
-            sbbs_rom.write_to(args.output+f"_{hex(off)}.smc")
+    spec = SNES_Variant_Spec(range(0, sbbs_rom.header.rom_size, bank_size), [bank_size], [0xea])
+    SNES_Variant_Generator(sbbs_rom).generate(spec.variants(), args.output, "_{offset:#x}.smc", args.workers)
 
 def generate_team_test_roms(args, step_size = 0x200):
     #overwriting 0x18000 with 0x41 made everything zero and then change later, maybe team code is messed up by this
     #overwriting 0x18200 with 0x41 made some names show up wrong
     #overwriting 0x18400 with 0x41 looks basically normal
     base = 0x18000
+    if not args.output:
+        return
+    from src.snes_variants import SNES_Variant_Spec, SNES_Variant_Generator
     sbbs_rom = SBBS_ROM.from_file(args.base_rom_path)
-    for off in range(base, base+8*1024, step_size):
-        sbbs_rom = SBBS_ROM.from_file(args.base_rom_path)
-        sbbs_rom.replace_byte_range(off, bytes([0x41]*step_size))
-        if sbbs_rom and args.output:
-            sbbs_rom.write_to(args.output+f"_team_{hex(off)}.smc")
+    spec = SNES_Variant_Spec(range(base, base+8*1024, step_size), [step_size], [0x41])
+    SNES_Variant_Generator(sbbs_rom).generate(spec.variants(), args.output, "_team_{offset:#x}.smc", args.workers)
 
 def generate_guess_test_roms(args, guess_addr=0x18000, guess_size=0x252, guess_overwrite:int=0):
     #overwriting 0x18000-0x18252 seems to break names, but also changes values when displaying
     #overwriting 0x18020-0x18252 seems to break names and stats, but some names and stats remain
     #overwriting 0x18010-0x18252 seems to break names and stats, but some names and stats remain
     #overwriting just one byte at 0x18010 breaks many names, data is either compressed or this is actually code and not data
+    if not args.output:
+        return
+    from src.snes_variants import SNES_Variant_Spec, SNES_Variant_Generator
     sbbs_rom = SBBS_ROM.from_file(args.base_rom_path)
-    sbbs_rom.replace_byte_range(guess_addr, bytes([guess_overwrite]*guess_size))
-    sbbs_rom.write_to(args.output+f"_guess_{hex(guess_addr)}-{hex(guess_addr+guess_size)}-{hex(guess_overwrite)}.smc")
+    spec = SNES_Variant_Spec([guess_addr], [guess_size], [guess_overwrite])
+    SNES_Variant_Generator(sbbs_rom).generate(spec.variants(), args.output, "_guess"+SNES_Variant_Generator.DEFAULT_NAME_FORMAT, 1)
+
+def stop_profiling(args, c_profiler, logger):
+    if c_profiler:
+        c_profiler.disable()
+        c_profiler.dump_stats(args.cprofile)
+        logger.info(f"Wrote cProfile stats to {args.cprofile}")
+
+    if args.profile is not None:
+        profiler = profiling.disable()
+        logger.info("Profile:\n"+profiler.report())
+        if args.profile:
+            profiler.write_json(args.profile+".json")
+            profiler.write_folded(args.profile+".folded")
+            logger.info(f"Wrote profile to {args.profile}.json and {args.profile}.folded")
 
 if __name__ == "__main__":
     arg_parser = argparse.ArgumentParser("sbbs1k_mod.py", description="Small tool for altering teams in Super Baseball Simulator 1000")
-    arg_parser.add_argument("base_rom_path")
+    arg_parser.add_argument("base_rom_path", nargs="?", default=None)
     arg_parser.add_argument("--log_level", default="INFO")
     arg_parser.add_argument("-o", "--output", default=None)
     arg_parser.add_argument("-x", "--export", default=None)
     arg_parser.add_argument("-i", "--import", dest="import_path", default=None)
+    arg_parser.add_argument("--cache", default=None, help="Manifest file that lets --import skip teams whose files didn't change since the last run")
     arg_parser.add_argument("-d", "--debug_teams", action="store_true", default=False)
+    arg_parser.add_argument("-t", "--transform", action="append", default=[], help="Bulk edit players, e.g. \"team=POWERS fielders: hr=min(hr*1.2,99)\" or \"all pitchers: era-=0.5\"")
+    arg_parser.add_argument("-p", "--patch", default=None, help="Write the changes as .ips or .bps patch instead of a full ROM")
+    arg_parser.add_argument("-a", "--apply_patch", action="append", default=[], help="Apply .ips or .bps patches to the ROM before importing")
+    arg_parser.add_argument("--variants", action="append", default=[], help="Write one ROM per variant, OFFSETS/SIZES/FILLS[/zip] e.g. 0x58000:0x59800:0x60/0x60/0:64/zip")
+    arg_parser.add_argument("--randomize", type=int, default=None, metavar="N", help="Write N randomized leagues, --output/--patch are name templates, e.g. -o leagues/league.smc writes leagues/league_000.smc ...")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Seed for --randomize, the same seed always gives the same leagues")
+    arg_parser.add_argument("--random_spec", default=None, help="JSON file with the stat distributions for --randomize, see src/sbbs_randomizer.py")
+    arg_parser.add_argument("-j", "--workers", type=int, default=None, help="Number of worker processes, defaults to the number of CPUs")
+    arg_parser.add_argument("--batch", default=None, help="Run all jobs of a JSON manifest over a process pool instead of a single ROM, see src/sbbs_batch.py for the format")
+    arg_parser.add_argument("--serve", default=None, metavar="ADDRESS", help="Keep ROMs parsed in memory and serve JSON-RPC on HOST:PORT or a unix socket path, see src/sbbs_server.py for the methods")
+    arg_parser.add_argument("--serve_remote", action="store_true", default=False, help="Allow --serve on a non-loopback address. Clients can read and write any file this process can")
+    arg_parser.add_argument("--locate", action="append", default=[], help="Print which team, player, field or logo tile owns an offset or OFFSET:END range (ROM offsets, without copier header)")
+    arg_parser.add_argument("--diff", default=None, help="Report teams, players, logo tiles and header fields that differ from this ROM")
+    arg_parser.add_argument("--diff_json", default=None, help="Also write the --diff report as JSON")
+    arg_parser.add_argument("--watch", action="store_true", default=False, help="Keep running and re-apply team files in the --import directory whenever they change, rewriting --output/--patch")
+    arg_parser.add_argument("--watch_polling", action="store_true", default=False, help="Poll for changes instead of using inotify")
+    arg_parser.add_argument("--export_atlas", default=None, help="Export all team logos into one indexed image, e.g. logos.png")
+    arg_parser.add_argument("--import_atlas", default=None, help="Import all team logos from one image written by --export_atlas")
+    arg_parser.add_argument("--atlas_tiles", default=None, help="FIRST:COUNT, use this tile range of the logo bank for the atlas instead of the team logos. Importing anything but a PNG needs COUNT")
+    arg_parser.add_argument("--mmap", choices=["r", "c"], default=None, help="Map the ROM instead of reading it, r: read only, c: copy-on-write")
+    arg_parser.add_argument("--profile", nargs="?", const="", default=None, metavar="PREFIX", help="Log time spent per phase and call counters, with PREFIX also write PREFIX.json and PREFIX.folded (flamegraph.pl)")
+    arg_parser.add_argument("--cprofile", default=None, help="Write cProfile stats to this file, e.g. for snakeviz or flameprof")
+    arg_parser.add_argument("--verify_checksum", action="store_true", default=False, help="Cross-check the incrementally updated checksum against a full recalculation")
 
     logger = logging.getLogger("C.CLI")
     args = arg_parser.parse_args()
@@ -50,9 +98,41 @@ if __name__ == "__main__":
     if hasattr(args, "log_level") and args.log_level:
         set_log_level(args.log_level)
 
+    if args.verify_checksum:
+        SNES_ROM.VERIFY_CHECKSUM = True
+
+    if args.profile is not None:
+        profiling.enable()
+    c_profiler = None
+    if args.cprofile:
+        import cProfile
+        c_profiler = cProfile.Profile()
+        c_profiler.enable()
+
+    if args.batch:
+        from src.sbbs_batch import SBBS_Batch
+        try:
+            failed = SBBS_Batch(args.batch).run_and_report(args.workers)
+        finally:
+            stop_profiling(args, c_profiler, logger)
+        sys.exit(1 if failed else 0)
+
+    if args.serve:
+        from src.sbbs_server import SBBS_Server
+        server = SBBS_Server()
+        try:
+            if args.base_rom_path:
+                server.open_rom(args.base_rom_path)
+            server.run(args.serve, args.serve_remote)
+        finally:
+            stop_profiling(args, c_profiler, logger)
+        sys.exit(0)
+
+    assert args.base_rom_path, "base_rom_path is required unless --batch or --serve is used"
+
     sbbs_rom = None
     try:
-        sbbs_rom = SBBS_ROM.from_file(args.base_rom_path)
+        sbbs_rom = SBBS_ROM.from_file(args.base_rom_path, args.mmap)
         logger.info(f"Succesfully loaded SBBS 1000 ROM from {args.base_rom_path}")
     except Exception as e:
         logger.error(f"Error loading ROM from {args.base_rom_path}: {e}")
@@ -63,11 +143,34 @@ if __name__ == "__main__":
     #generate_guess_test_roms(args, 0x18203, 0x1, 0x01) # #overwriting original byte 0x24 with 0x01 turns 'GUS' into 'AMOS'
     # for i in range(64):
     #     generate_guess_test_roms(args, 0x58000+0x60*i, 4*8*3, i) # #overwriting original byte 0x24 with 0x12 turns 'GUS' into 'AMOS'
+    # same sweep in one go: --variants 0x58000:0x59800:0x60/0x60/0:64/zip
     
+    for patch_path in args.apply_patch:
+        sbbs_rom.apply_patch_from(patch_path)
+        logger.info(f"Applied patch {patch_path}")
+
     if args.import_path:
-        import_count = sbbs_rom.import_from(args.import_path)
+        import_count = sbbs_rom.import_from(args.import_path, args.cache)
         logger.info(f"Imported {import_count} teams from {args.import_path}")
 
+    atlas_tiles = (0, None)
+    if args.atlas_tiles:
+        first_tile, _, tile_count = args.atlas_tiles.partition(":")
+        atlas_tiles = (int(first_tile, 0), int(tile_count, 0) if tile_count else None)
+
+    if sbbs_rom and args.import_atlas:
+        from src.sbbs_logo_atlas import SBBS_Logo_Atlas
+        if args.atlas_tiles:
+            SBBS_Logo_Atlas(sbbs_rom).import_bank(args.import_atlas, *atlas_tiles)
+            logger.info(f"Imported logo bank tiles from {args.import_atlas}")
+        else:
+            changed_count = SBBS_Logo_Atlas(sbbs_rom).import_teams(args.import_atlas)
+            logger.info(f"Imported {changed_count} changed logos from {args.import_atlas}")
+
+    if args.transform:
+        changed_count = apply_transforms(sbbs_rom, args.transform)
+        logger.info(f"Transforms changed {changed_count} players")
+
     if args.debug_teams:
         logger.info(f"Printing teams for debugging purposes")
         for i in range(18):
@@ -88,10 +191,72 @@ if __name__ == "__main__":
             #         field_player.player.update_in_rom()
 
 
+    if args.locate:
+        from src.sbbs_layout import SBBS_Layout
+        layout = SBBS_Layout.get()
+        for spec in args.locate:
+            start, _, end = spec.partition(":")
+            start = int(start, 0)
+            end = int(end, 0) if end else start+1
+            locations = layout.locate_fields(start, end)
+            if not locations:
+                logger.info(f"{spec}: not part of any known structure")
+            for location in locations:
+                name = f" {sbbs_rom.teams[location.team_idx].name.strip()}" if sbbs_rom and location.team_idx is not None else ""
+                logger.info(f"{spec}:{name} {location}")
+
+    if sbbs_rom and args.diff:
+        from src.sbbs_diff import SBBS_Diff
+        import json
+        # Hacks often don't bother fixing the checksum, that shouldn't stop them from being compared
+        with SBBS_ROM.from_file(args.diff, check_checksum=False) as other_rom:
+            diff = SBBS_Diff(sbbs_rom, other_rom)
+        logger.info(f"{len(diff)} differences to {args.diff}")
+        for difference in diff.differences:
+            logger.info(difference)
+        if args.diff_json:
+            with open(args.diff_json, "w") as f:
+                json.dump(diff.to_dict(), f, indent=2)
+
+    if sbbs_rom and args.variants:
+        assert args.output, "--variants needs --output as prefix for the generated ROMs"
+        from src.snes_variants import SNES_Variant_Spec, SNES_Variant_Generator
+        generator = SNES_Variant_Generator(sbbs_rom)
+        for spec in args.variants:
+            generator.generate(SNES_Variant_Spec.parse(spec).variants(), args.output, workers=args.workers)
+
+    if sbbs_rom and args.randomize:
+        assert args.output or args.patch, "--randomize needs --output and/or --patch as name template for the leagues"
+        from src.sbbs_randomizer import SBBS_League_Generator, SBBS_Random_Spec
+        spec = SBBS_Random_Spec.from_file(args.random_spec) if args.random_spec else SBBS_Random_Spec()
+        SBBS_League_Generator(sbbs_rom, spec).generate(args.randomize, args.seed, args.output, args.patch, args.workers)
+
     if args.export:
         logger.info(f"Exporting teams to {args.export}")
         sbbs_rom.export(args.export)
 
-    if sbbs_rom and args.output:
+    if sbbs_rom and args.export_atlas:
+        from src.sbbs_logo_atlas import SBBS_Logo_Atlas
+        logger.info(f"Exporting logo atlas to {args.export_atlas}")
+        if args.atlas_tiles:
+            SBBS_Logo_Atlas(sbbs_rom).export_bank(args.export_atlas, *atlas_tiles)
+        else:
+            SBBS_Logo_Atlas(sbbs_rom).export_teams(args.export_atlas)
+
+    if sbbs_rom and args.output and not args.variants and not args.randomize:
         logger.info(f"Writing rom to {args.output}")
-        sbbs_rom.write_to(args.output)
\ No newline at end of file
+        sbbs_rom.write_to(args.output)
+
+    if sbbs_rom and args.patch and not args.randomize:
+        logger.info(f"Writing patch to {args.patch}")
+        sbbs_rom.write_patch_to(args.patch)
+
+    if sbbs_rom and args.watch:
+        assert args.import_path and not SBBS_Bundle.is_bundle_path(args.import_path), "--watch needs an --import directory"
+        assert not args.transform, "--watch doesn't re-apply transforms"
+        from src.sbbs_watch import SBBS_Watch
+        SBBS_Watch(sbbs_rom, args.import_path, args.output, args.patch, args.watch_polling).run()
+
+    if sbbs_rom:
+        sbbs_rom.close()
+    stop_profiling(args, c_profiler, logger)
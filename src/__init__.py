@@ -1,3 +1,3 @@
-from .logging import setup_logging, set_log_level
+from .logging import install_lazy_logging, setup_logging, set_log_level, set_log_file
 
-setup_logging()
\ No newline at end of file
+install_lazy_logging()
\ No newline at end of file
@@ -0,0 +1,20 @@
+_UNSET = object()
+
+class Dirty_Tracked:
+    # Assigning a different value to one of these attributes marks the object as dirty,
+    # so update_in_rom only re-encodes objects that actually changed.
+    # In-place changes (e.g. to a list) aren't seen, call mark_dirty() for those.
+    TRACKED_ATTRIBUTES = ()
+
+    dirty = False
+
+    def __setattr__(self, name, value):
+        if name in self.TRACKED_ATTRIBUTES and self.__dict__.get(name, _UNSET) != value:
+            self.__dict__["dirty"] = True
+        object.__setattr__(self, name, value)
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def mark_clean(self):
+        self.dirty = False
@@ -3,28 +3,57 @@ import logging
 core_logger = None
 core_fh = None
 core_ch = None
+log_level = "INFO"
+# None only logs to the console
+log_file = "sbbs1k.log"
+
+class Lazy_Setup_Handler(logging.Handler):
+    # Placeholder on the "C" logger, the real handlers are only created for the first record
+    def handle(self, record):
+        setup_logging()
+        for handler in core_logger.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+def install_lazy_logging():
+    # Called at import, only touches the "C" logger and doesn't create any file
+    logger = logging.getLogger('C')
+    logger.setLevel(logging.DEBUG)
+    logger.handlers = [Lazy_Setup_Handler()]
 
 def setup_logging():
     global core_logger, core_fh, core_ch
-    baseLevel = "INFO"
+    if core_logger is not None:
+        return
 
-    logging.basicConfig(level=logging.NOTSET, handlers=[])
     core_logger = logging.getLogger('C')
-    core_fh = logging.FileHandler("sbbs1k.log")
-    core_fh.setLevel(baseLevel)
     core_ch = logging.StreamHandler()
-    core_ch.setLevel(baseLevel)
+    core_ch.setLevel(log_level)
 
     formatter = logging.Formatter('[{levelname: ^8}] [{name: ^6}] {message}', style='{')
     verbose_formatter = logging.Formatter('{asctime} - [{levelname}] [{name}] {message}', style='{')
-    core_fh.setFormatter(verbose_formatter)
     core_ch.setFormatter(formatter)
+    handlers = [core_ch]
+    if log_file is not None:
+        # The log file is only opened when the first record is written
+        core_fh = logging.FileHandler(log_file, delay=True)
+        core_fh.setLevel(log_level)
+        core_fh.setFormatter(verbose_formatter)
+        handlers.insert(0, core_fh)
 
-    core_logger.handlers.clear()
-    core_logger.addHandler(core_fh)
-    core_logger.addHandler(core_ch)
+    # A new list, Lazy_Setup_Handler may be called from a loop over the old one
+    core_logger.handlers = handlers
 
-def set_log_level(log_level:str):
-    global core_logger, core_fh, core_ch
-    core_fh.setLevel(log_level)
-    core_ch.setLevel(log_level)
\ No newline at end of file
+def set_log_level(level:str):
+    global log_level
+    log_level = level
+    if core_logger is not None:
+        for handler in core_logger.handlers:
+            handler.setLevel(level)
+
+def set_log_file(path:str):
+    # Has to be called before the first record is logged
+    global log_file
+    assert core_logger is None, "Logging is already set up"
+    log_file = path
@@ -0,0 +1,127 @@
+import contextlib
+import functools
+import json
+import logging
+import time
+
+# Timing spans and counters for the hot paths. Nothing is recorded until enable() is called,
+# the instrumented code only checks `profiling.active` which stays None otherwise.
+active = None
+
+class Profiler:
+    def __init__(self):
+        self.logger = logging.getLogger("C."+self.__class__.__name__)
+        # Keyed by the tuple of open span names, so nesting survives for the folded output
+        self.spans = {}
+        self.counters = {}
+        self.stack = []
+        self.start = time.perf_counter()
+        self.total = None
+
+    def enter(self, name:str):
+        self.stack.append([name, time.perf_counter(), 0.0])
+
+    def exit(self):
+        name, start, child_time = self.stack.pop()
+        elapsed = time.perf_counter()-start
+        path = tuple(frame[0] for frame in self.stack)+(name,)
+        span = self.spans.get(path)
+        if span is None:
+            span = self.spans[path] = [0, 0.0, 0.0]
+        span[0] += 1
+        span[1] += elapsed
+        span[2] += elapsed-child_time
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    @contextlib.contextmanager
+    def span(self, name:str):
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def count(self, name:str, n:int=1):
+        self.counters[name] = self.counters.get(name, 0)+n
+
+    def stop(self):
+        self.total = time.perf_counter()-self.start
+
+    def phases(self)->dict:
+        # Per span name, summed over every place it was opened from. Recursive spans only count once in total
+        phases = {}
+        for path,(calls, total, self_time) in self.spans.items():
+            name = path[-1]
+            phase = phases.setdefault(name, {"calls": 0, "total": 0.0, "self": 0.0})
+            phase["calls"] += calls
+            if name not in path[:-1]:
+                phase["total"] += total
+            phase["self"] += self_time
+        return dict(sorted(phases.items(), key=lambda item: -item[1]["total"]))
+
+    def to_dict(self)->dict:
+        return {
+            "total": self.total if self.total is not None else time.perf_counter()-self.start,
+            "phases": self.phases(),
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def report(self)->str:
+        data = self.to_dict()
+        lines = [f"{'phase':<24} {'calls':>8} {'total s':>10} {'self s':>10} {'%':>6}"]
+        for name,phase in data["phases"].items():
+            share = phase["total"]/data["total"]*100 if data["total"] else 0.0
+            lines.append(f"{name:<24} {phase['calls']:>8} {phase['total']:>10.4f} {phase['self']:>10.4f} {share:>6.1f}")
+        lines.append(f"{'run':<24} {'':>8} {data['total']:>10.4f}")
+        for name,value in data["counters"].items():
+            lines.append(f"{name:<35} {value:>12}")
+        return "\n".join(lines)
+
+    def write_json(self, path:str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_folded(self, path:str):
+        # Collapsed stacks with self time in microseconds, the input format of flamegraph.pl and speedscope
+        with open(path, "w") as f:
+            for path_names,(_, _, self_time) in self.spans.items():
+                f.write(f"{';'.join(path_names)} {round(self_time*1e6)}\n")
+
+def enable()->Profiler:
+    global active
+    active = Profiler()
+    return active
+
+def disable()->Profiler:
+    global active
+    profiler = active
+    active = None
+    if profiler:
+        profiler.stop()
+    return profiler
+
+def span(name:str):
+    if active is None:
+        return contextlib.nullcontext()
+    return active.span(name)
+
+def count(name:str, n:int=1):
+    if active is not None:
+        active.count(name, n)
+
+def timed(name:str):
+    # Decorator version of span(), costs one global lookup per call while profiling is off
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = active
+            if profiler is None:
+                return func(*args, **kwargs)
+            profiler.enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.exit()
+        return wrapper
+    return decorator
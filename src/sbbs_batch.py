@@ -0,0 +1,157 @@
+from .sbbs_rom import SBBS_ROM
+from .sbbs_transform import apply_transforms
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import logging
+import os
+import time
+
+# Manifest layout, paths are relative to the manifest:
+# {
+#     "roms": {"us": "sbbs.smc", "us_hdr": "sbbs_hdr.smc"},
+#     "jobs": [
+#         {"rom": ["us", "us_hdr"], "import": "mods/powers", "transform": ["all pitchers: era-=0.5"],
+#          "apply_patch": ["fix.ips"], "output": "out/powers_{rom}.smc", "patch": "out/powers_{rom}.bps"}
+#     ]
+# }
+# "rom" is a name from "roms", a path or a list of either, a list runs the job once per ROM.
+# output, patch and export are formatted with {rom} (name or file name without extension) and {job} (index).
+class SBBS_Batch_Job:
+    KEYS = ("rom", "import", "cache", "transform", "apply_patch", "output", "patch", "export")
+
+    def __init__(self, idx:int, rom:str, rom_path:str, entry:dict, base_dir:str):
+        unknown = set(entry) - set(SBBS_Batch_Job.KEYS)
+        assert not unknown, f"Unknown keys in batch job {idx}: {', '.join(sorted(unknown))}"
+        self.idx = idx
+        self.rom = rom
+        self.rom_path = rom_path
+        path = lambda p: None if p is None else os.path.join(base_dir, p.format(rom=rom, job=idx))
+        self.import_path = path(entry.get("import"))
+        self.cache_path = path(entry.get("cache"))
+        self.transforms = list(entry.get("transform", []))
+        self.patches = [path(p) for p in entry.get("apply_patch", [])]
+        self.output = path(entry.get("output"))
+        self.patch = path(entry.get("patch"))
+        self.export = path(entry.get("export"))
+        assert self.output or self.patch or self.export, f"Batch job {idx} ({rom}) has no output, patch or export"
+
+    def __str__(self):
+        return f"#{self.idx} {self.rom}"
+
+    def run(self, base:SBBS_ROM)->str:
+        with base.copy() as sbbs_rom:
+            return self.__run(sbbs_rom)
+
+    def __run(self, sbbs_rom:SBBS_ROM)->str:
+        for patch_path in self.patches:
+            sbbs_rom.apply_patch_from(patch_path)
+        if self.import_path:
+            sbbs_rom.import_from(self.import_path, self.cache_path)
+        if self.transforms:
+            apply_transforms(sbbs_rom, self.transforms)
+        if self.export:
+            sbbs_rom.export(self.export)
+        if self.output:
+            os.makedirs(os.path.dirname(self.output), exist_ok=True)
+            sbbs_rom.write_to(self.output)
+        if self.patch:
+            os.makedirs(os.path.dirname(self.patch), exist_ok=True)
+            sbbs_rom.write_patch_to(self.patch)
+        return ", ".join(path for path in (self.output, self.patch, self.export) if path)
+
+class SBBS_Batch_Result:
+    def __init__(self, job:SBBS_Batch_Job, output:str=None, error:str=None, seconds:float=0.0):
+        self.job = job
+        self.output = output
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self)->bool:
+        return self.error is None
+
+_worker_roms = None
+
+def _init_worker(rom_data:dict):
+    # Each worker parses every base ROM once, jobs only clone the parsed ROM
+    # A ROM that fails to load only fails the jobs using it, not the whole pool
+    global _worker_roms
+    _worker_roms = {}
+    for path, data in rom_data.items():
+        try:
+            _worker_roms[path] = data if isinstance(data, Exception) else SBBS_ROM(data)
+        except Exception as e:
+            _worker_roms[path] = e
+
+def _run_job(job:SBBS_Batch_Job)->SBBS_Batch_Result:
+    start = time.perf_counter()
+    try:
+        base = _worker_roms[job.rom_path]
+        if isinstance(base, Exception):
+            raise base
+        output = job.run(base)
+        return SBBS_Batch_Result(job, output, seconds=time.perf_counter()-start)
+    except Exception as e:
+        return SBBS_Batch_Result(job, error=f"{e.__class__.__name__}: {e}", seconds=time.perf_counter()-start)
+
+class SBBS_Batch:
+    def __init__(self, manifest_path:str):
+        self.logger = logging.getLogger("C."+self.__class__.__name__)
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        if isinstance(manifest, list):
+            manifest = {"jobs": manifest}
+        base_dir = os.path.dirname(os.path.abspath(manifest_path))
+        roms = {name: os.path.join(base_dir, path) for name, path in manifest.get("roms", {}).items()}
+        self.jobs = []
+        for entry in manifest["jobs"]:
+            rom_names = entry.get("rom")
+            assert rom_names, f"Batch job {len(self.jobs)} has no rom"
+            if isinstance(rom_names, str):
+                rom_names = [rom_names]
+            for name in rom_names:
+                if name in roms:
+                    rom_path = roms[name]
+                else:
+                    rom_path = os.path.join(base_dir, name)
+                    name = os.path.splitext(os.path.basename(name))[0]
+                self.jobs.append(SBBS_Batch_Job(len(self.jobs), name, rom_path, entry, base_dir))
+        self.rom_paths = sorted({job.rom_path for job in self.jobs})
+
+    def __load_roms(self)->dict:
+        rom_data = {}
+        for path in self.rom_paths:
+            try:
+                with open(path, "rb") as f:
+                    rom_data[path] = f.read()
+            except OSError as e:
+                rom_data[path] = e
+        return rom_data
+
+    def run(self, workers:int=None):
+        # Yields results in the order the jobs finish
+        rom_data = self.__load_roms()
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(self.jobs))
+        if workers <= 1:
+            _init_worker(rom_data)
+            for job in self.jobs:
+                yield _run_job(job)
+            return
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rom_data,)) as executor:
+            futures = [executor.submit(_run_job, job) for job in self.jobs]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def run_and_report(self, workers:int=None)->int:
+        start = time.perf_counter()
+        failed = 0
+        for result in self.run(workers):
+            if result.ok:
+                self.logger.info(f"[{result.seconds:7.3f}s] {result.job} -> {result.output}")
+            else:
+                failed += 1
+                self.logger.error(f"[{result.seconds:7.3f}s] {result.job} failed: {result.error}")
+        self.logger.info(f"Ran {len(self.jobs)} jobs over {len(self.rom_paths)} ROMs in {time.perf_counter()-start:.3f}s, {failed} failed")
+        return failed
@@ -0,0 +1,110 @@
+from .sbbs_team import SBBS_Team
+import json
+import os
+import struct
+
+class SBBS_Bundle:
+    # Single file container for a mod: one JSON team record and the raw logo tiles per team.
+    # Payloads are written one after another, the index and footer come last, so a bundle can be
+    # written in one streaming pass and replacing a team only appends to it.
+    #   "SBBSMOD1" | payloads... | index entries | footer
+    EXTENSION = ".sbbsmod"
+    MAGIC = b"SBBSMOD1"
+    INDEX_ENTRY = struct.Struct("<BBII") # team idx, kind, offset, size
+    FOOTER = struct.Struct("<II8s") # index offset, entry count, magic
+    KIND_TEAM = 0
+    KIND_LOGO = 1
+
+    def __init__(self, path:str, mode:str="r"):
+        assert mode in ("r", "w", "a"), f"Unknown bundle mode {mode}"
+        self.path = path
+        self.mode = mode
+        self.index = {}
+        if mode == "w":
+            self.file = open(path, "wb")
+            self.file.write(SBBS_Bundle.MAGIC)
+            self.end = len(SBBS_Bundle.MAGIC)
+        else:
+            self.file = open(path, "rb" if mode == "r" else "r+b")
+            self.__read_index()
+
+    @classmethod
+    def is_bundle_path(cls, path:str)->bool:
+        return path.lower().endswith(SBBS_Bundle.EXTENSION)
+
+    def __read_index(self):
+        f = self.file
+        assert f.read(len(SBBS_Bundle.MAGIC)) == SBBS_Bundle.MAGIC, f"{self.path} isn't a SBBS mod bundle"
+        f.seek(-SBBS_Bundle.FOOTER.size, os.SEEK_END)
+        index_off, count, magic = SBBS_Bundle.FOOTER.unpack(f.read(SBBS_Bundle.FOOTER.size))
+        assert magic == SBBS_Bundle.MAGIC, f"{self.path} is truncated"
+        f.seek(index_off)
+        index_data = f.read(count*SBBS_Bundle.INDEX_ENTRY.size)
+        # Later entries replace earlier ones for the same team
+        for team_idx, kind, off, size in SBBS_Bundle.INDEX_ENTRY.iter_unpack(index_data):
+            assert team_idx <= SBBS_Team.MAX_TEAM_IDX, f"{self.path} has an entry for team {team_idx}, teams go up to {SBBS_Team.MAX_TEAM_IDX}"
+            assert kind in (SBBS_Bundle.KIND_TEAM, SBBS_Bundle.KIND_LOGO), f"{self.path} has an entry of unknown kind {kind}"
+            assert len(SBBS_Bundle.MAGIC) <= off and off+size <= index_off, f"{self.path} has an entry for team {team_idx} outside of its payloads"
+            self.index[(team_idx, kind)] = (off, size)
+        # New payloads go where the old index was
+        self.end = index_off
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.file is None:
+            return
+        if self.mode != "r":
+            self.__write_index()
+        self.file.close()
+        self.file = None
+
+    def __write_index(self):
+        f = self.file
+        f.seek(self.end)
+        entries = sorted(self.index.items(), key=lambda item: item[1][0])
+        for (team_idx, kind), (off, size) in entries:
+            f.write(SBBS_Bundle.INDEX_ENTRY.pack(team_idx, kind, off, size))
+        f.write(SBBS_Bundle.FOOTER.pack(self.end, len(entries), SBBS_Bundle.MAGIC))
+        f.truncate()
+
+    def __write_entry(self, team_idx:int, kind:int, data:bytes):
+        assert self.mode != "r", "Bundle is opened read only"
+        self.file.seek(self.end)
+        self.file.write(data)
+        self.index[(team_idx, kind)] = (self.end, len(data))
+        self.end += len(data)
+
+    def __read_entry(self, team_idx:int, kind:int)->bytes:
+        entry = self.index.get((team_idx, kind))
+        if entry is None:
+            return None
+        off, size = entry
+        self.file.seek(off)
+        return self.file.read(size)
+
+    def team_indices(self)->list[int]:
+        return sorted({team_idx for team_idx,_ in self.index})
+
+    def write_team(self, team_idx:int, team_dict:dict):
+        self.__write_entry(team_idx, SBBS_Bundle.KIND_TEAM, json.dumps(team_dict, separators=(",", ":")).encode("utf-8"))
+
+    def write_logo(self, team_idx:int, tile_bytes:bytes):
+        self.__write_entry(team_idx, SBBS_Bundle.KIND_LOGO, bytes(tile_bytes))
+
+    def read_team(self, team_idx:int)->dict:
+        data = self.__read_entry(team_idx, SBBS_Bundle.KIND_TEAM)
+        return None if data is None else json.loads(data)
+
+    def read_logo(self, team_idx:int)->bytes:
+        return self.__read_entry(team_idx, SBBS_Bundle.KIND_LOGO)
+
+    def entries(self):
+        # Yields (team idx, kind, payload) in file order, so reading the whole bundle is one sequential pass
+        for (team_idx, kind), (off, size) in sorted(self.index.items(), key=lambda item: item[1][0]):
+            self.file.seek(off)
+            yield team_idx, kind, self.file.read(size)
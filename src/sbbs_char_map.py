@@ -1,22 +1,100 @@
+import codecs
+import functools
+
 #byte to font mapping, not complete, just the ones I'm interested in
 b_to_font = """0123456789ABCDEFGHIJKLMNOPQRSTUV0123456789..WXYZ..........................T...............HE.... ..............."""
 max_val = len(b_to_font)-1
 
-font_to_b = []
-for v in range(255):
+CODEC_NAME = "sbbs1k"
+# Used for characters the font doesn't have with errors="replace"
+REPLACEMENT_CHAR = "."
+# Dropped when decoding with errors="ignore"
+_UNKNOWN_BYTES = bytes(range(max_val+1, 256))
+
+class _Encode_Table(dict):
+    # str.translate table, characters that aren't in the font become U+0100 so encoding to latin-1 stops there
+    def __missing__(self, key):
+        return 0x100
+
+@functools.cache
+def _tables()->tuple[bytes, dict]:
+    # Built on first use instead of at import time
+    decode_table = bytes(ord(b_to_font[b]) if b <= max_val else ord(" ") for b in range(256))
+    encode_table = _Encode_Table()
+    for b in reversed(range(len(b_to_font))):
+        # Characters that show up more than once map to their first byte
+        encode_table[ord(b_to_font[b])] = b
+        encode_table[ord(b_to_font[b].lower())] = b
+    return decode_table, encode_table
+
+def sbbs_encode(s:str, errors:str="strict")->tuple[bytes, int]:
+    _, encode_table = _tables()
+    translated = s.translate(encode_table)
     try:
-        font_to_b.append(b_to_font.index(""+chr(v)))
-    except Exception:
-        font_to_b.append(-1)
+        return translated.encode("latin-1"), len(s)
+    except UnicodeEncodeError as e:
+        if errors == "strict":
+            raise UnicodeEncodeError(CODEC_NAME, s, e.start, e.end, "character isn't in the SBBS font") from None
+        if errors == "replace":
+            replacement = chr(encode_table[ord(REPLACEMENT_CHAR)])
+        elif errors == "ignore":
+            replacement = ""
+        else:
+            raise ValueError(f"Unsupported error handler \"{errors}\"") from None
+        return translated.replace(chr(0x100), replacement).encode("latin-1"), len(s)
+
+def sbbs_decode(data:bytes, errors:str="strict")->tuple[str, int]:
+    decode_table, _ = _tables()
+    data = bytes(data)
+    if errors not in ("strict", "replace", "ignore"):
+        raise ValueError(f"Unsupported error handler \"{errors}\"")
+    # Bytes past the known part of the font show up as spaces in game
+    if errors == "strict" and data and max(data) > max_val:
+        start = next(i for i,b in enumerate(data) if b > max_val)
+        raise UnicodeDecodeError(CODEC_NAME, data, start, start+1, "byte isn't in the known part of the SBBS font")
+    if errors == "ignore":
+        return data.translate(decode_table, _UNKNOWN_BYTES).decode("ascii"), len(data)
+    return data.translate(decode_table).decode("ascii"), len(data)
+
+class _Incremental_Encoder(codecs.IncrementalEncoder):
+    def encode(self, s, final=False):
+        return sbbs_encode(s, self.errors)[0]
 
-def sbbs_byte_to_ascii_char(b:int):
-    if b>max_val:
-        return " "[0]
-    return b_to_font[b]
+class _Incremental_Decoder(codecs.IncrementalDecoder):
+    def decode(self, data, final=False):
+        return sbbs_decode(data, self.errors)[0]
+
+class _Stream_Writer(codecs.StreamWriter):
+    def encode(self, s, errors="strict"):
+        return sbbs_encode(s, errors)
+
+class _Stream_Reader(codecs.StreamReader):
+    def decode(self, data, errors="strict"):
+        return sbbs_decode(data, errors)
+
+def _search(name:str):
+    if name != CODEC_NAME:
+        return None
+    return codecs.CodecInfo(name=CODEC_NAME, encode=sbbs_encode, decode=sbbs_decode,
+                            incrementalencoder=_Incremental_Encoder, incrementaldecoder=_Incremental_Decoder,
+                            streamwriter=_Stream_Writer, streamreader=_Stream_Reader)
+
+codecs.register(_search)
 
 def sbbs_bytes_to_str(data:bytes):
-    return "".join([sbbs_byte_to_ascii_char(b) for b in data])
+    return sbbs_decode(data, "replace")[0]
 
 def str_to_sbbs_idxs(s:str):
-    s_up = s.upper()
-    return [font_to_b[ord(c)] for c in s_up]
\ No newline at end of file
+    # Raises UnicodeEncodeError for characters the font doesn't have
+    return list(sbbs_encode(s)[0])
+
+def decode_names(data:bytes, stride:int, length:int, offset:int=0)->list[str]:
+    # Decodes the names of a whole table of fixed size records with one translate call
+    text = sbbs_decode(data, "replace")[0]
+    return [text[o:o+length] for o in range(offset, len(text), stride)]
+
+def encode_names(names, length:int)->bytes:
+    # Names padded with spaces to length and joined, for writing whole name tables
+    for name in names:
+        assert len(name) <= length, f"name {name} too long"
+    return sbbs_encode("".join(name.ljust(length) for name in names))[0]
@@ -0,0 +1,199 @@
+from .sbbs_char_map import sbbs_bytes_to_str
+from .sbbs_layout import SBBS_Layout, TEAM_SIZE, TEAM_COUNT, PLAYER_COUNT
+from .sbbs_player import SBBS_Player
+from .sbbs_team import SBBS_Team, SBBS_FIELD_POSITION, PitcherPlayerAssignment
+from .sbbs_team_logo import SBBS_Team_Logo
+from .snes_tile import decode_4bpp, TILE_SIZE
+from enum import Enum
+import logging
+
+class SBBS_Difference:
+    def __init__(self, kind:str, where:str, field:str, old, new):
+        self.kind = kind
+        self.where = where
+        self.field = field
+        self.old = old
+        self.new = new
+
+    def to_dict(self)->dict:
+        return {"kind": self.kind, "where": self.where, "field": self.field, "old": self.old, "new": self.new}
+
+    def __repr__(self):
+        if self.old is None:
+            return f"{self.where} {self.field}: {self.new}"
+        return f"{self.where} {self.field}: {self.old} -> {self.new}"
+
+def describe_value(value):
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, list):
+        return [describe_value(v) for v in value]
+    return value
+
+class SBBS_Diff:
+    # Compares the team table, the player array and the logo bank as whole blocks first,
+    # only the records inside blocks that differ are decoded
+    TEAM_TABLE = (SBBS_Team.TEAM_BASE, SBBS_Team.TEAM_BASE+TEAM_COUNT*TEAM_SIZE)
+    PLAYER_ARRAY = (SBBS_Player.PLAYER_BASE, SBBS_Player.PLAYER_BASE+PLAYER_COUNT*SBBS_Player.BYTE_SIZE)
+    LOGO_BANK = (SBBS_Team_Logo.TEAM_LOGO_BASE_OFF, SBBS_Team_Logo.TEAM_LOGO_BASE_OFF+SBBS_Team_Logo.TEAM_LOGO_BANK_SIZE)
+    FIELDER_FIELDS = ("name", "left_handed", "av", "hr", "r", "f", "st", "yeet", "hitter_ability")
+    PITCHER_FIELDS = ("name", "av", "hr", "pitch_r", "pitch_l", "pitch_f", "pitch_st", "pitcher_abilities")
+    PITCHER_RENAMES = {"av": "era", "hr": "spd"}
+    CHUNK_SIZE = 0x1000
+
+    def __init__(self, rom_a:"SBBS_ROM", rom_b:"SBBS_ROM"):
+        self.logger = logging.getLogger("C."+self.__class__.__name__)
+        self.rom_a = rom_a
+        self.rom_b = rom_b
+        # Pending edits have to be in the bytes that are compared. Unchanged ROMs aren't written to,
+        # so read only mappings work and stale checksums show up in the header comparison
+        rom_a.update_teams_in_rom()
+        rom_b.update_teams_in_rom()
+        self.differences = []
+        self.__diff_header()
+        self.__diff_teams()
+        self.__diff_players()
+        self.__diff_logos()
+        self.__diff_other()
+
+    def __add(self, kind:str, where:str, field:str, old, new):
+        self.differences.append(SBBS_Difference(kind, where, field, describe_value(old), describe_value(new)))
+
+    def __region(self, region:tuple)->tuple[bytes, bytes]:
+        start, end = region
+        return bytes(self.rom_a.read_bytes(start, end-start)), bytes(self.rom_b.read_bytes(start, end-start))
+
+    def __diff_header(self):
+        header_a = self.rom_a.header
+        header_b = self.rom_b.header
+        for field in ("title", "mm_mode", "speed_fast", "rom_size", "ram_size", "ntsc_byte", "checksum", "checksum_complement"):
+            old = getattr(header_a, field)
+            new = getattr(header_b, field)
+            if old != new:
+                self.__add("header", "header", field, hex(old) if "checksum" in field else old, hex(new) if "checksum" in field else new)
+
+    def __diff_teams(self):
+        table_a, table_b = self.__region(SBBS_Diff.TEAM_TABLE)
+        if table_a == table_b:
+            return
+        for idx in range(TEAM_COUNT):
+            o = idx*TEAM_SIZE
+            a = table_a[o:o+TEAM_SIZE]
+            b = table_b[o:o+TEAM_SIZE]
+            if a == b:
+                continue
+            where = f"team {idx}"
+            name = slice(SBBS_Team.NAME_OFFSET, SBBS_Team.NAME_OFFSET+SBBS_Team.NAME_LENGTH)
+            if a[name] != b[name]:
+                self.__add("team", where, "name", sbbs_bytes_to_str(a[name]).strip(), sbbs_bytes_to_str(b[name]).strip())
+            for i in range(SBBS_Team.PLAYER_MAP_SIZE):
+                old = a[SBBS_Team.PLAYER_MAP_OFFSET+i]
+                new = b[SBBS_Team.PLAYER_MAP_OFFSET+i]
+                if old & SBBS_FIELD_POSITION.MASK.value != new & SBBS_FIELD_POSITION.MASK.value:
+                    self.__add("team", f"{where} fielder {i+1}", "position", self.__position(old), self.__position(new))
+                if old & 0xf != new & 0xf:
+                    self.__add("team", f"{where} fielder {i+1}", "number", old & 0xf, new & 0xf)
+            for i in range(SBBS_Team.PITCHER_MAP_SIZE):
+                old = a[SBBS_Team.PITCHER_MAP_OFFSET+i]
+                new = b[SBBS_Team.PITCHER_MAP_OFFSET+i]
+                if old != new:
+                    self.__add("team", f"{where} pitcher {i+1}", "number", old & 0xf, new & 0xf)
+            self.__diff_unknown_bytes("team", where, a, b, SBBS_Layout.TEAM_FIELDS)
+
+    @staticmethod
+    def __position(byte:int):
+        try:
+            return SBBS_FIELD_POSITION(byte & SBBS_FIELD_POSITION.MASK.value)
+        except ValueError:
+            return hex(byte & SBBS_FIELD_POSITION.MASK.value)
+
+    def __diff_unknown_bytes(self, kind:str, where:str, a:bytes, b:bytes, field_names:list):
+        for i,(old, new) in enumerate(zip(a, b)):
+            if old != new and field_names[i] is None:
+                self.__add(kind, where, f"byte {hex(i)}", hex(old), hex(new))
+
+    @staticmethod
+    def __decode(field_name:str, record:bytes):
+        try:
+            return SBBS_Player.FIELD_BY_NAME[field_name].decode(record)
+        except ValueError:
+            field = SBBS_Player.FIELD_BY_NAME[field_name]
+            return bytes(record[field.offset:field.offset+field.size]).hex()
+
+    def __diff_players(self):
+        array_a, array_b = self.__region(SBBS_Diff.PLAYER_ARRAY)
+        if array_a == array_b:
+            return
+        size = SBBS_Player.BYTE_SIZE
+        first_pitcher = PitcherPlayerAssignment.PITCHER_PLAYER_IDX_OFFSET
+        for idx in range(PLAYER_COUNT):
+            a = array_a[idx*size:(idx+1)*size]
+            b = array_b[idx*size:(idx+1)*size]
+            if a == b:
+                continue
+            location = SBBS_Layout.get().locate(SBBS_Player.PLAYER_BASE+idx*size)
+            pitcher = idx >= first_pitcher
+            role = "pitcher" if pitcher else "fielder"
+            where = f"team {location.team_idx} {role} {location.slot+1} {sbbs_bytes_to_str(a[:SBBS_Player.NAME_LENGTH]).strip()}"
+            for field_name in (SBBS_Diff.PITCHER_FIELDS if pitcher else SBBS_Diff.FIELDER_FIELDS):
+                old = self.__decode(field_name, a)
+                new = self.__decode(field_name, b)
+                if old != new:
+                    label = SBBS_Diff.PITCHER_RENAMES.get(field_name, field_name) if pitcher else field_name
+                    if label == "era":
+                        old, new = old/100, new/100
+                    self.__add("player", where, label, old, new)
+            self.__diff_unknown_bytes("player", where, a, b, SBBS_Layout.PITCHER_FIELDS if pitcher else SBBS_Layout.FIELDER_FIELDS)
+
+    def __diff_logos(self):
+        bank_a, bank_b = self.__region(SBBS_Diff.LOGO_BANK)
+        if bank_a == bank_b:
+            return
+        layout = SBBS_Layout.get()
+        for o in range(0, len(bank_a), TILE_SIZE):
+            a = bank_a[o:o+TILE_SIZE]
+            b = bank_b[o:o+TILE_SIZE]
+            if a == b:
+                continue
+            location = layout.locate(SBBS_Diff.LOGO_BANK[0]+o)
+            pixels = sum(1 for old, new in zip(decode_4bpp(a), decode_4bpp(b)) if old != new)
+            if location.team_idx is not None:
+                self.__add("logo", f"team {location.team_idx} logo", f"tile {location.tile}", None, f"{pixels} pixels changed")
+            else:
+                self.__add("logo", "logo bank", f"tile {location.tile}", None, f"{pixels} pixels changed")
+
+    def __diff_other(self):
+        # Everything outside of the structures above, compared in chunks so equal parts are skipped quickly
+        length_a = self.rom_a.length-self.rom_a.base_offset
+        length_b = self.rom_b.length-self.rom_b.base_offset
+        if length_a != length_b:
+            self.__add("rom", "rom", "size", hex(length_a), hex(length_b))
+        known = [SBBS_Diff.TEAM_TABLE, SBBS_Diff.PLAYER_ARRAY, SBBS_Diff.LOGO_BANK,
+                 (self.rom_a.header_base-self.rom_a.base_offset, self.rom_a.header_base-self.rom_a.base_offset+0x40)]
+        ranges = []
+        length = min(length_a, length_b)
+        for start in range(0, length, SBBS_Diff.CHUNK_SIZE):
+            size = min(SBBS_Diff.CHUNK_SIZE, length-start)
+            a = self.rom_a.read_bytes(start, size)
+            b = self.rom_b.read_bytes(start, size)
+            if a == b:
+                continue
+            for i,(old, new) in enumerate(zip(a, b)):
+                offset = start+i
+                if old == new or any(s <= offset < e for s, e in known):
+                    continue
+                if ranges and ranges[-1][1] == offset:
+                    ranges[-1][1] = offset+1
+                else:
+                    ranges.append([offset, offset+1])
+        for start, end in ranges:
+            self.__add("rom", "rom", f"{hex(start)}-{hex(end)}", None, f"{end-start} bytes changed")
+
+    def __len__(self):
+        return len(self.differences)
+
+    def to_dict(self)->list[dict]:
+        return [difference.to_dict() for difference in self.differences]
+
+    def report(self)->str:
+        return "\n".join(str(difference) for difference in self.differences)
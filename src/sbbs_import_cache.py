@@ -0,0 +1,55 @@
+import json
+import logging
+import os
+
+class SBBS_Import_Cache:
+    # Sidecar manifest for SBBS_ROM.import_from. Per team it stores the content hashes of the input
+    # files and the ROM bytes they produced. If the ROM and the files are unchanged on the next import,
+    # the stored bytes are written directly instead of parsing and re-encoding the team.
+    VERSION = 1
+
+    def __init__(self, path:str, rom_hash:str):
+        self.logger = logging.getLogger("C."+self.__class__.__name__)
+        self.path = path
+        self.rom_hash = rom_hash
+        self.teams = {}
+        self.hits = 0
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                manifest = json.load(f)
+            # Stored regions are only valid for the same ROM contents
+            if manifest.get("version") == SBBS_Import_Cache.VERSION and manifest.get("rom") == rom_hash:
+                self.teams = manifest["teams"]
+            else:
+                self.logger.info(f"Ignoring import cache {path}, it was made for a different ROM")
+
+    @staticmethod
+    def hash_file(path:str)->str:
+        import hashlib
+        try:
+            with open(path, "rb") as f:
+                return hashlib.sha1(f.read()).hexdigest()
+        except FileNotFoundError:
+            return None
+
+    def lookup(self, team_idx:int, file_hashes:list[str])->list[tuple[int,bytes]]:
+        entry = self.teams.get(str(team_idx))
+        if entry is None or entry["files"] != file_hashes:
+            return None
+        self.hits += 1
+        return [(offset, bytes.fromhex(data)) for offset, data in entry["regions"]]
+
+    def store(self, team_idx:int, file_hashes:list[str], regions:list[tuple[int,bytes]]):
+        self.teams[str(team_idx)] = {
+            "files": file_hashes,
+            "regions": [(offset, bytes(data).hex()) for offset, data in regions],
+        }
+
+    def save(self):
+        manifest = {
+            "version": SBBS_Import_Cache.VERSION,
+            "rom": self.rom_hash,
+            "teams": self.teams,
+        }
+        with open(self.path, "w") as f:
+            json.dump(manifest, f)
@@ -0,0 +1,161 @@
+from .sbbs_player import SBBS_Player, SBBS_Fielder, SBBS_Pitcher
+from .sbbs_team import SBBS_Team, FieldPlayerAssignment, PitcherPlayerAssignment
+from .sbbs_team_logo import SBBS_Team_Logo
+from .snes_tile import TILE_SIZE
+from bisect import bisect_right
+
+TEAM_SIZE = 0x20
+TEAM_COUNT = SBBS_Team.MAX_TEAM_IDX+1
+PLAYER_COUNT = SBBS_Player.MAX_PLAYER_IDX+1
+
+class SBBS_Location:
+    # What a single ROM offset (without copier header) belongs to
+    TEAM = "team"
+    PLAYER = "player"
+    LOGO = "logo"
+    LOGO_BANK = "logo_bank"
+
+    def __init__(self, region:str, offset:int, start:int, end:int, team_idx:int=None, slot:int=None, player_idx:int=None, field:str=None, tile:int=None, bitplane:int=None, row:int=None):
+        self.region = region
+        self.offset = offset
+        # Bounds of the team record, player record or tile the offset is part of
+        self.start = start
+        self.end = end
+        self.team_idx = team_idx
+        self.slot = slot
+        self.player_idx = player_idx
+        self.field = field
+        self.tile = tile
+        self.bitplane = bitplane
+        self.row = row
+
+    def to_dict(self)->dict:
+        return {key: value for key,value in self.__dict__.items() if value is not None}
+
+    def __repr__(self):
+        if self.region == SBBS_Location.PLAYER:
+            role = "pitcher" if self.player_idx >= PitcherPlayerAssignment.PITCHER_PLAYER_IDX_OFFSET else "fielder"
+            return f"<{hex(self.offset)} team {self.team_idx} {role} {self.slot+1} (player {self.player_idx}) {self.field or 'unknown'}>"
+        if self.region == SBBS_Location.TEAM:
+            return f"<{hex(self.offset)} team {self.team_idx} {self.field or 'unknown'}>"
+        if self.region == SBBS_Location.LOGO:
+            return f"<{hex(self.offset)} team {self.team_idx} logo tile {self.tile} row {self.row} bitplane {self.bitplane}>"
+        return f"<{hex(self.offset)} logo bank tile {self.tile} row {self.row} bitplane {self.bitplane}>"
+
+def record_field_names(field_names, renames:dict=None)->list[str]:
+    # Name of the field stored in each byte of a player record, None where nothing is known
+    names = [None]*SBBS_Player.BYTE_SIZE
+    for name in field_names:
+        field = SBBS_Player.FIELD_BY_NAME[name]
+        label = (renames or {}).get(name, name)
+        for i in range(field.size):
+            names[field.offset+i] = f"{label}[{i}]" if field.count > 1 else label
+    return names
+
+def team_field_names()->list[str]:
+    names = [None]*TEAM_SIZE
+    for i in range(SBBS_Team.NAME_LENGTH):
+        names[SBBS_Team.NAME_OFFSET+i] = "name"
+    for i in range(SBBS_Team.PLAYER_MAP_SIZE):
+        names[SBBS_Team.PLAYER_MAP_OFFSET+i] = f"fielder_map[{i}]"
+    for i in range(SBBS_Team.PITCHER_MAP_SIZE):
+        names[SBBS_Team.PITCHER_MAP_OFFSET+i] = f"pitcher_map[{i}]"
+    return names
+
+class SBBS_Layout:
+    # Sorted, non overlapping intervals built from the layout constants.
+    # Offsets are resolved with one bisect, the byte inside an interval through per-kind tables
+    FIELDER_FIELDS = record_field_names(SBBS_Fielder.ENCODED_FIELDS)
+    PITCHER_FIELDS = record_field_names(SBBS_Pitcher.ENCODED_FIELDS+("av", "hr"), {"av": "era", "hr": "spd"})
+    TEAM_FIELDS = team_field_names()
+
+    __layout = None
+
+    def __init__(self):
+        intervals = []
+        for team_idx in range(TEAM_COUNT):
+            start = SBBS_Team.TEAM_BASE+team_idx*TEAM_SIZE
+            intervals.append((start, start+TEAM_SIZE, SBBS_Location.TEAM, team_idx, None))
+        for player_idx in range(PLAYER_COUNT):
+            start = SBBS_Player.PLAYER_BASE+player_idx*SBBS_Player.BYTE_SIZE
+            intervals.append((start, start+SBBS_Player.BYTE_SIZE, SBBS_Location.PLAYER, player_idx, None))
+        logo_tiles = set()
+        for team_idx, high_off in SBBS_Team_Logo.TEAM_LOGO_MAPPING_HIGH.items():
+            for half, half_off in enumerate((0, SBBS_Team_Logo.TEAM_LOGO_MAPPING_LOW_OFF)):
+                for i in range(SBBS_Team_Logo.TEAM_LOGO_TILES_WIDE):
+                    start = SBBS_Team_Logo.TEAM_LOGO_BASE_OFF+high_off+half_off+i*TILE_SIZE
+                    intervals.append((start, start+TILE_SIZE, SBBS_Location.LOGO, team_idx, half*SBBS_Team_Logo.TEAM_LOGO_TILES_WIDE+i))
+                    logo_tiles.add(start)
+        # Tiles of the logo bank that no team logo uses
+        for start in range(SBBS_Team_Logo.TEAM_LOGO_BASE_OFF, SBBS_Team_Logo.TEAM_LOGO_BASE_OFF+SBBS_Team_Logo.TEAM_LOGO_BANK_SIZE, TILE_SIZE):
+            if start not in logo_tiles:
+                intervals.append((start, start+TILE_SIZE, SBBS_Location.LOGO_BANK, None, None))
+        intervals.sort()
+        for (_, end, *_), (start, *_) in zip(intervals, intervals[1:]):
+            assert end <= start, f"Layout intervals overlap at {hex(start)}"
+        self.intervals = intervals
+        self.starts = [interval[0] for interval in intervals]
+
+    @classmethod
+    def get(cls)->"SBBS_Layout":
+        if cls.__layout is None:
+            cls.__layout = SBBS_Layout()
+        return cls.__layout
+
+    def __find(self, offset:int)->int:
+        # Index of the interval containing offset or -1
+        i = bisect_right(self.starts, offset)-1
+        if i >= 0 and offset < self.intervals[i][1]:
+            return i
+        return -1
+
+    def __location(self, i:int, offset:int)->SBBS_Location:
+        start, end, region, idx, tile = self.intervals[i]
+        rel = offset-start
+        if region == SBBS_Location.TEAM:
+            return SBBS_Location(region, offset, start, end, team_idx=idx, field=SBBS_Layout.TEAM_FIELDS[rel])
+        if region == SBBS_Location.PLAYER:
+            if idx < PitcherPlayerAssignment.PITCHER_PLAYER_IDX_OFFSET:
+                team_idx, slot = divmod(idx, FieldPlayerAssignment.FIELD_PLAYER_IDX_STEP)
+                field = SBBS_Layout.FIELDER_FIELDS[rel]
+            else:
+                team_idx, slot = divmod(idx-PitcherPlayerAssignment.PITCHER_PLAYER_IDX_OFFSET, PitcherPlayerAssignment.PITCHER_PLAYER_IDX_STEP)
+                field = SBBS_Layout.PITCHER_FIELDS[rel]
+            return SBBS_Location(region, offset, start, end, team_idx=team_idx, slot=slot, player_idx=idx, field=field)
+        # 4bpp tiles store bitplanes 0/1 interleaved per row, then 2/3
+        row = (rel & 0xf) >> 1
+        bitplane = (rel >> 4)*2 + (rel & 1)
+        if region == SBBS_Location.LOGO:
+            return SBBS_Location(region, offset, start, end, team_idx=idx, tile=tile, bitplane=bitplane, row=row)
+        bank_tile = (start-SBBS_Team_Logo.TEAM_LOGO_BASE_OFF)//TILE_SIZE
+        return SBBS_Location(region, offset, start, end, tile=bank_tile, bitplane=bitplane, row=row)
+
+    def locate(self, offset:int)->SBBS_Location:
+        i = self.__find(offset)
+        if i < 0:
+            return None
+        return self.__location(i, offset)
+
+    def locate_range(self, start:int, end:int)->list[SBBS_Location]:
+        # One location per known byte in start-end
+        locations = []
+        i = bisect_right(self.starts, start)-1
+        if i < 0 or start >= self.intervals[i][1]:
+            i += 1
+        while i < len(self.intervals) and self.intervals[i][0] < end:
+            interval_start, interval_end = self.intervals[i][:2]
+            for offset in range(max(start, interval_start), min(end, interval_end)):
+                locations.append(self.__location(i, offset))
+            i += 1
+        return locations
+
+    def locate_fields(self, start:int, end:int)->list[SBBS_Location]:
+        # Like locate_range, but only the first byte of every touched field or tile bitplane
+        seen = set()
+        locations = []
+        for location in self.locate_range(start, end):
+            key = (location.start, location.field, location.bitplane)
+            if key not in seen:
+                seen.add(key)
+                locations.append(location)
+        return locations
@@ -0,0 +1,110 @@
+from .sbbs_team_logo import SBBS_Team_Logo
+from .snes_tile import SNES_Tile_4bpp, TILE_SIZE, TILE_PIXELS, tiles_to_rows, rows_to_tiles
+import logging
+import os
+
+class SBBS_Logo_Atlas:
+    # All team logos, or any run of tiles from the logo bank, as one indexed image that uses
+    # TEAM_LOGO_COLOR_MAP as its palette. The pixel data goes in and out with one frombytes/tobytes call
+    DEFAULT_COLUMNS = 6
+    DEFAULT_BANK_TILES_WIDE = 16
+    # PNG text chunk with the number of tiles in a bank atlas, the last row is padded with empty tiles
+    TILE_COUNT_KEY = "sbbs1k_tiles"
+
+    def __init__(self, rom:"SBBS_ROM"):
+        self.logger = logging.getLogger("C."+self.__class__.__name__)
+        self.rom = rom
+
+    @staticmethod
+    def __image(indices:bytes, width:int, height:int)->"PIL.Image.Image":
+        import PIL.Image
+        image = PIL.Image.frombytes("P", (width, height), bytes(indices))
+        image.putpalette(SBBS_Team_Logo.palette())
+        image.info["transparency"] = 0
+        return image
+
+    @staticmethod
+    def __open(path:str)->"PIL.Image.Image":
+        import PIL.Image
+        image = PIL.Image.open(path)
+        if image.mode == "P":
+            # Indices past the end of a short palette would otherwise all turn into the same color
+            colors = len(image.getpalette() or [])//3
+            highest = max(image.tobytes(), default=0)
+            assert highest < colors, f"{path} uses palette index {highest} but its palette only has {colors} colors"
+        return image
+
+    @staticmethod
+    def __logo_grid(columns:int)->tuple[int, int, int]:
+        logo_w, logo_h = SBBS_Team_Logo.TEAM_LOGO_PIXEL_DIMS
+        rows = -(-len(SBBS_Team_Logo.TEAM_LOGO_MAPPING_HIGH)//columns)
+        return columns*logo_w, rows*logo_h, logo_w
+
+    @staticmethod
+    def __is_png(path:str)->bool:
+        return os.path.splitext(path)[1].lower() == ".png"
+
+    def export_teams(self, path:str, columns:int=DEFAULT_COLUMNS):
+        # Logos are laid out row by row, team 0 top left
+        width, height, logo_w = self.__logo_grid(columns)
+        logo_h = SBBS_Team_Logo.TEAM_LOGO_PIXEL_DIMS[1]
+        atlas = bytearray(width*height)
+        for idx,team in enumerate(self.rom.teams):
+            indices = team.logo.get_indices()
+            o = (idx//columns)*logo_h*width + (idx%columns)*logo_w
+            for r in range(logo_h):
+                atlas[o+r*width:o+r*width+logo_w] = indices[r*logo_w:(r+1)*logo_w]
+        self.__image(atlas, width, height).save(path)
+
+    def import_teams(self, path:str, columns:int=DEFAULT_COLUMNS)->int:
+        width, height, logo_w = self.__logo_grid(columns)
+        logo_h = SBBS_Team_Logo.TEAM_LOGO_PIXEL_DIMS[1]
+        image = self.__open(path)
+        assert image.size == (width, height), f"Logo atlas has to be {width}x{height} for {columns} columns, {path} is {image.size[0]}x{image.size[1]}"
+        atlas = SBBS_Team_Logo.image_to_indices(image)
+        changed = 0
+        for idx,team in enumerate(self.rom.teams):
+            o = (idx//columns)*logo_h*width + (idx%columns)*logo_w
+            indices = b"".join(atlas[o+r*width:o+r*width+logo_w] for r in range(logo_h))
+            logo = team.logo
+            logo.set_indices(indices)
+            if logo.dirty:
+                changed += 1
+                logo.update_in_rom()
+        return changed
+
+    def export_bank(self, path:str, first_tile:int=0, count:int=None, tiles_wide:int=DEFAULT_BANK_TILES_WIDE):
+        indices = SBBS_Team_Logo.decode_bank(self.rom, first_tile, count)
+        count = len(indices)//TILE_PIXELS
+        tiles_wide = min(tiles_wide, count)
+        rows = tiles_to_rows(indices, tiles_wide)
+        image = self.__image(rows, tiles_wide*8, len(rows)//(tiles_wide*8))
+        if self.__is_png(path):
+            import PIL.PngImagePlugin
+            info = PIL.PngImagePlugin.PngInfo()
+            info.add_text(SBBS_Logo_Atlas.TILE_COUNT_KEY, str(count))
+            image.save(path, pnginfo=info)
+        else:
+            image.save(path)
+
+    def import_bank(self, path:str, first_tile:int=0, count:int=None):
+        # Without the count written by export_bank the padding can't be told apart from empty tiles
+        assert count is not None or self.__is_png(path), f"{path} has no tile count, give it as FIRST:COUNT"
+        image = self.__open(path)
+        width, height = image.size
+        tiles = rows_to_tiles(SBBS_Team_Logo.image_to_indices(image), width, height)
+        available = len(tiles)//TILE_PIXELS
+        # PNGs saved by other programs may have lost the count
+        stored = image.info.get(SBBS_Logo_Atlas.TILE_COUNT_KEY)
+        assert stored is not None or count is not None, f"{path} has no tile count, give it as FIRST:COUNT"
+        if stored is not None:
+            available = min(available, int(stored))
+        if count is None:
+            count = available
+        assert count <= available, f"{path} only holds {available} tiles, {count} were asked for"
+        max_count = SBBS_Team_Logo.TEAM_LOGO_BANK_SIZE//TILE_SIZE - first_tile
+        assert 0 <= first_tile and count <= max_count, f"Tiles {first_tile}-{first_tile+count} are outside of the logo bank"
+        # Pending logo edits go in first, the parsed logos are dropped afterwards since their bytes changed
+        self.rom.update_in_rom()
+        self.rom.replace_byte_range(SBBS_Team_Logo.TEAM_LOGO_BASE_OFF+first_tile*TILE_SIZE, SNES_Tile_4bpp.encode_many(tiles[:count*TILE_PIXELS]))
+        self.rom.load_teams()
@@ -1,7 +1,10 @@
 #from .sbbs_rom import SBBS_ROM
 from .sbbs_char_map import *
+from .dirty_tracked import Dirty_Tracked
+from .profiling import timed
 from enum import Enum
 import logging
+import struct
 
 class PitcherAbility(Enum):
     NOTHING = 0x00
@@ -50,7 +53,90 @@ class HitterAbility(Enum):
     INVAL_5 = 0x14
     
 
-class SBBS_Player:
+# BCD lookup tables, 0x42 stands for 42. Values up to 159 still fit into a byte
+BCD_DECODE = tuple((b&0xf)+(b>>4)*10 for b in range(256))
+BCD_ENCODE = tuple((v//10)*16 + (v%10) for v in range(160))
+
+class SBBS_Player_Field:
+    # One field of the 24 byte player record, offsets are relative to the start of the record.
+    # decode/encode work on the record unpacked into one int per byte
+    RAW = 0
+    BCD = 1
+    BCD_WORD = 2 # low byte BCD, high byte hundreds
+    FLAG = 3 # bit 0
+    NAME = 4
+    ENUM = 5
+
+    def __init__(self, name:str, offset:int, kind:int=RAW, enum=None, count:int=1):
+        self.name = name
+        self.offset = offset
+        self.kind = kind
+        self.enum = enum
+        self.count = count
+        self.size = 2 if kind == SBBS_Player_Field.BCD_WORD else count
+        self.decode, self.encode = self.__compile()
+
+    def __compile(self):
+        o = self.offset
+        kind = self.kind
+        if kind == SBBS_Player_Field.RAW:
+            def decode(record):
+                return record[o]
+            def encode(record, value):
+                record[o] = value
+        elif kind == SBBS_Player_Field.BCD:
+            def decode(record):
+                return BCD_DECODE[record[o]]
+            def encode(record, value):
+                record[o] = encode_bcd(value)
+        elif kind == SBBS_Player_Field.BCD_WORD:
+            def decode(record):
+                return record[o+1]*100+BCD_DECODE[record[o]]
+            def encode(record, value):
+                record[o+1] = value//100
+                record[o] = BCD_ENCODE[value%100]
+        elif kind == SBBS_Player_Field.FLAG:
+            def decode(record):
+                return (record[o] & 0x01) == 1
+            def encode(record, value):
+                record[o] = record[o] | 1 if value else record[o] & 0xfe
+        elif kind == SBBS_Player_Field.NAME:
+            n = self.count
+            def decode(record):
+                return sbbs_bytes_to_str(bytes(record[o:o+n]))
+            def encode(record, value):
+                name_bytes = bytes(str_to_sbbs_idxs(value))
+                assert len(name_bytes)<=n, f"name {value} too long"
+                record[o:o+len(name_bytes)] = name_bytes
+        elif kind == SBBS_Player_Field.ENUM:
+            enum = self.enum
+            members = {member.value: member for member in enum}
+            def decode_member(b):
+                member = members.get(b)
+                if member is None:
+                    raise ValueError(f"{b} is not a valid {enum.__name__}")
+                return member
+            if self.count == 1:
+                def decode(record):
+                    return decode_member(record[o])
+                def encode(record, value):
+                    record[o] = value.value
+            else:
+                n = self.count
+                def decode(record):
+                    return [decode_member(b) for b in record[o:o+n]]
+                def encode(record, value):
+                    for i in range(n):
+                        record[o+i] = value[i].value
+        else:
+            raise ValueError(f"Unknown field kind {kind}")
+        return decode, encode
+
+def encode_bcd(val:int)->int:
+    assert 0 <= val < len(BCD_ENCODE), f"{val} can't be stored as BCD byte"
+    return BCD_ENCODE[val]
+
+class SBBS_Player(Dirty_Tracked):
     NAME_LENGTH = 5
     BYTE_SIZE = 24
     PLAYER_BASE = 0x18252
@@ -68,86 +154,93 @@ class SBBS_Player:
     PITCH_ST_OFF = 0xe
     PITCHER_ABILITY_OFF = 0x10
     HITTER_ABILITY_OFF = 0x10
-    def __init__(self, rom:"SBBS_ROM", idx:int):
+
+    # The whole record is unpacked with one struct call, one int per byte
+    RECORD = struct.Struct(f"<{BYTE_SIZE}B")
+    FIELDS = (
+        SBBS_Player_Field("name", 0, SBBS_Player_Field.NAME, count=NAME_LENGTH),
+        SBBS_Player_Field("left_handed", HANDED_OFF, SBBS_Player_Field.FLAG),
+        SBBS_Player_Field("av", AV_OFF, SBBS_Player_Field.BCD_WORD),
+        SBBS_Player_Field("hr", HR_OFF, SBBS_Player_Field.BCD),
+        SBBS_Player_Field("r", R_OFF),
+        SBBS_Player_Field("pitch_r", PITCH_R_OFF),
+        SBBS_Player_Field("pitch_l", PITCH_L_OFF),
+        SBBS_Player_Field("f", F_OFF, SBBS_Player_Field.BCD),
+        SBBS_Player_Field("yeet", YEET_OFF),
+        SBBS_Player_Field("pitch_f", F_OFF),
+        SBBS_Player_Field("st", ST_OFF),
+        SBBS_Player_Field("pitch_st", PITCH_ST_OFF),
+        SBBS_Player_Field("hitter_ability", HITTER_ABILITY_OFF, SBBS_Player_Field.ENUM, HitterAbility),
+        SBBS_Player_Field("pitcher_abilities", PITCHER_ABILITY_OFF, SBBS_Player_Field.ENUM, PitcherAbility, 4),
+    )
+    FIELD_BY_NAME = {field.name: field for field in FIELDS}
+
+    TRACKED_ATTRIBUTES = ("name", "left_handed", "handedness", "av", "era", "hr", "spd", "r", "pitch_r", "pitch_l",
+                          "f", "yeet", "pitch_f", "st", "pitch_st", "hitter_ability", "pitcher_abilities")
+    @timed("player.parse")
+    def __init__(self, rom:"SBBS_ROM", idx:int, record:tuple=None):
         assert idx <= SBBS_Player.MAX_PLAYER_IDX, f"Player idx({idx}) is bigger than max player idx: {SBBS_Player.MAX_PLAYER_IDX}"
         self.rom = rom
         self.idx = idx
         self.name = ""
         self.base_off = SBBS_Player.PLAYER_BASE + SBBS_Player.BYTE_SIZE*idx
-        self.__try_parse()
+        self.__try_parse(record)
+        self.mark_clean()
+
+    @classmethod
+    def unpack_records(cls, rom:"SBBS_ROM", first_idx:int, count:int)->list[tuple]:
+        # Unpacks the records of count consecutive players in one go
+        assert first_idx+count-1 <= SBBS_Player.MAX_PLAYER_IDX, f"Player idx({first_idx+count-1}) is bigger than max player idx: {SBBS_Player.MAX_PLAYER_IDX}"
+        return rom.iter_unpack(SBBS_Player.RECORD, SBBS_Player.PLAYER_BASE + SBBS_Player.BYTE_SIZE*first_idx, count)
 
     def decode_hex_bdr(self, val):
-        return (val&0xf)+(val>>4)*10
+        return BCD_DECODE[val]
     
     def encode_hex_bdr(self, val):
-        return (val//10)*16 + (val%10)
+        return encode_bcd(val)
 
-    def __try_parse(self):
-        self.name_bytes = self.rom.read_bytes(self.base_off, SBBS_Player.NAME_LENGTH)
-        self.name = sbbs_bytes_to_str(self.name_bytes)
-        handed_byte = self.rom.read_bytes(self.base_off+SBBS_Player.HANDED_OFF, 1)[0]
-        self.left_handed = (handed_byte & 0x01) == 1
+    def __try_parse(self, record:tuple=None):
+        if record is None:
+            record = self.rom.unpack_from(SBBS_Player.RECORD, self.base_off)
+        for field in SBBS_Player.FIELDS:
+            setattr(self, field.name, field.decode(record))
+        self.name_bytes = bytes(record[0:SBBS_Player.NAME_LENGTH])
         self.handedness = "L" if self.left_handed else "R"
-        av_bytes = self.rom.read_bytes(self.base_off+SBBS_Player.AV_OFF, 2)
-        self.av = av_bytes[1]*100+self.decode_hex_bdr(av_bytes[0])
         self.era = self.av/100.0
-        hr_byte = self.rom.read_bytes(self.base_off+SBBS_Player.HR_OFF, 1)[0]
-        self.hr = self.decode_hex_bdr(hr_byte)
         self.spd = self.hr
-        r_byte = self.rom.read_bytes(self.base_off+SBBS_Player.R_OFF,1)[0]
-        self.r = r_byte
-        pitch_r_byte = self.rom.read_bytes(self.base_off+SBBS_Player.PITCH_R_OFF,1)[0]
-        self.pitch_r = pitch_r_byte
-        pitch_l_byte = self.rom.read_bytes(self.base_off+SBBS_Player.PITCH_L_OFF,1)[0]
-        self.pitch_l = pitch_l_byte
-        f_byte = self.rom.read_bytes(self.base_off+SBBS_Player.F_OFF,1)[0]
-        self.f = self.decode_hex_bdr(f_byte)
-        self.yeet = self.rom.read_bytes(self.base_off+SBBS_Player.YEET_OFF,1)[0]
-        self.pitch_f = f_byte
-        st_byte = self.rom.read_bytes(self.base_off+SBBS_Player.ST_OFF,1)[0]
-        self.st = st_byte
-        pitch_st_byte = self.rom.read_bytes(self.base_off+SBBS_Player.PITCH_ST_OFF,1)[0]
-        self.pitch_st = pitch_st_byte
-        pitcher_ability_bytes = self.rom.read_bytes(self.base_off+SBBS_Player.PITCHER_ABILITY_OFF,4)
-        hitter_ability_byte = self.rom.read_bytes(self.base_off+SBBS_Player.HITTER_ABILITY_OFF,1)[0]
-        self.hitter_ability = HitterAbility(hitter_ability_byte)
-        self.pitcher_abilities = [PitcherAbility(b) for b in pitcher_ability_bytes]
+
+    def read_record(self)->list[int]:
+        return list(self.rom.unpack_from(SBBS_Player.RECORD, self.base_off))
+
+    def encode_fields(self, record:list[int], field_names)->None:
+        for name in field_names:
+            SBBS_Player.FIELD_BY_NAME[name].encode(record, getattr(self, name))
 
     def __repr__(self):
         return f"<{self.name} ({hex(self.base_off)})>"
     
+    @timed("player.encode")
     def update_in_rom(self):
+        if not self.dirty:
+            return
         self.rom.replace_byte_range(self.base_off, self.to_bytes())
+        self.mark_clean()
     
 class SBBS_Fielder(SBBS_Player):
-    def __init__(self, rom, idx):
-        super().__init__(rom, idx)
+    ENCODED_FIELDS = ("name", "hitter_ability", "left_handed", "av", "hr", "r", "f", "st", "yeet")
+
+    def __init__(self, rom, idx, record=None):
+        super().__init__(rom, idx, record)
 
     def __repr__(self):
         return f"<{self.name} ({hex(self.base_off)}) - ({self.handedness}) ST:{self.st} - AV:{self.av} - HR:{self.hr} - R:{self.r} - F:{self.f} - YEET:{self.yeet} - PWR:{self.hitter_ability.name}>"
     
     def to_bytes(self):
-        data = bytearray(self.rom.read_bytes(self.base_off, SBBS_Player.BYTE_SIZE))
-        
-        name_bytes = bytes(str_to_sbbs_idxs(self.name))
-        #print(name_bytes)
-        assert len(name_bytes)<=SBBS_Player.NAME_LENGTH, f"name {self.name} too long"
-        data[0:len(name_bytes)] = name_bytes
-        data[SBBS_Player.HITTER_ABILITY_OFF] = self.hitter_ability.value
+        record = self.read_record()
+        self.encode_fields(record, SBBS_Fielder.ENCODED_FIELDS)
         if self.hitter_ability!= HitterAbility.NOTHING:
-            data[SBBS_Player.HITTER_ABILITY_OFF+1] = 1
-        if self.left_handed:
-            data[SBBS_Player.HANDED_OFF] = data[SBBS_Player.HANDED_OFF] | 1
-        else:
-            data[SBBS_Player.HANDED_OFF] = data[SBBS_Player.HANDED_OFF] & 0xfe
-        data[SBBS_Player.AV_OFF+1] = self.av//100
-        data[SBBS_Player.AV_OFF] = self.encode_hex_bdr(self.av%100)
-        data[SBBS_Player.HR_OFF] = self.encode_hex_bdr(self.hr)
-        data[SBBS_Player.R_OFF] = self.r
-        data[SBBS_Player.F_OFF] = self.f
-        data[SBBS_Player.ST_OFF] = self.st
-        data[SBBS_Player.YEET_OFF] = self.yeet
-        return data
+            record[SBBS_Player.HITTER_ABILITY_OFF+1] = 1
+        return SBBS_Player.RECORD.pack(*record)
     
     def to_dict(self):
         data = {
@@ -176,8 +269,10 @@ class SBBS_Fielder(SBBS_Player):
         self.hitter_ability =  HitterAbility[data["pwr"]]
     
 class SBBS_Pitcher(SBBS_Player):
-    def __init__(self, rom, idx):
-        super().__init__(rom, idx)
+    ENCODED_FIELDS = ("name", "pitcher_abilities", "pitch_r", "pitch_l", "pitch_f", "pitch_st")
+
+    def __init__(self, rom, idx, record=None):
+        super().__init__(rom, idx, record)
 
     def __repr__(self):
         powers_str = ", ".join([pa.name for pa in self.pitcher_abilities])
@@ -186,7 +281,7 @@ class SBBS_Pitcher(SBBS_Player):
     def to_dict(self):
         data = {
             "name": self.name,
-            "era": int(self.era*100),
+            "era": round(self.era*100),
             "spd": self.spd,
             "r": self.pitch_r,
             "l": self.pitch_l,
@@ -197,25 +292,13 @@ class SBBS_Pitcher(SBBS_Player):
         return data
     
     def to_bytes(self):
-        data = bytearray(self.rom.read_bytes(self.base_off, SBBS_Player.BYTE_SIZE))
-        name_bytes = bytes(str_to_sbbs_idxs(self.name))
-        #print(name_bytes)
-        assert len(name_bytes)<=SBBS_Player.NAME_LENGTH, f"name {self.name} too long"
-        data[0:len(name_bytes)] = name_bytes
-        for i in range(4):
-            data[SBBS_Player.PITCHER_ABILITY_OFF+i] = self.pitcher_abilities[i].value
-
+        record = self.read_record()
+        self.encode_fields(record, SBBS_Pitcher.ENCODED_FIELDS)
         # ERA and AV are encoded exactly the same
-        era_int = int(self.era*100)
-        data[SBBS_Player.AV_OFF+1] = (era_int)//100
-        data[SBBS_Player.AV_OFF] = self.encode_hex_bdr(era_int%100)
+        SBBS_Player.FIELD_BY_NAME["av"].encode(record, round(self.era*100))
         # HR and SPD are encoded exactly the same
-        data[SBBS_Player.HR_OFF] = self.encode_hex_bdr(self.spd)
-        data[SBBS_Player.PITCH_R_OFF] = self.pitch_r
-        data[SBBS_Player.PITCH_L_OFF] = self.pitch_l
-        data[SBBS_Player.F_OFF] = self.pitch_f
-        data[SBBS_Player.PITCH_ST_OFF] = self.pitch_st
-        return data
+        SBBS_Player.FIELD_BY_NAME["hr"].encode(record, self.spd)
+        return SBBS_Player.RECORD.pack(*record)
     
     def from_dict(self, data:dict):
         self.name = data["name"]
@@ -0,0 +1,188 @@
+from .sbbs_player import SBBS_Player, SBBS_Player_Field, HitterAbility, PitcherAbility, BCD_DECODE, BCD_ENCODE
+from .sbbs_char_map import decode_names
+from .sbbs_team import FieldPlayerAssignment, PitcherPlayerAssignment
+from array import array
+import logging
+
+class SBBS_Player_Table:
+    # Columnar view over the whole player region. Every column holds one value per player,
+    # fielders first (12 per team), then pitchers (6 per team).
+    # Columns can be changed in place, write_back() encodes the changed records into the ROM
+    PLAYER_COUNT = SBBS_Player.MAX_PLAYER_IDX+1
+    FIELDER_COUNT = PitcherPlayerAssignment.PITCHER_PLAYER_IDX_OFFSET
+    PITCHER_ABILITY_COLUMNS = tuple(f"pitcher_ability_{i}" for i in range(4))
+    # Pitchers use the same bytes as fielders for some of their values
+    ALIASES = {"spd": "hr", "era": "av"}
+    # Columns that mean something for each role. The others read the same bytes differently,
+    # e.g. f is the BCD fielding value of a fielder and pitch_f the raw F value of a pitcher
+    ROLE_COLUMNS = {
+        "fielders": ("name", "left_handed", "av", "hr", "r", "f", "yeet", "st", "hitter_ability"),
+        "pitchers": ("name", "left_handed", "av", "hr", "era", "spd", "pitch_r", "pitch_l", "pitch_f", "pitch_st") + PITCHER_ABILITY_COLUMNS,
+    }
+    MAX_VALUES = {
+        SBBS_Player_Field.BCD: len(BCD_ENCODE)-1,
+        SBBS_Player_Field.BCD_WORD: 255*100+99,
+        SBBS_Player_Field.RAW: 0xff,
+        SBBS_Player_Field.FLAG: 1,
+    }
+
+    def __init__(self, rom:"SBBS_ROM"):
+        self.logger = logging.getLogger("C."+self.__class__.__name__)
+        self.rom = rom
+        # Pending edits on the object model have to be in the ROM before it's read
+        rom.update_in_rom()
+        self.records = SBBS_Player.unpack_records(rom, 0, SBBS_Player_Table.PLAYER_COUNT)
+        self.columns = {}
+        self.fields = {}
+        self.__build_columns()
+        self.original = {name: column[:] for name,column in self.columns.items()}
+
+    def __build_columns(self):
+        # One tuple per byte offset over all players
+        byte_columns = list(zip(*self.records))
+        data = bytes(self.rom.read_bytes(SBBS_Player.PLAYER_BASE, SBBS_Player.BYTE_SIZE*SBBS_Player_Table.PLAYER_COUNT))
+        for field in SBBS_Player.FIELDS:
+            o = field.offset
+            if field.kind == SBBS_Player_Field.NAME:
+                column = decode_names(data, SBBS_Player.BYTE_SIZE, field.count, o)
+            elif field.kind == SBBS_Player_Field.RAW:
+                column = array("B", byte_columns[o])
+            elif field.kind == SBBS_Player_Field.BCD:
+                column = array("B", [BCD_DECODE[b] for b in byte_columns[o]])
+            elif field.kind == SBBS_Player_Field.BCD_WORD:
+                column = array("H", [hi*100+BCD_DECODE[lo] for lo,hi in zip(byte_columns[o], byte_columns[o+1])])
+            elif field.kind == SBBS_Player_Field.FLAG:
+                column = array("B", [b & 1 for b in byte_columns[o]])
+            elif field.count == 1:
+                column = array("B", byte_columns[o])
+            else:
+                # Abilities stay raw ints, one column per slot
+                for i,name in enumerate(SBBS_Player_Table.PITCHER_ABILITY_COLUMNS):
+                    self.columns[name] = array("B", byte_columns[o+i])
+                    self.fields[name] = (field, i)
+                continue
+            self.columns[field.name] = column
+            self.fields[field.name] = (field, None)
+
+    def __getitem__(self, name:str):
+        return self.columns[SBBS_Player_Table.ALIASES.get(name, name)]
+
+    def __len__(self):
+        return SBBS_Player_Table.PLAYER_COUNT
+
+    def column_names(self)->list[str]:
+        return list(self.columns.keys())
+
+    @staticmethod
+    def is_pitcher(row:int)->bool:
+        return row >= SBBS_Player_Table.FIELDER_COUNT
+
+    @staticmethod
+    def team_idx(row:int)->int:
+        if row < SBBS_Player_Table.FIELDER_COUNT:
+            return row//FieldPlayerAssignment.FIELD_PLAYER_IDX_STEP
+        return (row-SBBS_Player_Table.FIELDER_COUNT)//PitcherPlayerAssignment.PITCHER_PLAYER_IDX_STEP
+
+    @staticmethod
+    def role_columns(fielders:bool=True, pitchers:bool=True)->set[str]:
+        # Columns that can be changed for every selected role
+        roles = [role for role, selected in (("fielders", fielders), ("pitchers", pitchers)) if selected]
+        return set.intersection(*[set(SBBS_Player_Table.ROLE_COLUMNS[role]) for role in roles])
+
+    @staticmethod
+    def rows(fielders:bool=True, pitchers:bool=True, team_idx:int=None)->range:
+        fielder_step = FieldPlayerAssignment.FIELD_PLAYER_IDX_STEP
+        pitcher_step = PitcherPlayerAssignment.PITCHER_PLAYER_IDX_STEP
+        first = SBBS_Player_Table.FIELDER_COUNT
+        if team_idx is not None:
+            if fielders and pitchers:
+                raise ValueError("A team's fielders and pitchers aren't consecutive, ask for them separately")
+            if fielders:
+                return range(team_idx*fielder_step, (team_idx+1)*fielder_step)
+            return range(first+team_idx*pitcher_step, first+(team_idx+1)*pitcher_step)
+        if fielders and pitchers:
+            return range(SBBS_Player_Table.PLAYER_COUNT)
+        if fielders:
+            return range(first)
+        return range(first, SBBS_Player_Table.PLAYER_COUNT)
+
+    def changed_rows(self, name:str)->list[int]:
+        column = self.columns[name]
+        original = self.original[name]
+        if column == original:
+            return []
+        return [row for row,(a,b) in enumerate(zip(column, original)) if a != b]
+
+    def validate(self):
+        # Range checks over whole columns, so nothing is half written when a value is off
+        for name,column in self.columns.items():
+            field, _ = self.fields[name]
+            if field.kind == SBBS_Player_Field.NAME:
+                continue
+            if field.kind == SBBS_Player_Field.ENUM:
+                enum = HitterAbility if name == "hitter_ability" else PitcherAbility
+                valid = {member.value for member in enum}
+                invalid = set(column) - valid
+                assert not invalid, f"Invalid {enum.__name__} values in column {name}: {sorted(invalid)}"
+                continue
+            max_value = SBBS_Player_Table.MAX_VALUES[field.kind]
+            assert max(column) <= max_value, f"Column {name} has values above {max_value}: row {column.index(max(column))}"
+
+    def __check_overlaps(self, row:int, names:list[str]):
+        # Columns that share a byte can't both be changed, only the last one would end up in the ROM
+        owners = {}
+        for name in names:
+            field, slot = self.fields[name]
+            if slot is not None:
+                offsets = [field.offset+slot]
+            elif field.kind == SBBS_Player_Field.ENUM and name == "hitter_ability":
+                # The byte after it flags whether the ability is set
+                offsets = [field.offset, field.offset+1]
+            else:
+                offsets = range(field.offset, field.offset+field.size)
+            for o in offsets:
+                assert o not in owners, f"Row {row} changes {owners[o]} and {name}, which are stored in the same byte"
+                owners[o] = name
+
+    def write_back(self)->int:
+        self.validate()
+        changed = {}
+        for name in self.columns:
+            for row in self.changed_rows(name):
+                changed.setdefault(row, []).append(name)
+        if not changed:
+            return 0
+        for row, names in changed.items():
+            self.__check_overlaps(row, names)
+            role = "pitchers" if SBBS_Player_Table.is_pitcher(row) else "fielders"
+            invalid = [name for name in names if name not in SBBS_Player_Table.ROLE_COLUMNS[role]]
+            assert not invalid, f"Row {row} belongs to the {role}, {', '.join(invalid)} use bytes that hold other values for them"
+        for row in sorted(changed):
+            record = list(self.records[row])
+            for name in changed[row]:
+                field, slot = self.fields[name]
+                value = self.columns[name][row]
+                if slot is not None:
+                    record[field.offset+slot] = value
+                elif field.kind == SBBS_Player_Field.ENUM:
+                    record[field.offset] = value
+                    if value != HitterAbility.NOTHING.value and not SBBS_Player_Table.is_pitcher(row):
+                        # Same as SBBS_Fielder.to_bytes
+                        record[field.offset+1] = 1
+                else:
+                    field.encode(record, value)
+            self.records[row] = tuple(record)
+        # Consecutive changed records are written with one call
+        rows = sorted(changed)
+        start = rows[0]
+        for i,row in enumerate(rows):
+            if i+1 == len(rows) or rows[i+1] != row+1:
+                data = b"".join([SBBS_Player.RECORD.pack(*self.records[r]) for r in range(start, row+1)])
+                self.rom.replace_byte_range(SBBS_Player.PLAYER_BASE+start*SBBS_Player.BYTE_SIZE, data)
+                if i+1 < len(rows):
+                    start = rows[i+1]
+        self.original = {name: column[:] for name,column in self.columns.items()}
+        # Already parsed player objects don't know about the new values
+        self.rom.load_teams()
+        self.logger.debug(f"Wrote {len(changed)} changed player records")
+        return len(changed)
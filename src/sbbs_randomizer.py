@@ -0,0 +1,234 @@
+from .sbbs_rom import SBBS_ROM
+from .sbbs_char_map import str_to_sbbs_idxs
+from .sbbs_player import SBBS_Player, HitterAbility, PitcherAbility
+from .sbbs_player_table import SBBS_Player_Table
+from .sbbs_team import SBBS_Team, SBBS_FIELD_POSITION
+from .sbbs_layout import TEAM_SIZE
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import json
+import logging
+import math
+import os
+import random
+
+# Stat distributions of a league, keys are the ones of the team JSON. A value is either a fixed number,
+# [min, max] for a uniform draw or {"min", "max", "mean", "sd"} for a normal distribution cut off at min/max.
+# left_handed, hitter_ability and pitcher_abilities are probabilities, the latter per ability slot
+DEFAULT_SPEC = {
+    "fielders": {
+        "av": {"min": 150, "max": 450, "mean": 280, "sd": 60},
+        "hr": {"min": 0, "max": 63, "mean": 15, "sd": 12},
+        "r": {"min": 1, "max": 40, "mean": 10, "sd": 6},
+        "f": {"min": 1, "max": 15, "mean": 7, "sd": 3},
+        "st": {"min": 1, "max": 11, "mean": 4, "sd": 2},
+        "yeet": [2, 4],
+        "left_handed": 0.4,
+        "hitter_ability": 0.3,
+    },
+    "pitchers": {
+        "era": {"min": 150, "max": 550, "mean": 300, "sd": 80},
+        "spd": {"min": 60, "max": 130, "mean": 94, "sd": 15},
+        "r": {"min": 1, "max": 30, "mean": 9, "sd": 5},
+        "l": {"min": 1, "max": 30, "mean": 9, "sd": 5},
+        "f": {"min": 1, "max": 30, "mean": 9, "sd": 5},
+        "st": {"min": 10, "max": 80, "mean": 29, "sd": 12},
+        "left_handed": 0.0,
+        "pitcher_abilities": 0.3,
+    },
+    # Random player names, shuffled field positions and random team names
+    "names": True,
+    "positions": True,
+    "team_names": False,
+}
+
+NAME_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+HITTER_ABILITIES = [ability.value for ability in HitterAbility if ability != HitterAbility.NOTHING and not ability.name.startswith("INVAL")]
+PITCHER_ABILITIES = [ability.value for ability in PitcherAbility if ability != PitcherAbility.NOTHING]
+
+class SBBS_Random_Spec:
+    # Every stat is turned into a (values, cumulative weights) table once, a whole column is then
+    # drawn with a single random.choices call
+    COLUMNS = {
+        "fielders": {"av": "av", "hr": "hr", "r": "r", "f": "f", "st": "st", "yeet": "yeet"},
+        "pitchers": {"era": "av", "spd": "hr", "r": "pitch_r", "l": "pitch_l", "f": "pitch_f", "st": "pitch_st"},
+    }
+    PROBABILITIES = {"fielders": ("left_handed", "hitter_ability"), "pitchers": ("left_handed", "pitcher_abilities")}
+
+    def __init__(self, spec:dict=None):
+        spec = spec or {}
+        unknown = set(spec) - set(DEFAULT_SPEC)
+        assert not unknown, f"Unknown keys in randomizer spec: {', '.join(sorted(unknown))}"
+        self.names = spec.get("names", DEFAULT_SPEC["names"])
+        self.positions = spec.get("positions", DEFAULT_SPEC["positions"])
+        self.team_names = spec.get("team_names", DEFAULT_SPEC["team_names"])
+        self.stats = {}
+        self.probabilities = {}
+        for role in ("fielders", "pitchers"):
+            role_spec = {**DEFAULT_SPEC[role], **spec.get(role, {})}
+            unknown = set(role_spec) - set(SBBS_Random_Spec.COLUMNS[role]) - set(SBBS_Random_Spec.PROBABILITIES[role])
+            assert not unknown, f"Unknown {role} stats in randomizer spec: {', '.join(sorted(unknown))}"
+            self.stats[role] = {column: self.__distribution(f"{role}.{stat}", role_spec[stat], column)
+                                for stat, column in SBBS_Random_Spec.COLUMNS[role].items()}
+            for name in SBBS_Random_Spec.PROBABILITIES[role]:
+                probability = role_spec[name]
+                assert 0.0 <= probability <= 1.0, f"{role}.{name} has to be a probability between 0 and 1, not {probability}"
+                self.probabilities[(role, name)] = probability
+
+    @classmethod
+    def from_file(cls, path:str)->"SBBS_Random_Spec":
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def __distribution(name:str, value, column:str)->tuple[list[int], list[float]]:
+        field = SBBS_Player.FIELD_BY_NAME[column]
+        # The largest value the field's encoding (BCD byte, BCD word or raw byte) can hold
+        max_value = SBBS_Player_Table.MAX_VALUES[field.kind]
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            low = high = int(value)
+            weight = lambda v: 1.0
+        elif isinstance(value, list):
+            assert len(value) == 2, f"{name} has to be [min, max]"
+            low, high = value
+            weight = lambda v: 1.0
+        elif isinstance(value, dict):
+            low, high = value["min"], value["max"]
+            mean = value.get("mean", (low+high)/2)
+            sd = value.get("sd", (high-low)/4 or 1)
+            weight = lambda v: math.exp(-0.5*((v-mean)/sd)**2)
+        else:
+            raise ValueError(f"{name} has to be a number, [min, max] or {{\"min\", \"max\", \"mean\", \"sd\"}}")
+        assert 0 <= low <= high <= max_value, f"{name} range {low}-{high} is outside of 0-{max_value}"
+        values = list(range(low, high+1))
+        cum_weights = list(itertools.accumulate(weight(v) for v in values))
+        assert cum_weights[-1] > 0, f"{name} distribution has no weight inside {low}-{high}"
+        return values, cum_weights
+
+class SBBS_Randomizer:
+    def __init__(self, spec:SBBS_Random_Spec=None):
+        self.logger = logging.getLogger("C."+self.__class__.__name__)
+        self.spec = spec or SBBS_Random_Spec()
+
+    @staticmethod
+    def __names(rng:random.Random, count:int, length:int)->list[str]:
+        lengths = rng.choices(range(3, length+1), k=count)
+        letters = rng.choices(NAME_LETTERS, k=count*length)
+        return ["".join(letters[i*length:i*length+n]).ljust(length) for i,n in enumerate(lengths)]
+
+    @staticmethod
+    def __flags(rng:random.Random, count:int, probability:float)->list[int]:
+        return rng.choices((0, 1), (1.0-probability, probability), k=count)
+
+    @staticmethod
+    def __abilities(rng:random.Random, count:int, probability:float, abilities:list[int])->list[int]:
+        # NOTHING with 1-probability, otherwise any of the valid abilities
+        drawn = rng.choices(abilities, k=count)
+        return [ability if has else 0 for ability, has in zip(drawn, SBBS_Randomizer.__flags(rng, count, probability))]
+
+    def randomize_teams(self, rom:SBBS_ROM, rng:random.Random):
+        # Team names and positions live in the team table, it's rewritten with one call
+        table = bytearray(rom.read_bytes(SBBS_Team.TEAM_BASE, len(rom.teams)*TEAM_SIZE))
+        names = self.__names(rng, len(rom.teams), SBBS_Team.NAME_LENGTH) if self.spec.team_names else None
+        for idx in range(len(rom.teams)):
+            o = idx*TEAM_SIZE
+            if names:
+                table[o+SBBS_Team.NAME_OFFSET:o+SBBS_Team.NAME_OFFSET+SBBS_Team.NAME_LENGTH] = bytes(str_to_sbbs_idxs(names[idx]))
+            if self.spec.positions:
+                # The starting positions are shuffled over the starters, numbers and pinch hitters stay
+                map_off = o+SBBS_Team.PLAYER_MAP_OFFSET
+                mask = SBBS_FIELD_POSITION.MASK.value
+                starters = [i for i in range(SBBS_Team.PLAYER_MAP_SIZE) if table[map_off+i] & mask != SBBS_FIELD_POSITION.PINCH_HITTER.value]
+                positions = [table[map_off+i] & mask for i in starters]
+                rng.shuffle(positions)
+                for i, position in zip(starters, positions):
+                    table[map_off+i] = position | (table[map_off+i] & 0xf)
+        rom.replace_byte_range(SBBS_Team.TEAM_BASE, table)
+        rom.load_teams()
+
+    def randomize_players(self, rom:SBBS_ROM, rng:random.Random)->int:
+        table = rom.player_table()
+        for role, rows in (("fielders", table.rows(pitchers=False)), ("pitchers", table.rows(fielders=False))):
+            count = len(rows)
+            for column_name, (values, cum_weights) in self.spec.stats[role].items():
+                column = table[column_name]
+                column[rows.start:rows.stop] = array(column.typecode, rng.choices(values, cum_weights=cum_weights, k=count))
+            column = table["left_handed"]
+            column[rows.start:rows.stop] = array(column.typecode, self.__flags(rng, count, self.spec.probabilities[(role, "left_handed")]))
+            if role == "fielders":
+                column = table["hitter_ability"]
+                column[rows.start:rows.stop] = array(column.typecode, self.__abilities(rng, count, self.spec.probabilities[(role, "hitter_ability")], HITTER_ABILITIES))
+            else:
+                for column_name in SBBS_Player_Table.PITCHER_ABILITY_COLUMNS:
+                    column = table[column_name]
+                    column[rows.start:rows.stop] = array(column.typecode, self.__abilities(rng, count, self.spec.probabilities[(role, "pitcher_abilities")], PITCHER_ABILITIES))
+        if self.spec.names:
+            table["name"][:] = self.__names(rng, len(table), SBBS_Player.NAME_LENGTH)
+        return table.write_back()
+
+    def randomize(self, rom:SBBS_ROM, rng:random.Random)->int:
+        self.randomize_teams(rom, rng)
+        return self.randomize_players(rom, rng)
+
+def league_path(path:str, league:int, count:int)->str:
+    # league.smc -> league_007.smc, zero padded so the files sort in order
+    root, ext = os.path.splitext(path)
+    return f"{root}_{league:0{len(str(count-1))}d}{ext}"
+
+def league_rng(seed:int, league:int)->random.Random:
+    # Seeding with a string doesn't depend on PYTHONHASHSEED, every league is reproducible on its own
+    return random.Random(f"{seed}/{league}")
+
+_worker_base = None
+_worker_randomizer = None
+
+def _init_worker(base:tuple, spec:SBBS_Random_Spec):
+    # The base ROM is parsed once per worker, leagues only clone it
+    global _worker_base, _worker_randomizer
+    data, originals, modified_ranges = base
+    _worker_base = SBBS_ROM(data)
+    _worker_base.originals = list(originals)
+    _worker_base.modified_ranges = list(modified_ranges)
+    _worker_randomizer = SBBS_Randomizer(spec)
+
+def _write_league(job)->list[str]:
+    seed, league, output, patch = job
+    rom = _worker_base.copy()
+    _worker_randomizer.randomize(rom, league_rng(seed, league))
+    if output:
+        rom.write_to(output)
+    if patch:
+        rom.write_patch_to(patch)
+    return [path for path in (output, patch) if path]
+
+class SBBS_League_Generator:
+    def __init__(self, rom:SBBS_ROM, spec:SBBS_Random_Spec=None):
+        self.logger = logging.getLogger("C."+self.__class__.__name__)
+        rom.update_in_rom()
+        # Patches of the leagues also include whatever was changed on the base ROM
+        self.base = (bytes(rom.data), rom.original_ranges(), list(rom.modified_ranges))
+        self.spec = spec or SBBS_Random_Spec()
+
+    def jobs(self, count:int, seed:int, output:str=None, patch:str=None):
+        for league in range(count):
+            yield (seed, league, output and league_path(output, league, count), patch and league_path(patch, league, count))
+
+    def generate(self, count:int, seed:int, output:str=None, patch:str=None, workers:int=None)->list[str]:
+        assert output or patch, "Randomized leagues need an output ROM or patch path"
+        for path in (output, patch):
+            if path and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        jobs = list(self.jobs(count, seed, output, patch))
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(jobs))
+        if workers <= 1:
+            _init_worker(self.base, self.spec)
+            paths = [_write_league(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.base, self.spec)) as executor:
+                paths = list(executor.map(_write_league, jobs, chunksize=max(1, len(jobs)//(workers*4))))
+        paths = [path for league_paths in paths for path in league_paths]
+        self.logger.info(f"Wrote {count} leagues from seed {seed} to {len(paths)} files")
+        return paths
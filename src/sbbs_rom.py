@@ -1,11 +1,46 @@
 from .snes_rom import SNES_ROM
+from .profiling import timed
 from .sbbs_team import SBBS_Team
+from .sbbs_player_table import SBBS_Player_Table
+from .sbbs_bundle import SBBS_Bundle
+from .sbbs_import_cache import SBBS_Import_Cache
 import json
 import os
 
+class SBBS_Team_List:
+    # Sequence of all teams that only parses a team the first time it's accessed
+    TEAM_COUNT = SBBS_Team.MAX_TEAM_IDX+1
+
+    def __init__(self, rom:"SBBS_ROM"):
+        self.rom = rom
+        self.teams = [None]*SBBS_Team_List.TEAM_COUNT
+
+    def __len__(self):
+        return SBBS_Team_List.TEAM_COUNT
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        team = self.teams[idx]
+        if team is None:
+            team = SBBS_Team(self.rom, range(SBBS_Team_List.TEAM_COUNT)[idx])
+            self.teams[idx] = team
+        return team
+
+    def __iter__(self):
+        for i in range(SBBS_Team_List.TEAM_COUNT):
+            yield self[i]
+
+    def reset(self, idx:int):
+        # Drops a parsed team, e.g. after its bytes were changed behind its back
+        self.teams[idx] = None
+
+    def loaded(self)->list[SBBS_Team]:
+        return [team for team in self.teams if team is not None]
+
 class SBBS_ROM(SNES_ROM):
-    def __init__(self, data):
-        super().__init__(data)
+    def __init__(self, data, source=None, check_checksum:bool=True):
+        super().__init__(data, source, check_checksum)
         self.__check_rom_values()
         self.load_teams()
 
@@ -20,17 +55,26 @@ class SBBS_ROM(SNES_ROM):
         assert ntsc == self.header.ntsc_byte, f"Wrong country/ntsc value. Expected: {ntsc} Found:{self.header.ntsc_byte}"
 
     def load_teams(self):
-        self.teams = []
-        for i in range(18):
-            team = SBBS_Team(self, i)
-            self.teams.append(team)
-
-    @classmethod
-    def from_file(cls, path:str)->"SBBS_ROM":
-        with open(path, "rb") as f:
-            return SBBS_ROM(f.read())
-        
+        # Teams are parsed lazily, this only drops everything that was parsed so far
+        self.teams = SBBS_Team_List(self)
+
+    def close(self)->None:
+        # Parsed teams hold views into a mapped ROM, they have to be gone before it's unmapped
+        self.load_teams()
+        super().close()
+
+    def copy(self)->"SBBS_ROM":
+        clone = super().copy()
+        clone.load_teams()
+        return clone
+
+    def player_table(self)->SBBS_Player_Table:
+        return SBBS_Player_Table(self)
+
+    @timed("sbbs.export")
     def export(self, path:str):
+        if SBBS_Bundle.is_bundle_path(path):
+            return self.export_bundle(path)
         if not os.path.exists(path):
             os.mkdir(path)
         for i,team in enumerate(self.teams):
@@ -40,30 +84,91 @@ class SBBS_ROM(SNES_ROM):
             logo_path = os.path.join(path,f"team_{i}.bmp")
             team.logo.export_to(logo_path)
 
-    def import_from(self, path:str):
+    def export_bundle(self, path:str):
+        with SBBS_Bundle(path, "w") as bundle:
+            for i,team in enumerate(self.teams):
+                bundle.write_team(i, team.to_dict())
+                bundle.write_logo(i, team.logo.tile_bytes())
+
+    def import_bundle(self, path:str)->int:
+        count = 0
+        with SBBS_Bundle(path, "r") as bundle:
+            for team_idx, kind, data in bundle.entries():
+                team = self.teams[team_idx]
+                if kind == SBBS_Bundle.KIND_TEAM:
+                    count += 1
+                    team.from_dict(json.loads(data))
+                    team.update_in_rom()
+                elif kind == SBBS_Bundle.KIND_LOGO:
+                    team.logo.set_tile_bytes(data)
+        return count
+
+    @timed("sbbs.import")
+    def import_from(self, path:str, cache_path:str=None):
         assert os.path.exists(path), f"Import path ({path}) doesn't exist."
+        if SBBS_Bundle.is_bundle_path(path):
+            return self.import_bundle(path)
+        cache = None
+        if cache_path:
+            cache = SBBS_Import_Cache(cache_path, self.content_hash())
         count = 0
-        for i,team in enumerate(self.teams):
+        for i in range(len(self.teams)):
             team_path = os.path.join(path,f"team_{i}.json")
+            logo_path = os.path.join(path,f"team_{i}.bmp")
+            if cache:
+                file_hashes = [SBBS_Import_Cache.hash_file(team_path), SBBS_Import_Cache.hash_file(logo_path)]
+                regions = cache.lookup(i, file_hashes)
+                if regions is not None:
+                    for offset, data in regions:
+                        self.replace_byte_range(offset, data)
+                    self.teams.reset(i)
+                    count += file_hashes[0] is not None
+                    continue
+            with self.record_changes() as changes:
+                self.__import_team(i, team_path, logo_path)
             if os.path.exists(team_path):
                 count += 1
-                with open(team_path, "r") as f:
-                    team_dict = json.load(f)
-                    team.from_dict(team_dict)
-                    team.update_in_rom()
-            logo_path = os.path.join(path,f"team_{i}.bmp")
-            if os.path.exists(logo_path):
-                team.logo.import_from(logo_path)
+            if cache:
+                cache.store(i, file_hashes, [(start, self.read_bytes(start, end-start)) for start, end in changes])
+        if cache:
+            self.logger.info(f"Reused {cache.hits} cached teams")
+            cache.save()
         return count
+
+    @timed("sbbs.import_team")
+    def __import_team(self, idx:int, team_path:str, logo_path:str):
+        team = self.teams[idx]
+        if os.path.exists(team_path):
+            with open(team_path, "r") as f:
+                team_dict = json.load(f)
+                team.from_dict(team_dict)
+        if os.path.exists(logo_path):
+            team.logo.import_from(logo_path)
+        team.update_in_rom()
         
-    def read_bytes(self, offset:int, size:int):
-        t_off = offset + self.base_offset
-        return self.data[t_off:t_off+size]
-    
-    def write_to(self, path:str)->None:
-        for team in self.teams:
+    def apply_patch(self, patch:bytes)->None:
+        super().apply_patch(patch)
+        self.__check_rom_values()
+        # Parsed teams don't know about the patched bytes
+        self.load_teams()
+
+    def rollback(self, name:str)->None:
+        super().rollback(name)
+        # Parsed teams still hold the values from before the rollback
+        self.load_teams()
+
+    def undo(self, count:int=1)->None:
+        super().undo(count)
+        self.load_teams()
+
+    def update_teams_in_rom(self)->None:
+        # Only writes parsed objects that were changed, the header (and its checksum) stay as they are
+        for team in self.teams.loaded():
             team.update_in_rom()
-        super().write_to(path)
+
+    def update_in_rom(self)->None:
+        self.update_teams_in_rom()
+        super().update_in_rom()
         
     def replace_byte_range(self, offset:int, new_bytes:bytes):
         # Data below with 0xea(NOP) overwrite
@@ -97,6 +202,4 @@ class SBBS_ROM(SNES_ROM):
         # 0x68000 seems fine
         # 0x70000 seems fine
         # 0x78000 seems fine
-        size = len(new_bytes)
-        t_off = offset + self.base_offset
-        self.data[t_off: t_off+size] = new_bytes
\ No newline at end of file
+        super().replace_byte_range(offset, new_bytes)
\ No newline at end of file
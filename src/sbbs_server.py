@@ -0,0 +1,271 @@
+from .sbbs_rom import SBBS_ROM
+from .sbbs_team import SBBS_Team
+import asyncio
+import base64
+import contextlib
+import inspect
+import ipaddress
+import json
+import logging
+import os
+import stat
+
+class SBBS_RPC_Error(Exception):
+    PARSE_ERROR = -32700
+    INVALID_REQUEST = -32600
+    METHOD_NOT_FOUND = -32601
+    INVALID_PARAMS = -32602
+    SERVER_ERROR = -32000
+
+    def __init__(self, code:int, message:str):
+        super().__init__(message)
+        self.code = code
+
+class SBBS_Server_ROM:
+    def __init__(self, rom:SBBS_ROM, path:str):
+        self.rom = rom
+        self.path = path
+        # Bumped by every edit, rendered ROMs and patches are reused until it changes
+        self.generation = 0
+        self.renders = {}
+
+def parse_address(address:str)->tuple[str, str, int]:
+    # "host:port", ":port" or the path of a unix socket
+    if "/" in address or address.endswith(".sock"):
+        return "unix", address, None
+    host, _, port = address.rpartition(":")
+    return "tcp", host or "127.0.0.1", int(port)
+
+def is_loopback(host:str)->bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return False
+
+def remove_socket(path:str):
+    # Only stale sockets are removed, a mistyped path mustn't delete a regular file
+    if os.path.exists(path):
+        assert stat.S_ISSOCK(os.stat(path).st_mode), f"{path} exists and isn't a socket"
+        os.remove(path)
+
+class SBBS_Server:
+    # JSON-RPC 2.0 over TCP or a unix socket, one JSON message per line. Parsed ROMs stay in memory
+    # keyed by the content hash they were opened with, so clients only pay for the edit itself.
+    # Methods run one at a time on the event loop, a JSON array of requests is a batch that is
+    # answered with one array once all of its requests ran
+    METHODS = ("open_rom", "close_rom", "list_roms", "get_team", "set_team", "set_player",
+               "apply_bundle", "render_rom", "render_patch")
+    # Longest request line, mostly so a runaway client can't grow the buffer forever
+    LINE_LIMIT = 1 << 24
+
+    def __init__(self):
+        self.logger = logging.getLogger("C."+self.__class__.__name__)
+        self.roms = {}
+
+    def __entry(self, rom:str)->SBBS_Server_ROM:
+        if rom not in self.roms:
+            raise SBBS_RPC_Error(SBBS_RPC_Error.INVALID_PARAMS, f"No ROM with hash {rom} is open")
+        return self.roms[rom]
+
+    @staticmethod
+    def __team(entry:SBBS_Server_ROM, team:int):
+        if not 0 <= team <= SBBS_Team.MAX_TEAM_IDX:
+            raise SBBS_RPC_Error(SBBS_RPC_Error.INVALID_PARAMS, f"Team {team} doesn't exist")
+        return entry.rom.teams[team]
+
+    @contextlib.contextmanager
+    def __edit(self, entry:SBBS_Server_ROM):
+        # A request that fails half way leaves neither bytes nor parsed teams changed
+        name = entry.rom.snapshot()
+        try:
+            yield
+            entry.rom.update_in_rom()
+        except BaseException:
+            entry.rom.rollback(name)
+            raise
+        finally:
+            entry.rom.release(name)
+        entry.generation += 1
+        entry.renders.clear()
+
+    # RPC methods, params are passed by name or position
+
+    def open_rom(self, path:str)->dict:
+        rom = SBBS_ROM.from_file(path)
+        key = rom.content_hash()
+        # The same image opened twice is shared, edits from every client go to one ROM
+        if key not in self.roms:
+            self.roms[key] = SBBS_Server_ROM(rom, path)
+            self.logger.info(f"Opened {path} as {key}")
+        else:
+            rom.close()
+        return {"rom": key, "teams": [team.name.strip() for team in self.roms[key].rom.teams]}
+
+    def close_rom(self, rom:str)->bool:
+        self.__entry(rom).rom.close()
+        del self.roms[rom]
+        return True
+
+    def list_roms(self)->list[dict]:
+        return [{"rom": key, "path": entry.path, "generation": entry.generation} for key, entry in self.roms.items()]
+
+    def get_team(self, rom:str, team:int)->dict:
+        return self.__team(self.__entry(rom), team).to_dict()
+
+    def set_team(self, rom:str, team:int, data:dict)->dict:
+        entry = self.__entry(rom)
+        with self.__edit(entry):
+            self.__team(entry, team).from_dict(data)
+        return self.__team(entry, team).to_dict()
+
+    def set_player(self, rom:str, team:int, slot:int, data:dict, pitcher:bool=False)->dict:
+        # data has the layout of one entry of "fielders"/"pitchers" in the team JSON, missing keys
+        # (also inside "player") keep their current values
+        entry = self.__entry(rom)
+        with self.__edit(entry):
+            team_obj = self.__team(entry, team)
+            assignments = team_obj.pitcher_players if pitcher else team_obj.field_players
+            if not 0 <= slot < len(assignments):
+                raise SBBS_RPC_Error(SBBS_RPC_Error.INVALID_PARAMS, f"Slot {slot} doesn't exist, teams have {len(assignments)} {'pitchers' if pitcher else 'fielders'}")
+            merged = assignments[slot].to_dict()
+            merged.update({key: value for key, value in data.items() if key != "player"})
+            merged["player"].update(data.get("player", {}))
+            assignments[slot].from_dict(merged)
+        return assignments[slot].to_dict()
+
+    def apply_bundle(self, rom:str, path:str)->int:
+        # Bundle file or export directory, returns the number of imported teams
+        entry = self.__entry(rom)
+        with self.__edit(entry):
+            count = entry.rom.import_from(path)
+        return count
+
+    def __render(self, entry:SBBS_Server_ROM, kind:str)->bytes:
+        if kind not in entry.renders:
+            if kind == "rom":
+                entry.rom.update_in_rom()
+                entry.renders[kind] = bytes(entry.rom.data)
+            else:
+                entry.renders[kind] = entry.rom.create_patch(kind)
+        return entry.renders[kind]
+
+    @staticmethod
+    def __output(data:bytes, path:str)->dict:
+        if path is None:
+            return {"data": base64.b64encode(data).decode("ascii")}
+        # Written next to the target and renamed, so nobody reads half a file
+        tmp_path = f"{path}.tmp{os.path.splitext(path)[1]}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return {"path": path}
+
+    def render_rom(self, rom:str, path:str=None)->dict:
+        # Without path the ROM comes back base64 encoded
+        entry = self.__entry(rom)
+        data = self.__render(entry, "rom")
+        return {"generation": entry.generation, "checksum": entry.rom.header.checksum, **self.__output(data, path)}
+
+    def render_patch(self, rom:str, path:str=None, patch_format:str=None)->dict:
+        # The format comes from the file extension of path unless it's given, IPS by default
+        if patch_format is None:
+            patch_format = os.path.splitext(path)[1][1:].lower() if path else "ips"
+        if patch_format not in SBBS_ROM.PATCH_FORMATS:
+            raise SBBS_RPC_Error(SBBS_RPC_Error.INVALID_PARAMS, f"Unknown patch format \"{patch_format}\". Supported: {', '.join(SBBS_ROM.PATCH_FORMATS)}")
+        entry = self.__entry(rom)
+        data = self.__render(entry, patch_format)
+        return {"generation": entry.generation, **self.__output(data, path)}
+
+    # JSON-RPC handling
+
+    def call(self, method:str, params=None):
+        if method not in SBBS_Server.METHODS:
+            raise SBBS_RPC_Error(SBBS_RPC_Error.METHOD_NOT_FOUND, f"Unknown method \"{method}\"")
+        function = getattr(self, method)
+        try:
+            if isinstance(params, list):
+                bound = inspect.signature(function).bind(*params)
+            else:
+                bound = inspect.signature(function).bind(**(params or {}))
+        except TypeError as e:
+            raise SBBS_RPC_Error(SBBS_RPC_Error.INVALID_PARAMS, str(e)) from None
+        return function(*bound.args, **bound.kwargs)
+
+    @staticmethod
+    def __error(request_id, code:int, message:str)->dict:
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+    def __handle_request(self, request)->dict:
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or not isinstance(request.get("method"), str):
+            return self.__error(None, SBBS_RPC_Error.INVALID_REQUEST, "Invalid request")
+        request_id = request.get("id")
+        try:
+            response = {"jsonrpc": "2.0", "id": request_id, "result": self.call(request["method"], request.get("params"))}
+        except SBBS_RPC_Error as e:
+            response = self.__error(request_id, e.code, str(e))
+        except Exception as e:
+            self.logger.warning(f"{request['method']} failed: {type(e).__name__}: {e}")
+            response = self.__error(request_id, SBBS_RPC_Error.SERVER_ERROR, f"{type(e).__name__}: {e}")
+        # Notifications don't get an answer
+        return response if "id" in request else None
+
+    def handle(self, message):
+        if isinstance(message, list):
+            if not message:
+                return self.__error(None, SBBS_RPC_Error.INVALID_REQUEST, "Empty batch")
+            responses = [response for response in map(self.__handle_request, message) if response is not None]
+            return responses or None
+        return self.__handle_request(message)
+
+    async def __client(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        self.logger.debug(f"Client connected {writer.get_extra_info('peername')}")
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Longer than LINE_LIMIT, the rest of the stream can't be framed anymore
+                    writer.write(json.dumps(self.__error(None, SBBS_RPC_Error.INVALID_REQUEST, "Request too long")).encode()+b"\n")
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    response = self.handle(json.loads(line))
+                except ValueError as e:
+                    response = self.__error(None, SBBS_RPC_Error.PARSE_ERROR, f"Parse error: {e}")
+                if response is not None:
+                    writer.write(json.dumps(response).encode()+b"\n")
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, address:str, allow_remote:bool=False):
+        # Clients can read and write any file the server can, so only local clients are served by default
+        kind, host, port = parse_address(address)
+        if kind == "unix":
+            remove_socket(host)
+            server = await asyncio.start_unix_server(self.__client, host, limit=SBBS_Server.LINE_LIMIT)
+        else:
+            assert allow_remote or is_loopback(host), f"{host} isn't a loopback address, clients could read and write any file the server can. Pass allow_remote to serve it anyway"
+            server = await asyncio.start_server(self.__client, host, port, limit=SBBS_Server.LINE_LIMIT)
+        self.logger.info(f"Serving JSON-RPC on {address}, Ctrl+C to stop")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if kind == "unix":
+                remove_socket(host)
+            for entry in self.roms.values():
+                entry.rom.close()
+
+    def run(self, address:str, allow_remote:bool=False):
+        try:
+            asyncio.run(self.serve(address, allow_remote))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,101 @@
+from .sbbs_char_map import str_to_sbbs_idxs
+from .sbbs_player import SBBS_Player, HitterAbility, PitcherAbility
+from .sbbs_team import SBBS_Team, SBBS_FIELD_POSITION, PitcherPlayerAssignment
+from .sbbs_team_logo import SBBS_Team_Logo
+from .snes_tile import encode_4bpp, TILE_SIZE, TILE_PIXELS
+import random
+import struct
+
+# Builds ROM images that SBBS_ROM accepts without containing anything from the original game.
+# Everything outside of the team, player and logo regions is random filler.
+ROM_SIZE = 0x80000
+HEADER_OFF = 0x7fc0
+TITLE = b"baseball simulator   "
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+FIELD_POSITIONS = [position for position in SBBS_FIELD_POSITION if position != SBBS_FIELD_POSITION.MASK]
+
+def synthetic_header(rng:random.Random)->bytes:
+    header = bytearray(0x40)
+    header[0:0x15] = TITLE
+    header[0x15] = 0x20 # LoROM
+    header[0x17] = (ROM_SIZE//1024).bit_length()-1
+    header[0x18] = 3 # 8KiB SRAM
+    header[0x19] = 1 # NTSC
+    header[0x1b] = rng.randrange(4)
+    # Placeholder checksum, 0xffff+0x0000 add up to the same as every valid pair
+    header[0x1c:0x20] = b"\xff\xff\x00\x00"
+    return bytes(header)
+
+def synthetic_name(rng:random.Random, length:int)->bytes:
+    name = "".join(rng.choice(LETTERS) for _ in range(rng.randrange(3, length+1)))
+    return bytes(str_to_sbbs_idxs(name.ljust(length)))
+
+def synthetic_team(rng:random.Random)->bytes:
+    team = bytearray(rng.randbytes(0x20))
+    team[SBBS_Team.NAME_OFFSET:SBBS_Team.NAME_OFFSET+SBBS_Team.NAME_LENGTH] = synthetic_name(rng, SBBS_Team.NAME_LENGTH)
+    # Nine players in the field, the rest come off the bench
+    positions = FIELD_POSITIONS[1:]+[SBBS_FIELD_POSITION.PINCH_HITTER]*(SBBS_Team.PLAYER_MAP_SIZE-len(FIELD_POSITIONS)+1)
+    for i,position in enumerate(positions):
+        team[SBBS_Team.PLAYER_MAP_OFFSET+i] = position.value | rng.randrange(16)
+    for i in range(SBBS_Team.PITCHER_MAP_SIZE):
+        team[SBBS_Team.PITCHER_MAP_OFFSET+i] = rng.randrange(16)
+    return bytes(team)
+
+def synthetic_player(rng:random.Random, pitcher:bool)->bytes:
+    record = list(rng.randbytes(SBBS_Player.BYTE_SIZE))
+    fields = SBBS_Player.FIELD_BY_NAME
+    record[0:SBBS_Player.NAME_LENGTH] = synthetic_name(rng, SBBS_Player.NAME_LENGTH)
+    fields["left_handed"].encode(record, rng.random() < 0.3)
+    # Both ability fields are parsed for every player, so these bytes have to be valid for either
+    record[SBBS_Player.PITCHER_ABILITY_OFF:SBBS_Player.PITCHER_ABILITY_OFF+4] = [0]*4
+    if pitcher:
+        fields["av"].encode(record, rng.randrange(150, 600)) # era
+        fields["hr"].encode(record, rng.randrange(110, 160)) # spd
+        for offset in (SBBS_Player.PITCH_R_OFF, SBBS_Player.PITCH_L_OFF, SBBS_Player.F_OFF, SBBS_Player.PITCH_ST_OFF):
+            record[offset] = rng.randrange(1, 10)
+        abilities = [rng.choice(list(PitcherAbility)) for _ in range(4)]
+        fields["pitcher_abilities"].encode(record, abilities)
+    else:
+        fields["av"].encode(record, rng.randrange(150, 400))
+        fields["hr"].encode(record, rng.randrange(0, 60))
+        fields["f"].encode(record, rng.randrange(1, 10))
+        for offset in (SBBS_Player.R_OFF, SBBS_Player.YEET_OFF, SBBS_Player.ST_OFF):
+            record[offset] = rng.randrange(1, 10)
+        ability = HitterAbility.NOTHING if rng.random() < 0.7 else rng.choice(list(HitterAbility)[1:16])
+        fields["hitter_ability"].encode(record, ability)
+        record[SBBS_Player.HITTER_ABILITY_OFF+1] = int(ability != HitterAbility.NOTHING)
+    return bytes(record)
+
+def synthetic_logo_bank(rng:random.Random)->bytes:
+    # Every tile uses a handful of colors, like the real logos do
+    tile_count = SBBS_Team_Logo.TEAM_LOGO_BANK_SIZE//TILE_SIZE
+    indices = bytearray()
+    for _ in range(tile_count):
+        colors = bytes(rng.sample(range(16), 4))
+        indices += rng.randbytes(TILE_PIXELS).translate(colors*64)
+    return bytes(encode_4bpp(indices))
+
+def synthetic_rom(seed:int=0, extra_header:bool=False)->bytes:
+    rng = random.Random(seed)
+    data = bytearray(rng.randbytes(ROM_SIZE))
+    data[HEADER_OFF:HEADER_OFF+0x40] = synthetic_header(rng)
+
+    team_count = SBBS_Team.MAX_TEAM_IDX+1
+    for idx in range(team_count):
+        off = SBBS_Team.TEAM_BASE+idx*0x20
+        data[off:off+0x20] = synthetic_team(rng)
+    for idx in range(SBBS_Player.MAX_PLAYER_IDX+1):
+        off = SBBS_Player.PLAYER_BASE+idx*SBBS_Player.BYTE_SIZE
+        data[off:off+SBBS_Player.BYTE_SIZE] = synthetic_player(rng, idx >= PitcherPlayerAssignment.PITCHER_PLAYER_IDX_OFFSET)
+    logo_off = SBBS_Team_Logo.TEAM_LOGO_BASE_OFF
+    data[logo_off:logo_off+SBBS_Team_Logo.TEAM_LOGO_BANK_SIZE] = synthetic_logo_bank(rng)
+
+    checksum = sum(data) & 0xffff
+    data[HEADER_OFF+0x1c:HEADER_OFF+0x20] = struct.pack("<HH", checksum ^ 0xffff, checksum)
+    if extra_header:
+        return bytes(0x200)+bytes(data)
+    return bytes(data)
+
+def write_synthetic_rom(path:str, seed:int=0, extra_header:bool=False):
+    with open(path, "wb") as f:
+        f.write(synthetic_rom(seed, extra_header))
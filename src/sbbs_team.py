@@ -2,7 +2,10 @@
 from .sbbs_char_map import *
 from .sbbs_player import SBBS_Player, SBBS_Fielder, SBBS_Pitcher
 from .sbbs_team_logo import SBBS_Team_Logo
+from .dirty_tracked import Dirty_Tracked
+from .profiling import timed
 from enum import Enum
+from functools import cached_property
 
 class SBBS_FIELD_POSITION(Enum):
     MASK = 0xF0
@@ -16,9 +19,10 @@ class SBBS_FIELD_POSITION(Enum):
     CENTER_FIELD = 0x80
     RIGHT_FIELD = 0x90
 
-class FieldPlayerAssignment:
+class FieldPlayerAssignment(Dirty_Tracked):
     FIELD_PLAYER_IDX_STEP = 12
-    def __init__(self, rom:"SBBS_ROM", team:"SBBS_Team", idx:int):
+    TRACKED_ATTRIBUTES = ("position", "number")
+    def __init__(self, rom:"SBBS_ROM", team:"SBBS_Team", idx:int, record:tuple=None):
         self.rom = rom
         self.team = team
         self.idx = idx
@@ -26,14 +30,17 @@ class FieldPlayerAssignment:
         self.byte = self.team.field_player_map_bytes[self.idx]
         self.position = SBBS_FIELD_POSITION(self.byte & SBBS_FIELD_POSITION.MASK.value)
         self.number = self.byte & 0xf
-        self.player = SBBS_Fielder(self.rom, self.team_idx_base+self.idx)
+        self.player = SBBS_Fielder(self.rom, self.team_idx_base+self.idx, record)
+        self.mark_clean()
 
     def __repr__(self):
         return f"{self.idx+1}: {self.player} - {self.position.name}"
     
     def update_in_rom(self):
-        self.byte = self.number | self.position.value
-        self.rom.replace_byte_range(self.team.base_off+self.team.PLAYER_MAP_OFFSET+self.idx, bytes([self.byte]))
+        if self.dirty:
+            self.byte = self.number | self.position.value
+            self.rom.replace_byte_range(self.team.base_off+self.team.PLAYER_MAP_OFFSET+self.idx, bytes([self.byte]))
+            self.mark_clean()
         self.player.update_in_rom()
     
     def to_dict(self):
@@ -49,18 +56,20 @@ class FieldPlayerAssignment:
         self.player.from_dict(data["player"])
         self.position = SBBS_FIELD_POSITION[data["field_position"]]
 
-class PitcherPlayerAssignment:
+class PitcherPlayerAssignment(Dirty_Tracked):
     PITCHER_PLAYER_IDX_STEP = 6
     PITCHER_PLAYER_IDX_OFFSET = FieldPlayerAssignment.FIELD_PLAYER_IDX_STEP*18 #Max Team Number
+    TRACKED_ATTRIBUTES = ("number",)
 
-    def __init__(self, rom:"SBBS_ROM", team:"SBBS_Team", idx:int):
+    def __init__(self, rom:"SBBS_ROM", team:"SBBS_Team", idx:int, record:tuple=None):
         self.rom = rom
         self.team = team
         self.idx = idx
         self.team_idx_base = self.team.idx*PitcherPlayerAssignment.PITCHER_PLAYER_IDX_STEP + PitcherPlayerAssignment.PITCHER_PLAYER_IDX_OFFSET
         self.byte = self.team.pitcher_bytes[self.idx]
         self.number = self.byte & 0xf
-        self.player = SBBS_Pitcher(self.rom, self.team_idx_base+self.idx)
+        self.player = SBBS_Pitcher(self.rom, self.team_idx_base+self.idx, record)
+        self.mark_clean()
 
     def to_dict(self):
         data = {
@@ -70,7 +79,11 @@ class PitcherPlayerAssignment:
         return data
     
     def update_in_rom(self):
-        self.rom.replace_byte_range(self.team.base_off+self.team.PITCHER_MAP_OFFSET+self.idx, bytes([self.byte]))
+        if self.dirty:
+            assert 0 <= self.number <= 0xf, f"Pitcher number {self.number} doesn't fit into 4 bits"
+            self.byte = (self.byte & 0xf0) | self.number
+            self.rom.replace_byte_range(self.team.base_off+self.team.PITCHER_MAP_OFFSET+self.idx, bytes([self.byte]))
+            self.mark_clean()
         self.player.update_in_rom()
     
     def from_dict(self, data:dict):
@@ -81,7 +94,7 @@ class PitcherPlayerAssignment:
         return f"{self.idx+1}: {self.player}"
 
 
-class SBBS_Team:
+class SBBS_Team(Dirty_Tracked):
     MAX_TEAM_IDX = 17
     TEAM_BASE = 0x18012
     NAME_OFFSET = 0x03
@@ -90,6 +103,8 @@ class SBBS_Team:
     PLAYER_MAP_SIZE = 12
     PITCHER_MAP_OFFSET = 0x1a
     PITCHER_MAP_SIZE = 6
+    TRACKED_ATTRIBUTES = ("name",)
+    @timed("team.parse")
     def __init__(self, rom:"SBBS_ROM", idx:int):
         assert idx <= SBBS_Team.MAX_TEAM_IDX, f"Team idx({idx}) is bigger than max team idx: {SBBS_Team.MAX_TEAM_IDX}"
         self.rom = rom
@@ -97,19 +112,35 @@ class SBBS_Team:
         self.name = ""
         self.base_off = SBBS_Team.TEAM_BASE + self.idx*0x20
         self.__try_parse()
-        self.__get_logo()
+        self.mark_clean()
 
-    def __get_logo(self):
-        self.logo = SBBS_Team_Logo(self.rom, self.idx)
+    # Rosters and logo are only parsed when they are first accessed
 
-    def __try_parse(self):
-        self.name_bytes = self.rom.read_bytes(self.base_off + SBBS_Team.NAME_OFFSET, SBBS_Team.NAME_LENGTH)
-        self.name = sbbs_bytes_to_str(self.name_bytes)
+    @cached_property
+    def logo(self)->SBBS_Team_Logo:
+        return SBBS_Team_Logo(self.rom, self.idx)
 
+    @cached_property
+    @timed("team.parse_fielders")
+    def field_players(self)->list[FieldPlayerAssignment]:
         self.field_player_map_bytes = self.rom.read_bytes(self.base_off+SBBS_Team.PLAYER_MAP_OFFSET, SBBS_Team.PLAYER_MAP_SIZE)
-        self.field_players = [FieldPlayerAssignment(self.rom, self, idx) for idx in range(SBBS_Team.PLAYER_MAP_SIZE)]
+        records = SBBS_Player.unpack_records(self.rom, self.idx*FieldPlayerAssignment.FIELD_PLAYER_IDX_STEP, SBBS_Team.PLAYER_MAP_SIZE)
+        return [FieldPlayerAssignment(self.rom, self, idx, records[idx]) for idx in range(SBBS_Team.PLAYER_MAP_SIZE)]
+
+    @cached_property
+    @timed("team.parse_pitchers")
+    def pitcher_players(self)->list[PitcherPlayerAssignment]:
         self.pitcher_bytes = self.rom.read_bytes(self.base_off + SBBS_Team.PITCHER_MAP_OFFSET, SBBS_Team.PITCHER_MAP_SIZE)
-        self.pitcher_players = [PitcherPlayerAssignment(self.rom, self, idx) for idx in range(SBBS_Team.PITCHER_MAP_SIZE)]
+        first_idx = self.idx*PitcherPlayerAssignment.PITCHER_PLAYER_IDX_STEP + PitcherPlayerAssignment.PITCHER_PLAYER_IDX_OFFSET
+        records = SBBS_Player.unpack_records(self.rom, first_idx, SBBS_Team.PITCHER_MAP_SIZE)
+        return [PitcherPlayerAssignment(self.rom, self, idx, records[idx]) for idx in range(SBBS_Team.PITCHER_MAP_SIZE)]
+
+    def is_loaded(self, attribute:str)->bool:
+        return attribute in self.__dict__
+
+    def __try_parse(self):
+        self.name_bytes = self.rom.read_bytes(self.base_off + SBBS_Team.NAME_OFFSET, SBBS_Team.NAME_LENGTH)
+        self.name = sbbs_bytes_to_str(self.name_bytes)
 
     def to_dict(self):
         data = {
@@ -126,10 +157,17 @@ class SBBS_Team:
         for i in range(SBBS_Team.PITCHER_MAP_SIZE):
             self.pitcher_players[i].from_dict(data["pitchers"][i])
 
+    @timed("team.encode")
     def update_in_rom(self):
-        self.rom.replace_byte_range(self.base_off+SBBS_Team.NAME_OFFSET, bytes(str_to_sbbs_idxs(self.name)))
-        for assignment in self.field_players:
-            assignment.update_in_rom()
-        for assignment in self.pitcher_players:
-            assignment.update_in_rom()
-        self.logo.update_in_rom()
\ No newline at end of file
+        if self.dirty:
+            self.rom.replace_byte_range(self.base_off+SBBS_Team.NAME_OFFSET, bytes(str_to_sbbs_idxs(self.name)))
+            self.mark_clean()
+        # Anything that was never loaded can't have been changed
+        if self.is_loaded("field_players"):
+            for assignment in self.field_players:
+                assignment.update_in_rom()
+        if self.is_loaded("pitcher_players"):
+            for assignment in self.pitcher_players:
+                assignment.update_in_rom()
+        if self.is_loaded("logo"):
+            self.logo.update_in_rom()
\ No newline at end of file
@@ -1,70 +1,15 @@
-import PIL
-import PIL.Image
-import PIL.ImageColor
-
-class SNES_Tile_4bpp:
-    def __init__(self, bs:bytes, color_map:list[int]):
-        assert bs
-        assert len(bs) == 32
-        assert len(color_map) == 16
-        self.bs = bytearray(bs)
-        self.color_map = color_map
-        self.pixels = [None]*(8*8)
-        self.__decode()
-
-    def __decode(self):
-        def __get_bit(val, bit_idx):
-            return (val>>bit_idx)&0x1
-        self.palette_idx = [0]*(8*8)
-        for i in range(8*8):
-            b_idx = i//8
-            b_off = 7-i%8
-            b1 = self.bs[b_idx*2]
-            b2 = self.bs[b_idx*2+1]
-            b3 = self.bs[b_idx*2+16]
-            b4 = self.bs[b_idx*2+16+1]
-            self.palette_idx[i] = 8*__get_bit(b4, b_off)+4*__get_bit(b3, b_off)+2*__get_bit(b2,b_off)+__get_bit(b1,b_off)
-            self.pixels[i] = self.color_map[self.palette_idx[i]]
-
-    def find_best_palette_color(self, col):
-        min_sqr_err = 10000000
-        min_err_idx = 0
-        if len(col)>3:
-            if col[3] != 255:
-                return 0
-        for idx,pal_col in enumerate(self.color_map):
-            d_r = pal_col[0]-col[0]
-            d_g = pal_col[1]-col[1]
-            d_b = pal_col[2]-col[2]
-            sqr_err = d_r*d_r+d_g*d_g+d_b*d_b
-            if sqr_err <= min_sqr_err: #<0 so that transparent (0) only happens in the special case earlier
-                min_err_idx = idx
-                min_sqr_err = sqr_err
-        return min_err_idx
-
-    def get_pixel(self, x, y):
-        return self.pixels[x+8*y]
-    
-    def set_pixel(self, x, y, col):
-        def __get_bit(val, bit_idx):
-            return (val>>bit_idx)&0x1
-        def __set_bit(val, bit_idx, bit_val):
-            return (val&(0xff&~(1<<bit_idx)))|bit_val<<bit_idx
-        pal_idx = self.find_best_palette_color(col)
-        pixel_idx = x+8*y
-        b_idx = pixel_idx//8
-        bit_idx = 7-pixel_idx % 8
-        self.bs[b_idx*2] = __set_bit(self.bs[b_idx*2], bit_idx, __get_bit(pal_idx,0))
-        self.bs[b_idx*2+1] = __set_bit(self.bs[b_idx*2+1], bit_idx, __get_bit(pal_idx,1))
-        self.bs[b_idx*2+16] = __set_bit(self.bs[b_idx*2+16], bit_idx, __get_bit(pal_idx,2))
-        self.bs[b_idx*2+1+16] = __set_bit(self.bs[b_idx*2+1+16], bit_idx, __get_bit(pal_idx,3))
-        self.pixels[pixel_idx] = col
-        
-class SBBS_Team_Logo:
+from .dirty_tracked import Dirty_Tracked
+from .profiling import timed
+from .snes_palette import get_quantizer
+from .snes_tile import SNES_Tile_4bpp, TILE_SIZE, TILE_PIXELS, tiles_to_rows, rows_to_tiles
+
+class SBBS_Team_Logo(Dirty_Tracked):
     TEAM_LOGO_BASE_OFF = 0x58000
     TEAM_LOGO_HIGH_SIZE = 0x60
     TEAM_LOGO_LOW_SIZE = 0x60
     TEAM_LOGO_PIXEL_DIMS = (24,16)
+    TEAM_LOGO_TILES_WIDE = 3
+    TEAM_LOGO_BANK_SIZE = 0x8000
     TEAM_LOGO_COLOR_MAP = [0x00000000,0x000000FF,0x63ADF7FF,0x317BDEFF,0x00BD00FF,0x00EF00FF,0xB52908FF,0xEFEF00FF,0x848484FF,0xADADADFF,0xC6C6C6FF,0x18529CFF,0xA55A00FF,0xDE7B00FF,0xCE9400FF,0xF7F7F7FF]
     TEAM_LOGO_MAPPING_HIGH = {
         0:0x200*0,
@@ -89,48 +34,119 @@ class SBBS_Team_Logo:
 
     TEAM_LOGO_MAPPING_LOW_OFF = 0x200
 
+    __color_map = None
+
+    @timed("logo.decode")
     def __init__(self, rom, team_idx):
         self.rom = rom
         self.high_base = SBBS_Team_Logo.TEAM_LOGO_BASE_OFF+SBBS_Team_Logo.TEAM_LOGO_MAPPING_HIGH[team_idx]
         self.low_base = self.high_base + SBBS_Team_Logo.TEAM_LOGO_MAPPING_LOW_OFF
         self.high_bytes = self.rom.read_bytes(self.high_base,SBBS_Team_Logo.TEAM_LOGO_HIGH_SIZE)
         self.low_bytes = self.rom.read_bytes(self.low_base,SBBS_Team_Logo.TEAM_LOGO_HIGH_SIZE)
-        self.color_map = [PIL.ImageColor.getrgb(f"#{v:08X}") for v in SBBS_Team_Logo.TEAM_LOGO_COLOR_MAP]
-        print(self.color_map)
-        self.high_tiles = [SNES_Tile_4bpp(self.high_bytes[0:32], self.color_map),
-                           SNES_Tile_4bpp(self.high_bytes[32:64],self.color_map),
-                           SNES_Tile_4bpp(self.high_bytes[64:96],self.color_map)]
-        self.low_tiles = [SNES_Tile_4bpp(self.low_bytes[0:32], self.color_map),
-                           SNES_Tile_4bpp(self.low_bytes[32:64],self.color_map),
-                           SNES_Tile_4bpp(self.low_bytes[64:96],self.color_map)]
+        self.color_map = SBBS_Team_Logo.get_color_map()
+        # All six tiles are decoded in one go, high tiles first
+        tile_data = bytes(self.high_bytes)+bytes(self.low_bytes)
+        indices = SNES_Tile_4bpp.decode_many(tile_data)
+        tiles = [SNES_Tile_4bpp(tile_data[i*TILE_SIZE:(i+1)*TILE_SIZE], self.color_map, indices[i*TILE_PIXELS:(i+1)*TILE_PIXELS]) for i in range(6)]
+        self.high_tiles = tiles[:3]
+        self.low_tiles = tiles[3:]
+
+    @classmethod
+    def get_color_map(cls)->list[tuple]:
+        if cls.__color_map is None:
+            # RRGGBBAA, unpacked here so PIL only gets imported for actual image files
+            cls.__color_map = [((v>>24)&0xff, (v>>16)&0xff, (v>>8)&0xff, v&0xff) for v in SBBS_Team_Logo.TEAM_LOGO_COLOR_MAP]
+        return cls.__color_map
+
+    @classmethod
+    def get_quantizer(cls):
+        return get_quantizer(tuple(cls.get_color_map()))
+
+    @classmethod
+    def palette(cls)->list[int]:
+        # TEAM_LOGO_COLOR_MAP as flat RGB list for "P" images, index 0 is the transparent color
+        return [channel for col in cls.get_color_map() for channel in col[:3]]
+
+    @classmethod
+    def image_to_indices(cls, image)->bytes:
+        # Indexed images that already use the logo palette are taken as they are, other palettes
+        # only have their 256 entries matched, everything else goes through the quantizer
+        if image.mode == "P":
+            data = image.tobytes()
+            palette = image.getpalette() or []
+            if palette[:48] == cls.palette() and max(data, default=0) < len(SBBS_Team_Logo.TEAM_LOGO_COLOR_MAP):
+                return data
+            palette = palette+[0]*(768-len(palette))
+            # PNG stores transparency as one alpha value per palette entry, GIF and BMP as a single index
+            transparency = image.info.get("transparency")
+            alpha = [255]*256
+            if isinstance(transparency, bytes):
+                alpha[:len(transparency)] = transparency
+            elif transparency is not None:
+                alpha[transparency] = 0
+            quantizer = cls.get_quantizer()
+            table = bytes(quantizer.find(tuple(palette[i*3:i*3+3])+(alpha[i],)) for i in range(256))
+            return data.translate(table)
+        return cls.get_quantizer().quantize_image(image)
 
+    @classmethod
+    def decode_bank(cls, rom, first_tile:int=0, count:int=None)->bytearray:
+        # Palette indices of tiles in the logo graphics bank, 64 per tile
+        max_count = SBBS_Team_Logo.TEAM_LOGO_BANK_SIZE//TILE_SIZE - first_tile
+        if count is None:
+            count = max_count
+        assert 0 <= first_tile and count <= max_count, f"Tiles {first_tile}-{first_tile+count} are outside of the logo bank"
+        return SNES_Tile_4bpp.decode_many(rom.read_bytes(SBBS_Team_Logo.TEAM_LOGO_BASE_OFF+first_tile*TILE_SIZE, count*TILE_SIZE))
+
+    def get_indices(self)->bytearray:
+        # One palette index per pixel, row by row
+        tile_indices = b"".join([tile.palette_idx for tile in self.high_tiles+self.low_tiles])
+        return tiles_to_rows(tile_indices, SBBS_Team_Logo.TEAM_LOGO_TILES_WIDE)
+
+    def set_indices(self, indices:bytes):
+        tile_indices = rows_to_tiles(indices, *SBBS_Team_Logo.TEAM_LOGO_PIXEL_DIMS)
+        old_bytes = self.tile_bytes()
+        for i,tile in enumerate(self.high_tiles+self.low_tiles):
+            tile.set_palette_indices(tile_indices[i*TILE_PIXELS:(i+1)*TILE_PIXELS])
+        if self.tile_bytes() != old_bytes:
+            self.mark_dirty()
+
+    @timed("logo.export")
     def export_to(self, path):
+        import PIL.Image
         image = PIL.Image.new("RGBA", size=SBBS_Team_Logo.TEAM_LOGO_PIXEL_DIMS)
-        for x_t in range(3):
-            high_tile = self.high_tiles[x_t]
-            low_tile = self.low_tiles[x_t]
-            for x in range(8):
-                for y in range(8):
-                    image.putpixel((x_t*8+x,y), high_tile.get_pixel(x,y))
-                    image.putpixel((x_t*8+x,y+8), low_tile.get_pixel(x,y))
+        image.putdata([self.color_map[idx] for idx in self.get_indices()])
         image.save(path)
 
+    def tile_bytes(self)->bytes:
+        return b"".join([tile.bs for tile in self.high_tiles+self.low_tiles])
+
+    def set_tile_bytes(self, data:bytes):
+        # Raw 4bpp data of all six tiles, high tiles first
+        assert len(data) == 6*TILE_SIZE, f"Expected {6*TILE_SIZE} bytes of tile data, got {len(data)}"
+        if data == self.tile_bytes():
+            return
+        indices = SNES_Tile_4bpp.decode_many(data)
+        for i,tile in enumerate(self.high_tiles+self.low_tiles):
+            tile.bs = bytearray(data[i*TILE_SIZE:(i+1)*TILE_SIZE])
+            tile.palette_idx = indices[i*TILE_PIXELS:(i+1)*TILE_PIXELS]
+        self.mark_dirty()
+
+    @timed("logo.import")
     def import_from(self, path):
+        import PIL.Image
         image = PIL.Image.open(path)
         assert image.size[0] == 24
         assert image.size[1] == 16
-        for x_t in range(3):
-            high_tile = self.high_tiles[x_t]
-            low_tile = self.low_tiles[x_t]
-            x_off = 8*x_t
-            for x in range(8):
-                for y in range(8):
-                    high_tile.set_pixel(x,y,image.getpixel((x_off+x,y)))
-                    low_tile.set_pixel(x,y,image.getpixel((x_off+x,y+8)))
+        self.set_indices(SBBS_Team_Logo.image_to_indices(image))
 
+    @timed("logo.encode")
     def update_in_rom(self):
+        if not self.dirty:
+            return
         for i in range(3):
             high_tile = self.high_tiles[i]
             low_tile = self.low_tiles[i]
             self.rom.replace_byte_range(self.high_base+i*0x20, high_tile.bs)
-            self.rom.replace_byte_range(self.low_base+i*0x20, low_tile.bs)
\ No newline at end of file
+            self.rom.replace_byte_range(self.low_base+i*0x20, low_tile.bs)
+        self.mark_clean()
\ No newline at end of file
@@ -0,0 +1,142 @@
+from .sbbs_player_table import SBBS_Player_Table
+from .sbbs_player import SBBS_Player_Field
+import ast
+import logging
+
+class SBBS_Transform:
+    # A bulk edit rule over the player table, e.g.
+    #   team=POWERS fielders: hr=min(hr*1.2,99)
+    #   all pitchers: era-=0.5; spd+=1
+    # Selector: optional team=NAME|IDX[,...] and all|fielders|pitchers, assignments are separated by ';'
+    FUNCTIONS = {"min": min, "max": max, "abs": abs, "round": round, "int": int}
+    ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+                     ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.USub, ast.UAdd)
+    OPERATORS = ("+=", "-=", "*=", "/=", "=")
+    # Not stored in a column, derived from another one and a scale
+    DERIVED = {"era": ("av", 100)}
+
+    def __init__(self, rule:str):
+        self.rule = rule
+        assert ":" in rule, f"Missing ':' in transform rule \"{rule}\""
+        selector, assignments = rule.split(":", 1)
+        self.__parse_selector(selector)
+        self.assignments = [self.__parse_assignment(a) for a in assignments.split(";") if a.strip()]
+        assert self.assignments, f"No assignments in transform rule \"{rule}\""
+        self.__check_columns()
+
+    def __parse_selector(self, selector:str):
+        self.teams = None
+        self.fielders = True
+        self.pitchers = True
+        for token in selector.split():
+            token_l = token.lower()
+            if token_l.startswith("team="):
+                self.teams = [t.strip() for t in token[5:].split(",")]
+            elif token_l == "fielders":
+                self.pitchers = False
+            elif token_l == "pitchers":
+                self.fielders = False
+            elif token_l != "all":
+                raise ValueError(f"Unknown selector \"{token}\" in transform rule \"{self.rule}\"")
+
+    def __parse_assignment(self, assignment:str):
+        for op in SBBS_Transform.OPERATORS:
+            if op in assignment:
+                target, expr = assignment.split(op, 1)
+                break
+        else:
+            raise ValueError(f"Missing assignment in \"{assignment}\"")
+        target = target.strip()
+        if op != "=":
+            expr = f"{target} {op[0]} ({expr})"
+        tree = ast.parse(expr.strip(), mode="eval")
+        names = []
+        for node in ast.walk(tree):
+            if not isinstance(node, SBBS_Transform.ALLOWED_NODES):
+                raise ValueError(f"Unsupported expression \"{ast.unparse(node)}\" in \"{assignment}\"")
+            if isinstance(node, ast.Call):
+                assert isinstance(node.func, ast.Name) and node.func.id in SBBS_Transform.FUNCTIONS, f"Unsupported function in \"{assignment}\""
+            elif isinstance(node, ast.Name) and node.id not in SBBS_Transform.FUNCTIONS and node.id not in names:
+                names.append(node.id)
+        # Compiled once into a function of the referenced columns
+        code = compile(f"lambda {', '.join(names)}: ({ast.unparse(tree)})", "<transform>", "eval")
+        func = eval(code, {"__builtins__": {}, **SBBS_Transform.FUNCTIONS})
+        return target, names, func
+
+    def __check_columns(self):
+        # Fielders and pitchers read some bytes differently (f vs pitch_f), a rule over both can only use the columns they share
+        assert self.fielders or self.pitchers, f"Transform rule \"{self.rule}\" selects neither fielders nor pitchers"
+        valid = SBBS_Player_Table.role_columns(self.fielders, self.pitchers)
+        role = "fielders and pitchers" if self.fielders and self.pitchers else "fielders" if self.fielders else "pitchers"
+        for target, names, _ in self.assignments:
+            for name in [target]+names:
+                assert name in valid, f"\"{name}\" can't be used for {role} in transform rule \"{self.rule}\". Valid: {', '.join(sorted(valid))}"
+
+    def __select_rows(self, rom, table:SBBS_Player_Table)->list[int]:
+        if self.teams is None:
+            team_idxs = range(len(rom.teams))
+        else:
+            team_idxs = []
+            for team in self.teams:
+                if team.isdigit():
+                    team_idxs.append(int(team))
+                    continue
+                matches = [i for i,t in enumerate(rom.teams) if t.name.strip().upper() == team.upper()]
+                assert matches, f"No team called \"{team}\""
+                team_idxs.extend(matches)
+        rows = []
+        for team_idx in team_idxs:
+            if self.fielders:
+                rows.extend(table.rows(fielders=True, pitchers=False, team_idx=team_idx))
+            if self.pitchers:
+                rows.extend(table.rows(fielders=False, pitchers=True, team_idx=team_idx))
+        return rows
+
+    @staticmethod
+    def __column_values(table:SBBS_Player_Table, name:str, rows:list[int]):
+        if name in SBBS_Transform.DERIVED:
+            column, scale = SBBS_Transform.DERIVED[name]
+            values = table[column]
+            return [values[row]/scale for row in rows]
+        values = table[name]
+        return [values[row] for row in rows]
+
+    def apply(self, rom, table:SBBS_Player_Table)->int:
+        rows = self.__select_rows(rom, table)
+        changed = 0
+        for target, names, func in self.assignments:
+            args = [SBBS_Transform.__column_values(table, name, rows) for name in names]
+            results = [func(*values) for values in zip(*args)] if args else [func()]*len(rows)
+            scale = 1
+            column_name = target
+            if target in SBBS_Transform.DERIVED:
+                column_name, scale = SBBS_Transform.DERIVED[target]
+            column = table[column_name]
+            if isinstance(column, list):
+                new_values = [str(v) for v in results]
+            else:
+                new_values = [int(round(v*scale)) for v in results]
+                self.__validate(table, column_name, new_values)
+            for row, value in zip(rows, new_values):
+                if column[row] != value:
+                    column[row] = value
+                    changed += 1
+        return changed
+
+    def __validate(self, table:SBBS_Player_Table, column_name:str, values:list[int]):
+        if not values:
+            return
+        field, _ = table.fields[SBBS_Player_Table.ALIASES.get(column_name, column_name)]
+        max_value = SBBS_Player_Table.MAX_VALUES.get(field.kind, 0xff)
+        low, high = min(values), max(values)
+        assert low >= 0 and high <= max_value, f"\"{self.rule}\" produces {column_name} values outside of 0-{max_value} ({low}-{high})"
+
+def apply_transforms(rom, rules:list[str])->int:
+    # All rules work on one player table, the ROM is only written once at the end
+    logger = logging.getLogger("C.SBBS_Transform")
+    transforms = [SBBS_Transform(rule) for rule in rules]
+    table = rom.player_table()
+    for transform in transforms:
+        changed = transform.apply(rom, table)
+        logger.info(f"\"{transform.rule}\" changed {changed} values")
+    return table.write_back()
@@ -0,0 +1,155 @@
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import re
+import select
+import struct
+import time
+
+class Inotify_Watcher:
+    # Changed file names of one directory through inotify, linux only
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_DELETE = 0x200
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, path:str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Editors that save through a temporary file and rename show up as IN_MOVED_TO
+        mask = Inotify_Watcher.IN_CLOSE_WRITE | Inotify_Watcher.IN_MOVED_TO | Inotify_Watcher.IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+
+    def wait(self, timeout:float=None)->set[str]:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        names = set()
+        try:
+            while True:
+                data = os.read(self.fd, 0x10000)
+                o = 0
+                while o < len(data):
+                    _, _, _, length = Inotify_Watcher.EVENT.unpack_from(data, o)
+                    o += Inotify_Watcher.EVENT.size
+                    names.add(os.fsdecode(data[o:o+length].rstrip(b"\0")))
+                    o += length
+        except BlockingIOError:
+            pass
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class Polling_Watcher:
+    # Fallback that compares mtime and size of every file in the directory
+    def __init__(self, path:str, interval:float=0.05):
+        self.path = path
+        self.interval = interval
+        self.state = self.__scan()
+
+    def __scan(self)->dict:
+        state = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    state[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def wait(self, timeout:float=None)->set[str]:
+        end = None if timeout is None else time.monotonic()+timeout
+        while True:
+            state = self.__scan()
+            names = {name for name in state.keys() | self.state.keys() if state.get(name) != self.state.get(name)}
+            self.state = state
+            if names or (end is not None and time.monotonic() >= end):
+                return names
+            time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+def create_watcher(path:str, polling:bool=False):
+    if not polling:
+        try:
+            return Inotify_Watcher(path)
+        except (OSError, AttributeError) as e:
+            logging.getLogger("C.Watch").info(f"inotify isn't available ({e}), polling {path} instead")
+    return Polling_Watcher(path)
+
+class SBBS_Watch:
+    # Keeps the ROM in memory and only re-applies the team files that changed.
+    # The byte sum is tracked incrementally, so writing the output doesn't rescan the ROM
+    TEAM_FILE = re.compile(r"team_(\d+)\.(json|bmp)$")
+    # Editors often write a file in several steps, changes that arrive this close together are applied together
+    SETTLE_TIME = 0.02
+
+    def __init__(self, rom:"SBBS_ROM", import_path:str, output:str=None, patch:str=None, polling:bool=False):
+        assert output or patch, "Watching needs an output ROM or patch path"
+        self.logger = logging.getLogger("C."+self.__class__.__name__)
+        self.rom = rom
+        self.import_path = import_path
+        self.output = output
+        self.patch = patch
+        self.watcher = create_watcher(import_path, polling)
+
+    def changed_teams(self, names)->dict[int, set[str]]:
+        teams = {}
+        for name in names:
+            match = SBBS_Watch.TEAM_FILE.match(name)
+            if match and int(match.group(1)) < len(self.rom.teams):
+                teams.setdefault(int(match.group(1)), set()).add(match.group(2))
+        return teams
+
+    def apply(self, team_idx:int, kinds:set[str]):
+        team = self.rom.teams[team_idx]
+        team_path = os.path.join(self.import_path, f"team_{team_idx}.json")
+        logo_path = os.path.join(self.import_path, f"team_{team_idx}.bmp")
+        if "json" in kinds and os.path.exists(team_path):
+            with open(team_path, "r") as f:
+                team.from_dict(json.load(f))
+        if "bmp" in kinds and os.path.exists(logo_path):
+            team.logo.import_from(logo_path)
+        team.update_in_rom()
+
+    def write(self):
+        # Written next to the target and renamed, so an emulator never loads half a ROM
+        for path, write in ((self.output, self.rom.write_to), (self.patch, self.rom.write_patch_to)):
+            if path:
+                tmp_path = f"{path}.tmp{os.path.splitext(path)[1]}"
+                write(tmp_path)
+                os.replace(tmp_path, path)
+
+    def run(self, max_updates:int=None):
+        self.logger.info(f"Watching {self.import_path} for changes, Ctrl+C to stop")
+        updates = 0
+        try:
+            while max_updates is None or updates < max_updates:
+                names = self.watcher.wait()
+                start = time.perf_counter()
+                names |= self.watcher.wait(SBBS_Watch.SETTLE_TIME)
+                teams = self.changed_teams(names)
+                if not teams:
+                    continue
+                try:
+                    for team_idx, kinds in sorted(teams.items()):
+                        self.apply(team_idx, kinds)
+                    self.write()
+                except Exception as e:
+                    # A file caught in the middle of being saved, the next change event fixes it
+                    self.logger.error(f"Couldn't apply changes to teams {sorted(teams)}: {e}")
+                    continue
+                updates += 1
+                self.logger.info(f"Updated teams {sorted(teams)} in {(time.perf_counter()-start)*1000:.1f}ms")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.watcher.close()
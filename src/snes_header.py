@@ -11,7 +11,8 @@ class ROM_MM_MODE(Enum):
 class SNES_ROM_Header:
     #https://snes.nesdev.org/wiki/ROM_header
     def __init__(self, data:bytes):
-        self.data = data
+        # Can be a view into the ROM, the header is small enough to just keep a copy
+        self.data = bytes(data)
         self.base_off = -0xffc0
         self.__try_parse()
 
@@ -20,7 +21,7 @@ class SNES_ROM_Header:
 
         assert len(self.data) == 0x40, "Invalid length of header data"
         title_bytes = self.data[0xffc0+base_off:0xffd5+base_off]
-        self.title = title_bytes.decode("ascii")
+        self.title = str(title_bytes, "ascii")
         assert all([c in string.printable for c in self.title])
 
         self.speed_byte = self.data[0xffd5+base_off]
@@ -0,0 +1,52 @@
+import functools
+import sys
+
+class SNES_Palette_Quantizer:
+    # Maps colors to the index of the closest palette color. Results are memoized, so repeated
+    # imports of the same colors skip the search. Matches SNES_Tile_4bpp.find_best_palette_color:
+    # colors with alpha != 255 map to 0, ties go to the last palette entry
+    MEMO_SIZE = 4096
+
+    def __init__(self, color_map:list[tuple]):
+        self.color_map = tuple(tuple(col) for col in color_map)
+        self.find = functools.lru_cache(maxsize=SNES_Palette_Quantizer.MEMO_SIZE)(self.__find)
+
+    def __find(self, col:tuple)->int:
+        if len(col)>3 and col[3] != 255:
+            return 0
+        min_sqr_err = 10000000
+        min_err_idx = 0
+        r, g, b = col[0], col[1], col[2]
+        for idx,pal_col in enumerate(self.color_map):
+            d_r = pal_col[0]-r
+            d_g = pal_col[1]-g
+            d_b = pal_col[2]-b
+            sqr_err = d_r*d_r+d_g*d_g+d_b*d_b
+            if sqr_err <= min_sqr_err:
+                min_err_idx = idx
+                min_sqr_err = sqr_err
+        return min_err_idx
+
+    def quantize(self, colors)->bytes:
+        find = self.find
+        return bytes([find(tuple(col)) for col in colors])
+
+    def quantize_image(self, image)->bytes:
+        # Palette index for every pixel, row by row. RGB(A) images are converted on their raw bytes,
+        # only the distinct colors go through the search
+        if image.mode == "RGBA":
+            data = image.tobytes()
+            pixels = memoryview(data).cast("I")
+            lut = {v: self.find(tuple(v.to_bytes(4, sys.byteorder))) for v in set(pixels)}
+            return bytes([lut[v] for v in pixels])
+        if image.mode == "RGB":
+            data = image.tobytes()
+            pixels = [data[i:i+3] for i in range(0, len(data), 3)]
+            lut = {v: self.find(tuple(v)) for v in set(pixels)}
+            return bytes([lut[v] for v in pixels])
+        return self.quantize(image.getdata())
+
+@functools.lru_cache(maxsize=None)
+def get_quantizer(color_map:tuple)->SNES_Palette_Quantizer:
+    # One quantizer (and memo) per palette, shared by everything in the process
+    return SNES_Palette_Quantizer(color_map)
@@ -0,0 +1,169 @@
+import struct
+import zlib
+
+IPS_MAGIC = b"PATCH"
+IPS_EOF = b"EOF"
+IPS_MAX_RECORD_SIZE = 0xffff
+IPS_MAX_OFFSET = 0xffffff
+BPS_MAGIC = b"BPS1"
+BPS_SOURCE_READ = 0
+BPS_TARGET_READ = 1
+BPS_SOURCE_COPY = 2
+BPS_TARGET_COPY = 3
+
+def merge_ranges(ranges)->list[tuple[int,int]]:
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def diff_runs(source:bytes, target:bytes, ranges, merge_gap:int=0)->list[tuple[int,int]]:
+    # Only the given ranges are compared, everything outside is assumed to be unchanged
+    runs = []
+    for start, end in merge_ranges(ranges):
+        run_start = None
+        for off in range(start, end):
+            if source[off] != target[off]:
+                if run_start is None:
+                    if runs and off-runs[-1][1] <= merge_gap:
+                        run_start = runs.pop()[0]
+                    else:
+                        run_start = off
+                run_end = off+1
+            elif run_start is not None:
+                runs.append((run_start, run_end))
+                run_start = None
+        if run_start is not None:
+            runs.append((run_start, run_end))
+    return runs
+
+def create_ips(source:bytes, target:bytes, ranges)->bytes:
+    assert len(source) == len(target), "IPS patches can't change the size of the ROM"
+    assert len(target) <= IPS_MAX_OFFSET+1, "ROM is too big for an IPS patch"
+    patch = bytearray(IPS_MAGIC)
+    # A record costs 5 bytes, so it's cheaper to resend short unchanged gaps
+    for start, end in diff_runs(source, target, ranges, merge_gap=5):
+        if start == 0x454f46:
+            # Offset would read as "EOF"
+            start -= 1
+        for off in range(start, end, IPS_MAX_RECORD_SIZE):
+            size = min(IPS_MAX_RECORD_SIZE, end-off)
+            patch += off.to_bytes(3, "big") + size.to_bytes(2, "big") + target[off:off+size]
+    patch += IPS_EOF
+    return bytes(patch)
+
+def iter_ips(patch:bytes):
+    assert patch[:len(IPS_MAGIC)] == IPS_MAGIC, "Not an IPS patch"
+    pos = len(IPS_MAGIC)
+    while patch[pos:pos+3] != IPS_EOF:
+        assert pos+5 <= len(patch), "Truncated IPS patch"
+        offset = int.from_bytes(patch[pos:pos+3], "big")
+        size = int.from_bytes(patch[pos+3:pos+5], "big")
+        pos += 5
+        if size == 0:
+            # RLE record
+            size = int.from_bytes(patch[pos:pos+2], "big")
+            yield offset, patch[pos+2:pos+3]*size
+            pos += 3
+        else:
+            yield offset, patch[pos:pos+size]
+            pos += size
+
+def apply_ips(data:bytearray, patch:bytes)->bytearray:
+    for offset, new_bytes in iter_ips(patch):
+        data[offset:offset+len(new_bytes)] = new_bytes
+    return data
+
+def encode_bps_number(value:int)->bytes:
+    out = bytearray()
+    while True:
+        x = value & 0x7f
+        value >>= 7
+        if value == 0:
+            out.append(0x80 | x)
+            return bytes(out)
+        out.append(x)
+        value -= 1
+
+def decode_bps_number(patch:bytes, pos:int)->tuple[int,int]:
+    value = 0
+    shift = 1
+    while True:
+        x = patch[pos]
+        pos += 1
+        value += (x & 0x7f)*shift
+        if x & 0x80:
+            return value, pos
+        shift <<= 7
+        value += shift
+
+def create_bps(source:bytes, target:bytes, ranges, metadata:bytes=b"")->bytes:
+    assert len(source) == len(target), "Only same size ROMs are supported"
+    patch = bytearray(BPS_MAGIC)
+    patch += encode_bps_number(len(source))
+    patch += encode_bps_number(len(target))
+    patch += encode_bps_number(len(metadata))
+    patch += metadata
+    pos = 0
+    for start, end in diff_runs(source, target, ranges, merge_gap=2):
+        if start > pos:
+            patch += encode_bps_number((start-pos-1) << 2 | BPS_SOURCE_READ)
+        patch += encode_bps_number((end-start-1) << 2 | BPS_TARGET_READ)
+        patch += target[start:end]
+        pos = end
+    if pos < len(target):
+        patch += encode_bps_number((len(target)-pos-1) << 2 | BPS_SOURCE_READ)
+    patch += struct.pack("<II", zlib.crc32(source), zlib.crc32(target))
+    patch += struct.pack("<I", zlib.crc32(patch))
+    return bytes(patch)
+
+def decode_bps(source:bytes, patch:bytes)->tuple[bytearray,list[tuple[int,int]]]:
+    # Returns the target and the ranges that aren't plain SourceReads, so callers can apply just those
+    assert patch[:len(BPS_MAGIC)] == BPS_MAGIC, "Not a BPS patch"
+    source_crc, target_crc, patch_crc = struct.unpack("<III", patch[-12:])
+    assert zlib.crc32(patch[:-4]) == patch_crc, "BPS patch is corrupted"
+    assert zlib.crc32(source) == source_crc, "BPS patch doesn't match this ROM"
+    source_size, pos = decode_bps_number(patch, len(BPS_MAGIC))
+    target_size, pos = decode_bps_number(patch, pos)
+    metadata_size, pos = decode_bps_number(patch, pos)
+    assert source_size == len(source), "BPS patch doesn't match the ROM size"
+    assert target_size == source_size, "Only same size ROMs are supported"
+    pos += metadata_size
+    end = len(patch)-12
+    target = bytearray(source)
+    ranges = []
+    out = 0
+    source_rel = 0
+    target_rel = 0
+    while pos < end:
+        value, pos = decode_bps_number(patch, pos)
+        action = value & 3
+        length = (value >> 2)+1
+        if action == BPS_TARGET_READ:
+            target[out:out+length] = patch[pos:pos+length]
+            pos += length
+        elif action != BPS_SOURCE_READ:
+            rel, pos = decode_bps_number(patch, pos)
+            rel = -(rel >> 1) if rel & 1 else rel >> 1
+            if action == BPS_SOURCE_COPY:
+                source_rel += rel
+                target[out:out+length] = source[source_rel:source_rel+length]
+                source_rel += length
+            else:
+                target_rel += rel
+                # Copies may overlap with their own output, so go byte by byte
+                for i in range(length):
+                    target[out+i] = target[target_rel+i]
+                target_rel += length
+        if action != BPS_SOURCE_READ:
+            ranges.append((out, out+length))
+        out += length
+    assert zlib.crc32(target) == target_crc, "Patched ROM doesn't match the checksum in the BPS patch"
+    return target, ranges
+
+def apply_bps(source:bytes, patch:bytes)->bytearray:
+    return decode_bps(source, patch)[0]
@@ -1,16 +1,51 @@
 from .snes_header import SNES_ROM_Header
+from . import profiling
+from .profiling import timed
+from .snes_patch import create_ips, create_bps, iter_ips, decode_bps, merge_ranges, diff_runs, IPS_MAGIC, BPS_MAGIC
+import bisect
+import contextlib
+import copy
+import gc
 import logging
+import mmap
+import os
+import struct
 
 class SNES_ROM:
-    def __init__(self, data:bytes):
-        self.data = bytearray(data)
+    # Recompute the full checksum whenever the incrementally tracked one is used
+    # and assert that both agree. Slow, only meant for debugging.
+    VERIFY_CHECKSUM = False
+
+    PATCH_FORMATS = ("ips", "bps")
+    # Entries in originals before they get merged into one entry per changed range
+    ORIGINALS_LIMIT = 4096
+    MMAP_MODES = {"r": mmap.ACCESS_READ, "c": mmap.ACCESS_COPY}
+
+    def __init__(self, data:bytes, source:bytes=None, check_checksum:bool=True):
+        # Unmodified data, patches are created against it. Without a source (e.g. the read only mapping
+        # of the file) the old bytes of every write go to originals instead of keeping a second copy of the ROM
+        self.source = source
+        self.originals = []
+        # mmaps are used as they are, read_bytes then hands out views instead of copies
+        self.mapped_path = None
+        self.view = None
+        if isinstance(data, mmap.mmap):
+            self.data = data
+            self.view = memoryview(data)
+        else:
+            self.data = bytearray(data)
+        self.modified_ranges = []
+        # (file offset, old bytes) of every write while a snapshot exists, None otherwise
+        self.journal = None
+        self.snapshots = {}
         self.logger = logging.getLogger("C."+self.__class__.__name__)
         self.has_extra_header = False
         self.base_offset = 0
         self.__check_length()
         self.__find_header()
         assert self.header, "Couldn't find ROM header"
-        self.__calculate_checksum()
+        # check_checksum=False loads ROMs whose header checksum wasn't updated, e.g. hacks
+        self.__calculate_checksum(check_checksum)
     
     def __check_length(self):
         self.length = len(self.data)
@@ -24,37 +59,322 @@ class SNES_ROM:
         for off in possible_header_offsets:
             try:
                 t_off = off+self.base_offset
-                self.header = SNES_ROM_Header(self.data[t_off:t_off+0x40])
+                self.header = SNES_ROM_Header(self.read_bytes(off, 0x40))
                 self.header_base = t_off
                 return
             except Exception as e:
                 self.logger.debug(f"Error while trying to parse header at {hex(off)}: {e}")
 
+    def __sum_bytes(self)->int:
+        # sum() over a bytearray runs in C, no need to walk the bytes in python
+        if self.view is not None:
+            return sum(self.view[self.base_offset:])
+        return sum(self.data[self.base_offset:])
+
+    @timed("rom.checksum")
     def __calculate_checksum(self, do_check=True):
-        curr_sum = 0
-        for b in self.data[self.base_offset:]:
-            curr_sum += b
-        self.checksum = curr_sum & 0xffff
-        self.checksum_complement = (self.checksum ^ 0xffff) & 0xffff
+        self.byte_sum = self.__sum_bytes()
+        self.__set_checksum()
 
         if do_check:
             assert self.checksum == self.header.checksum, f"Checksum Mismatch. Calculated: {hex(self.checksum)} Header Checksum: {hex(self.header.checksum)}"
             assert self.checksum_complement == self.header.checksum_complement, f"Checksum Complement Mismatch. Calculated: {hex(self.checksum_complement)} Header Checksum: {hex(self.header.checksum_complement)}"
 
+    def __set_checksum(self):
+        self.checksum = self.byte_sum & 0xffff
+        self.checksum_complement = (self.checksum ^ 0xffff) & 0xffff
+
+    def __verify_checksum(self):
+        full_sum = self.__sum_bytes()
+        assert full_sum == self.byte_sum, f"Incremental checksum out of sync. Tracked: {hex(self.byte_sum)} Full: {hex(full_sum)}"
+
+    def __replace_if_changed(self, offset:int, new_bytes:bytes):
+        # Read only mappings can't be written at all, even with the bytes they already hold
+        if self.read_bytes(offset, len(new_bytes)) != new_bytes:
+            self.replace_byte_range(offset, new_bytes)
+
     def __update_header_bytes(self):
         # We expect checksum to be incorrect if we altered bytes
-        self.__calculate_checksum(do_check=False)
+        # The byte sum is kept up to date by replace_byte_range, so this doesn't rescan the ROM
+        # Restore the parsed header first in case it got overwritten, checksum and complement
+        # always add up to 0x1fe so writing the final values afterwards doesn't change the sum
+        self.__replace_if_changed(self.header_base-self.base_offset, self.header.to_bytes())
+        if self.VERIFY_CHECKSUM:
+            self.__verify_checksum()
+        self.__set_checksum()
         self.header.checksum = self.checksum
         self.header.checksum_complement = self.checksum_complement
-        self.data[self.header_base:self.header_base+0x40] = self.header.to_bytes()
+        self.__replace_if_changed(self.header_base-self.base_offset, self.header.to_bytes())
 
     @classmethod
-    def from_file(cls, path:str)->"SNES_ROM":
+    @timed("rom.load")
+    def from_file(cls, path:str, mmap_mode:str=None, check_checksum:bool=True)->"SNES_ROM":
+        # mmap_mode "r" maps the file read only, "c" maps it copy-on-write, so changes stay in memory
+        if mmap_mode is None:
+            with open(path, "rb") as f:
+                return cls(f.read(), check_checksum=check_checksum)
+        assert mmap_mode in SNES_ROM.MMAP_MODES, f"Unknown mmap mode \"{mmap_mode}\". Supported: {', '.join(SNES_ROM.MMAP_MODES)}"
         with open(path, "rb") as f:
-            return SNES_ROM(f.read())
-        
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            data = source
+            if mmap_mode == "c":
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        rom = cls(data, source, check_checksum)
+        rom.mapped_path = path
+        return rom
+
+    def close(self)->None:
+        # Unmaps the file. The view goes first, mmap.close() fails while a memoryview exports it
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        for buffer in (self.data, self.source):
+            if isinstance(buffer, mmap.mmap):
+                try:
+                    buffer.close()
+                except BufferError:
+                    # Parsed objects reference each other, their views may only be waiting for the cycle collector
+                    gc.collect()
+                    buffer.close()
+        self.mapped_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def copy(self)->"SNES_ROM":
+        # Clone with its own buffer, skips parsing the header and summing the ROM again
+        clone = copy.copy(self)
+        clone.data = bytearray(self.data)
+        clone.view = None
+        clone.mapped_path = None
+        clone.modified_ranges = list(self.modified_ranges)
+        clone.originals = list(self.originals)
+        clone.header = copy.copy(self.header)
+        clone.journal = None
+        clone.snapshots = {}
+        return clone
+
+    def read_bytes(self, offset:int, size:int):
+        t_off = offset + self.base_offset
+        if profiling.active:
+            profiling.active.count("rom.read_bytes.calls")
+            profiling.active.count("rom.read_bytes.bytes", size)
+        if self.view is not None:
+            return self.view[t_off:t_off+size]
+        return self.data[t_off:t_off+size]
+
+    def unpack_from(self, fmt:struct.Struct, offset:int)->tuple:
+        # Unpacks straight from the ROM buffer without slicing it first
+        if profiling.active:
+            profiling.active.count("rom.unpack.calls")
+            profiling.active.count("rom.unpack.bytes", fmt.size)
+        return fmt.unpack_from(self.data, offset + self.base_offset)
+
+    def iter_unpack(self, fmt:struct.Struct, offset:int, count:int)->list[tuple]:
+        t_off = offset + self.base_offset
+        if profiling.active:
+            profiling.active.count("rom.unpack.calls")
+            profiling.active.count("rom.unpack.bytes", fmt.size*count)
+        with memoryview(self.data) as view:
+            return list(fmt.iter_unpack(view[t_off:t_off+fmt.size*count]))
+
+    def replace_byte_range(self, offset:int, new_bytes:bytes):
+        size = len(new_bytes)
+        t_off = offset + self.base_offset
+        assert t_off+size <= self.length, f"Byte range {hex(offset)}-{hex(offset+size)} is outside of the ROM"
+        assert self.view is None or not self.view.readonly, "ROM is mapped read only"
+        if profiling.active:
+            profiling.active.count("rom.replace_byte_range.calls")
+            profiling.active.count("rom.replace_byte_range.bytes", size)
+        old_bytes = self.data[t_off:t_off+size]
+        if old_bytes != new_bytes:
+            if self.journal is not None:
+                self.journal.append((t_off, bytes(old_bytes)))
+            if self.source is None:
+                self.originals.append((t_off, bytes(old_bytes)))
+                if len(self.originals) > SNES_ROM.ORIGINALS_LIMIT:
+                    self.__compact_originals()
+        # Apply the old/new delta so the checksum never needs a full rescan
+        self.byte_sum += sum(new_bytes) - sum(old_bytes)
+        self.data[t_off: t_off+size] = new_bytes
+        self.modified_ranges.append((t_off, t_off+size))
+        if len(self.modified_ranges) > 4096:
+            self.modified_ranges = merge_ranges(self.modified_ranges)
     
-    def write_to(self, path:str)->None:
+    def __compact_originals(self):
+        # One entry per changed range. Replaying the old bytes latest first leaves the oldest ones in place
+        merged = merge_ranges([(t_off, t_off+len(old_bytes)) for t_off, old_bytes in self.originals])
+        starts = [start for start, _ in merged]
+        blocks = [bytearray(self.data[start:end]) for start, end in merged]
+        for t_off, old_bytes in reversed(self.originals):
+            i = bisect.bisect_right(starts, t_off)-1
+            o = t_off-starts[i]
+            blocks[i][o:o+len(old_bytes)] = old_bytes
+        self.originals = [(start, bytes(block)) for start, block in zip(starts, blocks)]
+
+    def original_ranges(self)->list[tuple[int,bytes]]:
+        # (file offset, unmodified bytes) covering every byte that was changed
+        if self.source is not None:
+            return [(start, bytes(self.source[start:end])) for start, end in merge_ranges(self.modified_ranges)]
+        self.__compact_originals()
+        return list(self.originals)
+
+    def source_data(self)->bytes:
+        # The unmodified ROM, only rebuilt when a patch needs it
+        if self.source is not None:
+            return self.source
+        source = bytearray(self.data)
+        for t_off, old_bytes in reversed(self.originals):
+            source[t_off:t_off+len(old_bytes)] = old_bytes
+        return source
+
+    def snapshot(self, name:str=None)->str:
+        # Marks the current state, edits after it can be rolled back. Only the old bytes of
+        # each write are kept, so a snapshot costs memory in proportion to the edits made after it
+        self.update_in_rom()
+        if self.journal is None:
+            self.journal = []
+        if name is None:
+            name = f"#{len(self.snapshots)}"
+            while name in self.snapshots:
+                name += "'"
+        self.snapshots[name] = len(self.journal)
+        return name
+
+    def __restore(self, t_off:int, old_bytes:bytes):
+        size = len(old_bytes)
+        self.byte_sum += sum(old_bytes) - sum(self.data[t_off:t_off+size])
+        self.data[t_off:t_off+size] = old_bytes
+        self.modified_ranges.append((t_off, t_off+size))
+
+    def __truncate_journal(self, position:int):
+        while len(self.journal) > position:
+            self.__restore(*self.journal.pop())
+        # Snapshots taken after the restored point don't exist anymore
+        self.snapshots = {name: mark for name, mark in self.snapshots.items() if mark <= position}
+        self.__prune_unchanged()
+        self.__find_header()
+        assert self.header, "Couldn't find ROM header after rolling back"
+
+    def __prune_unchanged(self):
+        # Rolled back ranges hold their original bytes again, patches shouldn't carry them around anymore
+        if self.source is None:
+            self.__compact_originals()
+            blocks = self.originals
+        else:
+            blocks = [(start, self.source[start:end]) for start, end in merge_ranges(self.modified_ranges)]
+        originals = []
+        ranges = []
+        for start, old_bytes in blocks:
+            for run_start, run_end in diff_runs(old_bytes, self.data[start:start+len(old_bytes)], [(0, len(old_bytes))]):
+                originals.append((start+run_start, bytes(old_bytes[run_start:run_end])))
+                ranges.append((start+run_start, start+run_end))
+        self.modified_ranges = ranges
+        if self.source is None:
+            self.originals = originals
+
+    def rollback(self, name:str)->None:
+        # Restores the bytes (and byte sum) to what they were when the snapshot was taken, the snapshot stays
+        assert name in self.snapshots, f"Unknown snapshot \"{name}\""
+        self.__truncate_journal(self.snapshots[name])
+
+    def undo(self, count:int=1)->None:
+        # Rolls back the last count writes
+        assert self.journal is not None, "Nothing to undo, take a snapshot first"
+        self.__truncate_journal(max(0, len(self.journal)-count))
+
+    def release(self, name:str)->None:
+        # Forgets a snapshot, the journal is dropped when no snapshot is left
+        del self.snapshots[name]
+        if not self.snapshots:
+            self.journal = None
+        else:
+            # Entries before the oldest snapshot can't be rolled back to anymore
+            first = min(self.snapshots.values())
+            if first:
+                self.journal = self.journal[first:]
+                self.snapshots = {name: mark-first for name, mark in self.snapshots.items()}
+
+    def changes_since(self, name:str)->list[tuple[int,int]]:
+        # Merged (start, end) ROM offset ranges written since the snapshot
+        assert name in self.snapshots, f"Unknown snapshot \"{name}\""
+        ranges = [(t_off, t_off+len(old_bytes)) for t_off, old_bytes in self.journal[self.snapshots[name]:]]
+        return [(start-self.base_offset, end-self.base_offset) for start, end in merge_ranges(ranges)]
+
+    @contextlib.contextmanager
+    def branch(self):
+        # Everything written inside the with block is rolled back when it ends
+        name = self.snapshot()
+        try:
+            yield name
+        finally:
+            self.rollback(name)
+            self.release(name)
+
+    def content_hash(self)->str:
+        # hashlib loads OpenSSL, only worth it when a hash is actually needed
+        import hashlib
+        return hashlib.sha1(self.data).hexdigest()
+
+    @contextlib.contextmanager
+    def record_changes(self):
+        # Collects the ranges (ROM offsets) written inside the with block
+        changes = []
+        saved = self.modified_ranges
+        self.modified_ranges = []
+        try:
+            yield changes
+        finally:
+            changes.extend([(start-self.base_offset, end-self.base_offset) for start, end in merge_ranges(self.modified_ranges)])
+            self.modified_ranges = saved + self.modified_ranges
+
+    @timed("rom.update")
+    def update_in_rom(self)->None:
         self.__update_header_bytes()
+
+    @timed("rom.write")
+    def write_to(self, path:str)->None:
+        self.update_in_rom()
+        # Truncating the mapped file would pull the pages out from under the mmap
+        assert not (self.mapped_path and os.path.exists(path) and os.path.samefile(path, self.mapped_path)), "Can't overwrite the file the ROM is mapped from"
+        with open(path, "wb") as f:
+            f.write(self.data)
+
+    @timed("rom.create_patch")
+    def create_patch(self, patch_format:str="ips")->bytes:
+        # Only the tracked modified ranges are diffed, the header checksum is part of them
+        self.update_in_rom()
+        if patch_format == "ips":
+            return create_ips(self.source_data(), self.data, self.modified_ranges)
+        if patch_format == "bps":
+            return create_bps(self.source_data(), self.data, self.modified_ranges)
+        raise ValueError(f"Unknown patch format \"{patch_format}\". Supported: {', '.join(SNES_ROM.PATCH_FORMATS)}")
+
+    def write_patch_to(self, path:str)->None:
+        patch_format = os.path.splitext(path)[1][1:].lower()
+        patch = self.create_patch(patch_format)
         with open(path, "wb") as f:
-            f.write(self.data)
\ No newline at end of file
+            f.write(patch)
+
+    @timed("rom.apply_patch")
+    def apply_patch(self, patch:bytes)->None:
+        # Offsets in patches are file offsets, so they include the copier header
+        if patch.startswith(IPS_MAGIC):
+            changes = iter_ips(patch)
+        elif patch.startswith(BPS_MAGIC):
+            target, ranges = decode_bps(bytes(self.data), patch)
+            changes = ((start, target[start:end]) for start, end in merge_ranges(ranges))
+        else:
+            raise ValueError("Unknown patch format")
+        for t_off, new_bytes in changes:
+            assert t_off >= self.base_offset, "Patches that change the copier header aren't supported"
+            self.replace_byte_range(t_off-self.base_offset, new_bytes)
+        self.__find_header()
+        assert self.header, "Couldn't find ROM header after patching"
+
+    def apply_patch_from(self, path:str)->None:
+        with open(path, "rb") as f:
+            self.apply_patch(f.read())
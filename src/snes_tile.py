@@ -0,0 +1,141 @@
+# Lookup tables for converting between SNES 4bpp planar tiles and one palette index per pixel.
+# A tile is 32 bytes, row r is stored in bytes 2r, 2r+1 (bitplanes 0 and 1) and 16+2r, 17+2r (bitplanes 2 and 3)
+
+import functools
+
+TILE_SIZE = 32
+TILE_PIXELS = 64
+
+# Moves bit 0 of every byte of a 64 bit int into the top byte, see encode_4bpp
+_PLANE_MASK = 0x0101010101010101
+_PLANE_GATHER = 0x0102040810204080
+
+@functools.cache
+def _plane_spread()->tuple[list[int], ...]:
+    # The 8 bits of a bitplane byte spread over the 8 bytes of a big endian int, leftmost pixel first,
+    # already shifted to the bitplane's position. Built on first use instead of at import time
+    spread = [int.from_bytes(bytes((b >> (7-i)) & 1 for i in range(8)), "big") for b in range(256)]
+    return tuple([v << plane for v in spread] for plane in range(4))
+
+def decode_4bpp(data:bytes)->bytearray:
+    assert len(data) % TILE_SIZE == 0, f"Data length ({len(data)}) isn't a multiple of the tile size"
+    spread0, spread1, spread2, spread3 = _plane_spread()
+    out = bytearray(len(data)*2)
+    o = 0
+    for t in range(0, len(data), TILE_SIZE):
+        for i in range(t, t+16, 2):
+            v = spread0[data[i]] | spread1[data[i+1]] | spread2[data[i+16]] | spread3[data[i+17]]
+            out[o:o+8] = v.to_bytes(8, "big")
+            o += 8
+    return out
+
+def encode_4bpp(indices:bytes)->bytearray:
+    assert len(indices) % TILE_PIXELS == 0, f"Pixel count ({len(indices)}) isn't a multiple of the tile size"
+    out = bytearray(len(indices)//2)
+    o = 0
+    for t in range(0, len(out), TILE_SIZE):
+        for i in range(t, t+16, 2):
+            v = int.from_bytes(indices[o:o+8], "big")
+            out[i] = ((v & _PLANE_MASK)*_PLANE_GATHER >> 56) & 0xff
+            out[i+1] = ((v >> 1 & _PLANE_MASK)*_PLANE_GATHER >> 56) & 0xff
+            out[i+16] = ((v >> 2 & _PLANE_MASK)*_PLANE_GATHER >> 56) & 0xff
+            out[i+17] = ((v >> 3 & _PLANE_MASK)*_PLANE_GATHER >> 56) & 0xff
+            o += 8
+    return out
+
+class SNES_Tile_4bpp:
+    def __init__(self, bs:bytes, color_map:list[int], palette_idx:bytes=None):
+        assert bs
+        assert len(bs) == 32
+        assert len(color_map) == 16
+        self.bs = bytearray(bs)
+        self.color_map = color_map
+        if palette_idx is None:
+            self.__decode()
+        else:
+            assert len(palette_idx) == TILE_PIXELS
+            self.palette_idx = bytearray(palette_idx)
+
+    @classmethod
+    def decode_many(cls, data:bytes)->bytearray:
+        # Palette indices of a run of tiles, 64 per tile in row order
+        return decode_4bpp(data)
+
+    @classmethod
+    def encode_many(cls, indices:bytes)->bytearray:
+        return encode_4bpp(indices)
+
+    def __decode(self):
+        self.palette_idx = decode_4bpp(self.bs)
+
+    @property
+    def pixels(self)->list:
+        return [self.color_map[idx] for idx in self.palette_idx]
+
+    def find_best_palette_color(self, col):
+        min_sqr_err = 10000000
+        min_err_idx = 0
+        if len(col)>3:
+            if col[3] != 255:
+                return 0
+        for idx,pal_col in enumerate(self.color_map):
+            d_r = pal_col[0]-col[0]
+            d_g = pal_col[1]-col[1]
+            d_b = pal_col[2]-col[2]
+            sqr_err = d_r*d_r+d_g*d_g+d_b*d_b
+            if sqr_err <= min_sqr_err: #<0 so that transparent (0) only happens in the special case earlier
+                min_err_idx = idx
+                min_sqr_err = sqr_err
+        return min_err_idx
+
+    def get_pixel(self, x, y):
+        return self.color_map[self.palette_idx[x+8*y]]
+    
+    def set_pixel(self, x, y, col):
+        self.set_palette_idx(x, y, self.find_best_palette_color(col))
+
+    def set_palette_idx(self, x, y, pal_idx):
+        pixel_idx = x+8*y
+        self.palette_idx[pixel_idx] = pal_idx
+        b_idx = 2*y
+        mask = 1 << (7-x)
+        for plane_off, bit in ((0, 1), (1, 2), (16, 4), (17, 8)):
+            if pal_idx & bit:
+                self.bs[b_idx+plane_off] |= mask
+            else:
+                self.bs[b_idx+plane_off] &= ~mask & 0xff
+
+    def set_palette_indices(self, palette_idx:bytes):
+        assert len(palette_idx) == TILE_PIXELS
+        self.palette_idx = bytearray(palette_idx)
+        self.bs = encode_4bpp(self.palette_idx)
+
+def tiles_to_rows(indices:bytes, tiles_wide:int)->bytearray:
+    # Lays out a run of decoded tiles as an image that is tiles_wide tiles wide, one byte per pixel.
+    # Missing tiles in the last row are left at 0
+    tile_count = len(indices)//TILE_PIXELS
+    tiles_high = -(-tile_count//tiles_wide)
+    width = tiles_wide*8
+    out = bytearray(width*tiles_high*8)
+    for t in range(tile_count):
+        o = (t//tiles_wide)*8*width + (t%tiles_wide)*8
+        i = t*TILE_PIXELS
+        for r in range(8):
+            out[o:o+8] = indices[i:i+8]
+            o += width
+            i += 8
+    return out
+
+def rows_to_tiles(pixels:bytes, width:int, height:int)->bytearray:
+    assert width % 8 == 0 and height % 8 == 0, f"Image size ({width}x{height}) isn't a multiple of the tile size"
+    assert len(pixels) == width*height
+    out = bytearray(len(pixels))
+    tiles_wide = width//8
+    i = 0
+    for t in range((width//8)*(height//8)):
+        o = (t//tiles_wide)*8*width + (t%tiles_wide)*8
+        for r in range(8):
+            out[i:i+8] = pixels[o:o+8]
+            o += width
+            i += 8
+    return out
@@ -0,0 +1,171 @@
+from concurrent.futures import ProcessPoolExecutor
+from .snes_rom import SNES_ROM
+import itertools
+import logging
+import os
+
+def parse_int_list(spec:str)->list[int]:
+    # "0x10,0x20" or python range style "start:stop[:step]", both can be mixed
+    values = []
+    for item in spec.split(","):
+        parts = [int(p, 0) for p in item.split(":")]
+        if len(parts) == 1:
+            values.append(parts[0])
+        else:
+            values.extend(range(*parts))
+    return values
+
+class SNES_Variant_Spec:
+    # Declarative description of a set of variants that each overwrite one range with one fill value.
+    # By default every offset is combined with every size and fill value, zip=True pairs them up instead
+    def __init__(self, offsets, sizes, fills, zip:bool=False):
+        self.offsets = list(offsets)
+        self.sizes = list(sizes)
+        self.fills = list(fills)
+        self.zip = zip
+        invalid = [fill for fill in self.fills if not 0 <= fill <= 0xff]
+        assert not invalid, f"Fill values have to be bytes (0-255), got {', '.join(hex(fill) for fill in invalid)}"
+
+    @classmethod
+    def parse(cls, spec:str)->"SNES_Variant_Spec":
+        # OFFSETS/SIZES/FILLS[/zip], e.g. "0x58000:0x59800:0x60/0x60/0:64/zip"
+        parts = spec.split("/")
+        assert len(parts) in (3, 4), f"Invalid variant spec \"{spec}\". Expected OFFSETS/SIZES/FILLS[/zip]"
+        zip_mode = False
+        if len(parts) == 4:
+            assert parts[3] == "zip", f"Unknown variant mode \"{parts[3]}\""
+            zip_mode = True
+        return SNES_Variant_Spec(parse_int_list(parts[0]), parse_int_list(parts[1]), parse_int_list(parts[2]), zip_mode)
+
+    def variants(self):
+        if self.zip:
+            n = max(len(self.offsets), len(self.sizes), len(self.fills))
+            for i in range(n):
+                yield (self.offsets[i % len(self.offsets)], self.sizes[i % len(self.sizes)], self.fills[i % len(self.fills)])
+        else:
+            yield from itertools.product(self.offsets, self.sizes, self.fills)
+
+class SNES_ROM_Overlay:
+    # Copy-on-write view of an immutable base ROM. Only the overlaid spans are materialized,
+    # everything else is written straight from the shared base buffer.
+    HEADER_CHECKSUM_OFF = 0x1c
+
+    def __init__(self, base:"SNES_Variant_Base"):
+        self.base = base
+        self.spans = []
+
+    def replace_byte_range(self, offset:int, new_bytes:bytes):
+        base = self.base
+        start = offset + base.base_offset
+        end = start + len(new_bytes)
+        assert end <= len(base.data), f"Byte range {hex(offset)}-{hex(offset+len(new_bytes))} is outside of the ROM"
+        kept = []
+        merged = []
+        for span in self.spans:
+            s, buf = span
+            if s <= end and s+len(buf) >= start:
+                merged.append(span)
+            else:
+                kept.append(span)
+        if merged:
+            new_start = min(start, merged[0][0])
+            new_end = max(end, max(s+len(buf) for s,buf in merged))
+            data = bytearray(base.data[new_start:new_end])
+            for s,buf in merged:
+                data[s-new_start:s-new_start+len(buf)] = buf
+            data[start-new_start:end-new_start] = new_bytes
+            start = new_start
+        else:
+            data = bytearray(new_bytes)
+        kept.append((start, data))
+        kept.sort(key=lambda span: span[0])
+        self.spans = kept
+
+    def __finalize(self):
+        # Like SNES_ROM.write_to the parsed header is always restored, only with the new checksum.
+        # Checksum and complement always add up to 0x1fe, so the placeholder doesn't change the sum
+        base = self.base
+        self.replace_byte_range(base.header_base-base.base_offset, base.header_template)
+        byte_sum = base.byte_sum
+        for s,buf in self.spans:
+            byte_sum += sum(buf) - sum(base.data[s:s+len(buf)])
+        checksum = byte_sum & 0xffff
+        checksum_bytes = ((checksum ^ 0xffff) | checksum << 16).to_bytes(4, "little")
+        self.replace_byte_range(base.header_base-base.base_offset+SNES_ROM_Overlay.HEADER_CHECKSUM_OFF, checksum_bytes)
+
+    def write_to(self, path:str):
+        self.__finalize()
+        data = self.base.data
+        pos = 0
+        with open(path, "wb") as f:
+            for s,buf in self.spans:
+                f.write(data[pos:s])
+                f.write(buf)
+                pos = s+len(buf)
+            f.write(data[pos:])
+
+class SNES_Variant_Base:
+    # Everything a worker needs to build variants of a ROM without reparsing it
+    def __init__(self, rom:SNES_ROM):
+        rom.update_in_rom()
+        self.data = memoryview(bytes(rom.data))
+        self.base_offset = rom.base_offset
+        self.header_base = rom.header_base
+        self.byte_sum = rom.byte_sum
+        header_template = bytearray(rom.header.to_bytes())
+        off = SNES_ROM_Overlay.HEADER_CHECKSUM_OFF
+        header_template[off:off+4] = b"\xff\xff\x00\x00"
+        self.header_template = bytes(header_template)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["data"] = self.data.tobytes()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.data = memoryview(self.data)
+
+    def overlay(self)->SNES_ROM_Overlay:
+        return SNES_ROM_Overlay(self)
+
+_worker_base = None
+
+def _init_worker(base:SNES_Variant_Base):
+    global _worker_base
+    _worker_base = base
+
+def _write_variant(job):
+    path, overlays = job
+    overlay = _worker_base.overlay()
+    for offset, new_bytes in overlays:
+        overlay.replace_byte_range(offset, new_bytes)
+    overlay.write_to(path)
+    return path
+
+class SNES_Variant_Generator:
+    DEFAULT_NAME_FORMAT = "_{offset:#x}-{end:#x}-{fill:#x}.smc"
+
+    def __init__(self, rom:SNES_ROM):
+        self.logger = logging.getLogger("C."+self.__class__.__name__)
+        self.base = SNES_Variant_Base(rom)
+
+    def jobs(self, variants, output_prefix:str, name_format:str=DEFAULT_NAME_FORMAT):
+        for offset, size, fill in variants:
+            path = output_prefix+name_format.format(offset=offset, end=offset+size, size=size, fill=fill)
+            yield (path, [(offset, bytes([fill])*size)])
+
+    def generate(self, variants, output_prefix:str, name_format:str=DEFAULT_NAME_FORMAT, workers:int=None)->list[str]:
+        # The base buffer is handed to each worker once, with fork it isn't even copied
+        jobs = list(self.jobs(variants, output_prefix, name_format))
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(jobs))
+        if workers <= 1:
+            _init_worker(self.base)
+            paths = [_write_variant(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.base,)) as executor:
+                paths = list(executor.map(_write_variant, jobs, chunksize=max(1, len(jobs)//(workers*4))))
+        self.logger.info(f"Wrote {len(paths)} variants to {output_prefix}*")
+        return paths
@@ -0,0 +1,24 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.sbbs_synthetic import synthetic_rom
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    # sbbs1k.log is written to the working directory, keep it out of the repo
+    monkeypatch.chdir(tmp_path)
+
+@pytest.fixture(scope="session")
+def rom_images()->dict:
+    return {extra_header: synthetic_rom(seed=1, extra_header=extra_header) for extra_header in (False, True)}
+
+@pytest.fixture(params=[False, True], ids=["plain", "headered"])
+def rom_path(request, rom_images, tmp_path)->str:
+    path = os.path.join(tmp_path, "synthetic.smc")
+    with open(path, "wb") as f:
+        f.write(rom_images[request.param])
+    return path
@@ -0,0 +1,19 @@
+import os
+import pytest
+from src.sbbs_bundle import SBBS_Bundle
+from src.sbbs_rom import SBBS_ROM
+
+def test_bundle_round_trip_keeps_rom(rom_path, tmp_path):
+    rom = SBBS_ROM.from_file(rom_path)
+    path = os.path.join(tmp_path, "mod.sbbsmod")
+    rom.export(path)
+    rom.import_from(path)
+    rom.update_in_rom()
+    assert rom.data == SBBS_ROM.from_file(rom_path).data
+
+def test_bundle_rejects_unknown_team(tmp_path):
+    path = os.path.join(tmp_path, "bad.sbbsmod")
+    with SBBS_Bundle(path, "w") as bundle:
+        bundle.write_team(200, {})
+    with pytest.raises(AssertionError, match="team 200"):
+        SBBS_Bundle(path)
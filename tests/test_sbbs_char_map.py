@@ -0,0 +1,68 @@
+import codecs
+import io
+import pytest
+from src.sbbs_char_map import b_to_font, max_val, sbbs_encode, sbbs_decode, sbbs_bytes_to_str, str_to_sbbs_idxs, decode_names, encode_names, CODEC_NAME, REPLACEMENT_CHAR
+from src.sbbs_player import SBBS_Player
+from src.sbbs_rom import SBBS_ROM
+
+FONT_BYTES = bytes(range(max_val+1))
+# Characters that show up more than once encode to their first byte
+FIRST_BYTES = bytes(b_to_font.index(c) for c in dict.fromkeys(b_to_font))
+
+def test_round_trip_every_font_byte():
+    text, consumed = sbbs_decode(FONT_BYTES)
+    assert consumed == len(FONT_BYTES)
+    assert text == b_to_font
+    assert sbbs_decode(sbbs_encode(text)[0])[0] == text
+    assert sbbs_encode(sbbs_decode(FIRST_BYTES)[0])[0] == FIRST_BYTES
+
+def test_lower_case_encodes_like_upper_case():
+    assert sbbs_encode("powers")[0] == sbbs_encode("POWERS")[0]
+
+def test_registered_codec():
+    data = "HELLO 42".encode(CODEC_NAME)
+    assert data == sbbs_encode("HELLO 42")[0]
+    assert data.decode(CODEC_NAME) == "HELLO 42"
+    assert codecs.lookup(CODEC_NAME).name == CODEC_NAME
+    encoder = codecs.getincrementalencoder(CODEC_NAME)()
+    decoder = codecs.getincrementaldecoder(CODEC_NAME)()
+    assert decoder.decode(encoder.encode("AB")+encoder.encode("C", final=True)) == "ABC"
+    stream = io.BytesIO()
+    codecs.getwriter(CODEC_NAME)(stream).write("XYZ")
+    assert codecs.getreader(CODEC_NAME)(io.BytesIO(stream.getvalue())).read() == "XYZ"
+
+def test_encode_errors():
+    with pytest.raises(UnicodeEncodeError):
+        "A?B".encode(CODEC_NAME)
+    assert "A?B".encode(CODEC_NAME, "replace") == sbbs_encode("A"+REPLACEMENT_CHAR+"B")[0]
+    assert "A?B".encode(CODEC_NAME, "ignore") == sbbs_encode("AB")[0]
+    with pytest.raises(ValueError):
+        sbbs_encode("A?B", "backslashreplace")
+
+def test_decode_errors():
+    data = sbbs_encode("AB")[0] + bytes([max_val+1])
+    with pytest.raises(UnicodeDecodeError):
+        data.decode(CODEC_NAME)
+    # Bytes past the known font show up as spaces in game
+    assert data.decode(CODEC_NAME, "replace") == "AB "
+    assert data.decode(CODEC_NAME, "ignore") == "AB"
+    with pytest.raises(ValueError):
+        sbbs_decode(data, "backslashreplace")
+    assert sbbs_bytes_to_str(data) == "AB "
+
+def test_names_round_trip():
+    names = ["ABE", "HOMER", "", "Z9"]
+    data = encode_names(names, 5)
+    assert len(data) == 20
+    assert decode_names(data, 5, 5) == [name.ljust(5) for name in names]
+    with pytest.raises(AssertionError, match="too long"):
+        encode_names(["TOOLONG"], 5)
+
+def test_player_names_round_trip(rom_path):
+    rom = SBBS_ROM.from_file(rom_path)
+    data = bytes(rom.read_bytes(SBBS_Player.PLAYER_BASE, SBBS_Player.BYTE_SIZE*8))
+    names = decode_names(data, SBBS_Player.BYTE_SIZE, SBBS_Player.NAME_LENGTH)
+    for i, name in enumerate(names):
+        o = i*SBBS_Player.BYTE_SIZE
+        assert sbbs_decode(bytes(str_to_sbbs_idxs(name)))[0] == name
+        assert sbbs_bytes_to_str(data[o:o+SBBS_Player.NAME_LENGTH]) == name
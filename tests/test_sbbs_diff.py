@@ -0,0 +1,32 @@
+import os
+import pytest
+from src.sbbs_diff import SBBS_Diff
+from src.sbbs_rom import SBBS_ROM
+
+def write_stale_hack(rom_path:str, path:str)->None:
+    # Edited player bytes without the header checksum being updated, like most hacks
+    hack = SBBS_ROM.from_file(rom_path)
+    hack.teams[0].field_players[0].player.hr = 42
+    hack.update_teams_in_rom()
+    with open(path, "wb") as f:
+        f.write(hack.data)
+
+def test_diff_read_only_against_stale_checksum(rom_path, tmp_path):
+    hack_path = os.path.join(tmp_path, "hack.smc")
+    write_stale_hack(rom_path, hack_path)
+    with pytest.raises(AssertionError, match="Checksum Mismatch"):
+        SBBS_ROM.from_file(hack_path)
+    hack = SBBS_ROM.from_file(hack_path, check_checksum=False)
+    rom = SBBS_ROM.from_file(rom_path, "r")
+    diff = SBBS_Diff(rom, hack)
+    assert [(d.kind, d.field, d.new) for d in diff.differences] == [("player", "hr", 42)]
+    # Neither input got its header rewritten
+    assert hack.data == open(hack_path, "rb").read()
+    assert bytes(rom.data) == open(rom_path, "rb").read()
+
+def test_diff_includes_pending_edits(rom_path):
+    rom_a = SBBS_ROM.from_file(rom_path)
+    rom_b = SBBS_ROM.from_file(rom_path)
+    rom_b.teams[3].name = "DIFF"
+    assert [d.field for d in SBBS_Diff(rom_a, rom_b).differences] == ["name"]
+    assert not SBBS_Diff(rom_a, SBBS_ROM.from_file(rom_path)).differences
@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+import pytest
+from conftest import ROOT
+from src.sbbs_logo_atlas import SBBS_Logo_Atlas
+from src.sbbs_rom import SBBS_ROM
+from src.sbbs_team_logo import SBBS_Team_Logo
+from src.snes_tile import TILE_SIZE
+
+def run_cli(*args):
+    subprocess.run([sys.executable, os.path.join(ROOT, "sbbs1k_mod.py"), *args, "--log_level", "WARNING"], check=True)
+
+@pytest.mark.parametrize("tiles", [(0, None), (5, None), (0, 20), (3, 17)])
+def test_bank_round_trip_keeps_rom(rom_path, tmp_path, tiles):
+    rom = SBBS_ROM.from_file(rom_path)
+    path = os.path.join(tmp_path, "bank.png")
+    SBBS_Logo_Atlas(rom).export_bank(path, *tiles)
+    original = bytes(rom.data)
+    # The stored count is used when none is given, the padding of the last row never gets written
+    SBBS_Logo_Atlas(rom).import_bank(path, tiles[0])
+    rom.update_in_rom()
+    assert rom.data == original
+
+def test_bank_without_count_needs_count(rom_path, tmp_path):
+    rom = SBBS_ROM.from_file(rom_path)
+    path = os.path.join(tmp_path, "bank.bmp")
+    SBBS_Logo_Atlas(rom).export_bank(path, 0, 20)
+    with pytest.raises(AssertionError, match="no tile count"):
+        SBBS_Logo_Atlas(rom).import_bank(path)
+    SBBS_Logo_Atlas(rom).import_bank(path, 0, 20)
+    rom.update_in_rom()
+    assert rom.data == SBBS_ROM.from_file(rom_path).data
+
+def test_bank_import_moves_tiles(rom_path, tmp_path):
+    rom = SBBS_ROM.from_file(rom_path)
+    path = os.path.join(tmp_path, "bank.png")
+    SBBS_Logo_Atlas(rom).export_bank(path, 0, 20)
+    SBBS_Logo_Atlas(rom).import_bank(path, 100)
+    base = SBBS_Team_Logo.TEAM_LOGO_BASE_OFF
+    assert rom.read_bytes(base+100*TILE_SIZE, 20*TILE_SIZE) == rom.read_bytes(base, 20*TILE_SIZE)
+    assert rom.read_bytes(base+120*TILE_SIZE, TILE_SIZE) == SBBS_ROM.from_file(rom_path).read_bytes(base+120*TILE_SIZE, TILE_SIZE)
+
+def test_teams_round_trip_keeps_rom(rom_path, tmp_path):
+    rom = SBBS_ROM.from_file(rom_path)
+    path = os.path.join(tmp_path, "logos.png")
+    SBBS_Logo_Atlas(rom).export_teams(path)
+    assert SBBS_Logo_Atlas(rom).import_teams(path) == 0
+    rom.update_in_rom()
+    assert rom.data == SBBS_ROM.from_file(rom_path).data
+
+def test_cli_bank_round_trip(rom_path, tmp_path):
+    atlas = os.path.join(tmp_path, "a.png")
+    out = os.path.join(tmp_path, "out.smc")
+    run_cli(rom_path, "--export_atlas", atlas, "--atlas_tiles", "5")
+    run_cli(rom_path, "--import_atlas", atlas, "--atlas_tiles", "5", "-o", out)
+    with open(out, "rb") as a, open(rom_path, "rb") as b:
+        assert a.read() == b.read()
+
+def test_bank_without_count_fails_before_loading(rom_path, tmp_path):
+    rom = SBBS_ROM.from_file(rom_path)
+    with pytest.raises(AssertionError, match="no tile count"):
+        SBBS_Logo_Atlas(rom).import_bank(os.path.join(tmp_path, "missing.bmp"))
+
+def test_teams_rejects_indices_outside_palette(rom_path, tmp_path):
+    import PIL.Image
+    rom = SBBS_ROM.from_file(rom_path)
+    path = os.path.join(tmp_path, "logos.png")
+    SBBS_Logo_Atlas(rom).export_teams(path)
+    image = PIL.Image.open(path)
+    image.putpalette([0, 0, 0, 255, 255, 255]*2+[255, 0, 0])
+    image.save(path)
+    with pytest.raises(AssertionError, match="palette only has 5 colors"):
+        SBBS_Logo_Atlas(rom).import_teams(path)
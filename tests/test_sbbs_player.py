@@ -0,0 +1,10 @@
+from src.sbbs_rom import SBBS_ROM
+
+def test_dict_round_trip_keeps_rom(rom_path):
+    # ERA is stored in hundredths, 0.57*100 must not come back as 56
+    rom = SBBS_ROM.from_file(rom_path)
+    for team in rom.teams:
+        team.from_dict(team.to_dict())
+    assert not [a for team in rom.teams for a in team.pitcher_players if a.player.dirty]
+    rom.update_in_rom()
+    assert rom.data == SBBS_ROM.from_file(rom_path).data
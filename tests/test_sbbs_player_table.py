@@ -0,0 +1,28 @@
+import pytest
+from src.sbbs_player_table import SBBS_Player_Table
+from src.sbbs_rom import SBBS_ROM
+
+def test_write_back_rejects_aliased_columns(rom_path):
+    rom = SBBS_ROM.from_file(rom_path)
+    table = rom.player_table()
+    row = table.rows(fielders=False).start
+    table["f"][row] = 12
+    table["pitch_f"][row] = 3
+    with pytest.raises(AssertionError, match="same byte"):
+        table.write_back()
+
+@pytest.mark.parametrize("column, pitcher", [("f", True), ("pitch_r", False), ("pitcher_ability_0", False), ("hitter_ability", True)])
+def test_write_back_rejects_columns_of_other_role(rom_path, column, pitcher):
+    rom = SBBS_ROM.from_file(rom_path)
+    original = bytes(rom.data)
+    table = rom.player_table()
+    row = table.rows(fielders=not pitcher, pitchers=pitcher).start
+    table[column][row] = 1 if table[column][row] != 1 else 2
+    with pytest.raises(AssertionError, match="belongs to the"):
+        table.write_back()
+    assert rom.data == original
+
+def test_role_columns():
+    assert "pitch_f" not in SBBS_Player_Table.role_columns()
+    assert "f" not in SBBS_Player_Table.role_columns(fielders=False)
+    assert {"name", "av", "hr", "left_handed"} == SBBS_Player_Table.role_columns()
@@ -0,0 +1,41 @@
+import asyncio
+import base64
+import os
+import pytest
+from src.sbbs_rom import SBBS_ROM
+from src.sbbs_server import SBBS_Server
+
+def call(server:SBBS_Server, method:str, **params):
+    response = server.handle({"jsonrpc": "2.0", "id": 1, "method": method, "params": params})
+    assert "error" not in response, response["error"]
+    return response["result"]
+
+def test_edit_and_render(rom_path):
+    server = SBBS_Server()
+    rom = call(server, "open_rom", path=rom_path)["rom"]
+    call(server, "set_player", rom=rom, team=3, slot=0, data={"player": {"hr": 77}})
+    data = base64.b64decode(call(server, "render_rom", rom=rom)["data"])
+    assert SBBS_ROM(data).teams[3].field_players[0].player.hr == 77
+    patched = SBBS_ROM.from_file(rom_path)
+    patched.apply_patch(base64.b64decode(call(server, "render_patch", rom=rom)["data"]))
+    assert patched.data == data
+    assert call(server, "close_rom", rom=rom)
+
+def test_failed_edit_is_rolled_back(rom_path):
+    server = SBBS_Server()
+    rom = call(server, "open_rom", path=rom_path)["rom"]
+    response = server.handle({"jsonrpc": "2.0", "id": 1, "method": "set_player", "params": {"rom": rom, "team": 3, "slot": 0, "data": {"player": {"hr": 1000}}}})
+    assert "error" in response
+    assert list(SBBS_ROM.from_file(rom_path).data) == list(server.roms[rom].rom.data)
+
+def test_socket_path_is_not_a_regular_file(tmp_path):
+    path = os.path.join(tmp_path, "notes.sock")
+    with open(path, "w") as f:
+        f.write("keep me")
+    with pytest.raises(AssertionError, match="isn't a socket"):
+        asyncio.run(SBBS_Server().serve(path))
+    assert os.path.exists(path)
+
+def test_remote_tcp_needs_allow_remote():
+    with pytest.raises(AssertionError, match="loopback"):
+        asyncio.run(SBBS_Server().serve("0.0.0.0:0"))
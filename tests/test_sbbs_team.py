@@ -0,0 +1,20 @@
+from src.sbbs_rom import SBBS_ROM
+
+def test_pitcher_number_round_trip(rom_path):
+    rom = SBBS_ROM.from_file(rom_path)
+    assignment = rom.teams[2].pitcher_players[4]
+    high_bits = assignment.byte & 0xf0
+    assignment.number = (assignment.number+1) & 0xf
+    assert assignment.dirty
+    rom.update_in_rom()
+    reloaded = SBBS_ROM(bytes(rom.data)).teams[2].pitcher_players[4]
+    assert reloaded.number == assignment.number
+    assert reloaded.byte & 0xf0 == high_bits
+
+def test_pitcher_number_from_dict(rom_path):
+    rom = SBBS_ROM.from_file(rom_path)
+    data = rom.teams[7].pitcher_players[0].to_dict()
+    data["number"] = 9 if data["number"] != 9 else 10
+    rom.teams[7].pitcher_players[0].from_dict(data)
+    rom.update_in_rom()
+    assert SBBS_ROM(bytes(rom.data)).teams[7].pitcher_players[0].number == data["number"]
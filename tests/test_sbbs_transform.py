@@ -0,0 +1,21 @@
+import pytest
+from src.sbbs_rom import SBBS_ROM
+from src.sbbs_transform import SBBS_Transform, apply_transforms
+
+def test_transform_round_trip(rom_path):
+    rom = SBBS_ROM.from_file(rom_path)
+    apply_transforms(rom, ["team=0 fielders: hr=12; f=7", "all pitchers: pitch_f=12; spd=90"])
+    rom.update_in_rom()
+    # Parsed again from the written bytes
+    rom = SBBS_ROM(bytes(rom.data))
+    assert all(a.player.hr == 12 and a.player.f == 7 for a in rom.teams[0].field_players)
+    assert all(a.player.pitch_f == 12 and a.player.spd == 90 for team in rom.teams for a in team.pitcher_players)
+
+@pytest.mark.parametrize("rule", ["pitchers: f=12", "fielders: pitch_l=3", "all: r=1", "all: era=3.5", "all: hr=f", "fielders: spd+=1"])
+def test_transform_rejects_columns_of_other_role(rule):
+    with pytest.raises(AssertionError, match="can't be used"):
+        SBBS_Transform(rule)
+
+def test_transform_rejects_power():
+    with pytest.raises(ValueError, match="Unsupported expression"):
+        SBBS_Transform("fielders: hr=9**9**9")
@@ -0,0 +1,92 @@
+import os
+import pytest
+from src.sbbs_rom import SBBS_ROM
+from src.snes_rom import SNES_ROM
+from src.snes_patch import apply_bps, create_ips, iter_ips, merge_ranges
+
+def read(path:str)->bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def edit(rom:SBBS_ROM, seed:int)->None:
+    for idx,team in enumerate(rom.teams):
+        team.name = f"T{seed}{idx}"
+        for assignment in team.field_players:
+            assignment.player.hr = (idx+seed) % 100
+        team.pitcher_players[0].player.pitch_st = (idx*3+seed) % 100
+    rom.update_in_rom()
+
+def patched(rom_path:str, patch:bytes)->bytes:
+    rom = SBBS_ROM.from_file(rom_path)
+    rom.apply_patch(patch)
+    return bytes(rom.data)
+
+@pytest.mark.parametrize("patch_format", SBBS_ROM.PATCH_FORMATS)
+@pytest.mark.parametrize("mmap_mode", [None, "c"])
+def test_patch_round_trip(rom_path, patch_format, mmap_mode):
+    rom = SBBS_ROM.from_file(rom_path, mmap_mode)
+    edit(rom, 1)
+    edit(rom, 2)
+    assert bytes(rom.source_data()) == read(rom_path)
+    assert patched(rom_path, rom.create_patch(patch_format)) == bytes(rom.data)
+
+@pytest.mark.parametrize("patch_format", SBBS_ROM.PATCH_FORMATS)
+def test_patch_round_trip_after_compaction(rom_path, patch_format, monkeypatch):
+    # Overlapping writes get merged into one entry per range, the oldest bytes have to survive that
+    monkeypatch.setattr(SNES_ROM, "ORIGINALS_LIMIT", 8)
+    rom = SBBS_ROM.from_file(rom_path)
+    for seed in range(5):
+        edit(rom, seed)
+    assert len(rom.originals) <= 2*len(rom.original_ranges())+8
+    assert rom.source_data() == read(rom_path)
+    assert patched(rom_path, rom.create_patch(patch_format)) == rom.data
+
+@pytest.mark.parametrize("patch_format", SBBS_ROM.PATCH_FORMATS)
+def test_patch_round_trip_after_rollback(rom_path, patch_format):
+    rom = SBBS_ROM.from_file(rom_path)
+    edit(rom, 1)
+    expected = bytes(rom.data)
+    with rom.branch():
+        edit(rom, 2)
+    assert rom.data == expected
+    assert rom.source_data() == read(rom_path)
+    assert patched(rom_path, rom.create_patch(patch_format)) == expected
+
+def test_patch_of_unchanged_rom_is_empty(rom_path):
+    rom = SBBS_ROM.from_file(rom_path)
+    assert list(iter_ips(rom.create_patch("ips"))) == []
+    assert apply_bps(read(rom_path), rom.create_patch("bps")) == read(rom_path)
+
+def test_copy_keeps_source(rom_path):
+    rom = SBBS_ROM.from_file(rom_path)
+    edit(rom, 1)
+    clone = rom.copy()
+    edit(clone, 2)
+    assert clone.source_data() == rom.source_data() == read(rom_path)
+    assert patched(rom_path, clone.create_patch("ips")) == clone.data
+
+def test_original_ranges_rebuild_source(rom_path):
+    for mmap_mode in (None, "r"):
+        rom = SBBS_ROM.from_file(rom_path, mmap_mode)
+        if mmap_mode is None:
+            edit(rom, 1)
+        source = bytearray(rom.data)
+        for t_off, old_bytes in rom.original_ranges():
+            source[t_off:t_off+len(old_bytes)] = old_bytes
+        assert source == read(rom_path)
+
+@pytest.mark.parametrize("mmap_mode", [None, "c"])
+def test_rollback_drops_restored_ranges(rom_path, mmap_mode):
+    rom = SBBS_ROM.from_file(rom_path, mmap_mode)
+    with rom.branch():
+        edit(rom, 1)
+    assert rom.modified_ranges == [] and rom.originals == []
+    assert list(iter_ips(rom.create_patch("ips"))) == []
+    rom.teams[5].name = "KEEP"
+    rom.update_in_rom()
+    kept = list(rom.modified_ranges)
+    with rom.branch():
+        edit(rom, 2)
+    # Only the bytes that still differ from the source are left
+    assert rom.modified_ranges and all(any(s <= start and end <= e for s, e in merge_ranges(kept)) for start, end in rom.modified_ranges)
+    assert patched(rom_path, rom.create_patch("bps")) == bytes(rom.data)
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import pytest
+from conftest import ROOT
+from src.sbbs_rom import SBBS_ROM
+
+def read(path:str)->bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+@pytest.mark.parametrize("mmap_mode", [None, "r", "c"])
+def test_mmap_modes_parse_like_a_copy(rom_path, mmap_mode):
+    expected = SBBS_ROM.from_file(rom_path)
+    rom = SBBS_ROM.from_file(rom_path, mmap_mode)
+    assert [team.name for team in rom.teams] == [team.name for team in expected.teams]
+    assert rom.teams[5].pitcher_players[2].to_dict() == expected.teams[5].pitcher_players[2].to_dict()
+
+def test_mmap_read_only_writes_rom_and_patches(rom_path, tmp_path):
+    rom = SBBS_ROM.from_file(rom_path, "r")
+    out = os.path.join(tmp_path, "out.smc")
+    rom.write_to(out)
+    assert read(out) == read(rom_path)
+    for patch_format in SBBS_ROM.PATCH_FORMATS:
+        patched = SBBS_ROM.from_file(rom_path)
+        patched.apply_patch(rom.create_patch(patch_format))
+        assert patched.data == read(rom_path)
+
+def test_mmap_read_only_rejects_edits(rom_path):
+    rom = SBBS_ROM.from_file(rom_path, "r")
+    rom.teams[0].field_players[0].player.hr = 42
+    with pytest.raises(AssertionError, match="read only"):
+        rom.update_in_rom()
+
+def test_mmap_copy_on_write_keeps_file(rom_path, tmp_path):
+    original = read(rom_path)
+    rom = SBBS_ROM.from_file(rom_path, "c")
+    rom.teams[0].field_players[0].player.hr = 42
+    out = os.path.join(tmp_path, "out.smc")
+    rom.write_to(out)
+    assert read(rom_path) == original
+    assert SBBS_ROM.from_file(out).teams[0].field_players[0].player.hr == 42
+
+def test_cli_output_and_patch_with_read_only_mmap(rom_path, tmp_path):
+    out = os.path.join(tmp_path, "out.smc")
+    patch = os.path.join(tmp_path, "out.ips")
+    subprocess.run([sys.executable, os.path.join(ROOT, "sbbs1k_mod.py"), rom_path, "--mmap", "r", "-o", out, "-p", patch, "--log_level", "WARNING"], check=True)
+    assert read(out) == read(rom_path)
+    assert os.path.exists(patch)
+
+@pytest.mark.parametrize("mmap_mode", ["r", "c"])
+def test_close_unmaps_parsed_rom(rom_path, mmap_mode):
+    with SBBS_ROM.from_file(rom_path, mmap_mode) as rom:
+        for team in rom.teams:
+            team.logo.get_indices()
+            [assignment.player.name for assignment in team.field_players+team.pitcher_players]
+        del team
+    assert rom.data.closed and rom.source.closed and rom.view is None
+
+def test_close_releases_file_descriptors(rom_path):
+    fd_dir = f"/proc/{os.getpid()}/fd"
+    if not os.path.isdir(fd_dir):
+        pytest.skip("needs /proc")
+    before = len(os.listdir(fd_dir))
+    for _ in range(50):
+        with SBBS_ROM.from_file(rom_path, "r") as rom:
+            rom.teams[0].name
+    assert len(os.listdir(fd_dir)) == before
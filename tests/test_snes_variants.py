@@ -0,0 +1,10 @@
+import pytest
+from src.snes_variants import SNES_Variant_Spec
+
+def test_spec_parse():
+    spec = SNES_Variant_Spec.parse("0x10,0x20/2/0:3/zip")
+    assert list(spec.variants()) == [(0x10, 2, 0), (0x20, 2, 1), (0x10, 2, 2)]
+
+def test_spec_rejects_fills_above_a_byte():
+    with pytest.raises(AssertionError, match="0x100"):
+        SNES_Variant_Spec.parse("0/1/0x100")